@@ -7,13 +7,28 @@ from . import global_values as g
 from . import levels
 from . import entities
 from . import cameras
+from . import pathfinding
 
 import pygame as p
 import math as m
+import numpy as np
+import hashlib
+import heapq
+from collections import OrderedDict
+from concurrent import futures
+import queue
+import json
+import os
 
 
+#node map files start with the magic bytes, the version is changed whenever the layout of the file or the generated nodes changes
+NODE_MAP_FILE_MAGIC = b"POTNODES"
+NODE_MAP_FILE_VERSION = 1
+NODE_MAP_FILE_EXTENSION = ".nodes"
+NODE_MAP_FILE_ALIGNMENT = 64
+
 class Node():
-    def __init__(self, x, y, node_map, collision_dict, radius=1, connection_radius=50, node_type=None):
+    def __init__(self, x, y, node_map, collision_dict, radius=1, connection_radius=50, node_type=None, node_id=None):
         self.x = x
         self.y = y
         self.radius = radius
@@ -31,14 +46,26 @@ class Node():
         else:
             self.node_type = node_type
 
-        self.connections = []
+        #nodes made from a generated Nav_Graph (node_id is given) load their connections from it when they are first needed
+        if node_id is None:
+            self.loaded_connections = []
+        else:
+            self.loaded_connections = None
 
         self.sx = int( (self.x-self.node_map.level.x) / self.node_map.level.segment_size)
         self.sy = int( (self.y-self.node_map.level.y) / self.node_map.level.segment_size)
         self.segment = self.node_map.level.segments[self.sx][self.sy]
         self.segment.nodes.add(self)
 
-        self.node_map.node_list.append(self)
+        #the index of the node in the node map's Nav_Graph
+        self.id = self.node_map.add_node(self, node_id)
+
+    @property
+    def connections(self):
+        if self.loaded_connections is None:
+            self.loaded_connections = []
+            self.node_map.load_connections(self)
+        return self.loaded_connections
 
     def connect(self, cardinal=False, diagonal=False, all_directions=True):
         potential_connection_rect = self.rect.inflate(self.connection_radius*2, self.connection_radius*2)
@@ -47,6 +74,7 @@ class Node():
         for segment in self.node_map.level.get_segments(potential_connection_rect):
             nodes += segment.nodes
 
+        collision_probe = None
         for node in nodes:
             if node == self :
                 continue
@@ -70,18 +98,22 @@ class Node():
             if can_connect:
                 
                 if util.get_distance(self.rect.centerx, self.rect.centery, node.x, node.y) <= self.connection_radius:
-                    collision_test_entity = entities.Entity(self.rect, collision_dict=self.collision_dict, safe_movement=False, temp=True)
-                    collision_test_entity.update()
+                    #one probe is moved back to the node for each connection that is tried
+                    if collision_probe is None:
+                        collision_probe = entities.get_collision_probe(self.rect, collision_dict=self.collision_dict, safe_movement=False)
+                    else:
+                        collision_probe.setup(self.rect, collision_dict=self.collision_dict, safe_movement=False)
                     
                     ax, ay = node.rect.centerx-self.rect.centerx, node.rect.centery-self.rect.centery
-                    move_results = collision_test_entity.move(ax, ay)
+                    move_results = collision_probe.move(ax, ay)
                         
                     can_move_x, can_move_y = move_results[4], move_results[5]
                     if can_move_x and can_move_y:
                         Node_Connection(self, node)
                         Node_Connection(node, self)
 
-                    collision_test_entity.delete()
+        if collision_probe is not None:
+            collision_probe.release()
 
     def clear_connections(self):
         for connection in self.connections[:]:
@@ -98,7 +130,7 @@ class Node():
             g.camera.draw_transformed_line(connection_colour, (self.x, self.y), (connection.node.x, connection.node.y))
 
     def delete(self):
-        self.node_map.node_list.remove(self)
+        self.node_map.remove_node(self)
         self.node_map.level.segments[self.sx][self.sy].nodes.remove(self)
         
         for connection in self.connections:
@@ -107,16 +139,20 @@ class Node():
                     c.delete()
 
 class Node_Connection():
-    def __init__(self, start_node, node):
+    def __init__(self, start_node, node, update_graph=True):
         self.start_node = start_node
         self.node = node
         self.distance = util.get_distance(self.start_node.x, self.start_node.y, self.node.x, self.node.y)
         self.angle = util.get_angle(self.start_node.x, self.start_node.y, self.node.x, self.node.y)
 
         self.start_node.connections.append(self)
+        #connections loaded from the Nav_Graph are already in it
+        if update_graph:
+            self.start_node.node_map.graph_changed(self.start_node.rect.union(self.node.rect))
 
     def delete(self):
         self.start_node.connections.remove(self)
+        self.start_node.node_map.graph_changed(self.start_node.rect.union(self.node.rect))
  
 class Zone():
     def __init__(self, rect, zone_type, node_map):
@@ -127,54 +163,1026 @@ class Zone():
         
         self.node_map.zones.append(self)
 
+#grid bucket index of node positions for nearest node queries
+#nodes from a bulk build are kept in flat arrays sorted by cell, nodes added afterwards go in a dictionary of cells,
+#and removed nodes are just marked as inactive, so nodes can be added and removed without rebuilding it
+class Node_Index():
+    def __init__(self, cell_size, positions=None, active=None):
+        self.cell_size = cell_size
+
+        #positions and whether each node id is in the index
+        self.positions = np.zeros((0, 2))
+        self.active = np.zeros(0, dtype=bool)
+
+        #the bulk built cells, covering grid_shape cells from grid_start. The node ids in cell (x, y) are
+        #cell_ids[cell_starts[i]:cell_starts[i+1]] where i = (x-grid_start[0])*grid_shape[1]+(y-grid_start[1])
+        self.grid_start = (0, 0)
+        self.grid_shape = (0, 0)
+        self.cell_starts = np.zeros(1, dtype=np.int64)
+        self.cell_ids = np.zeros(0, dtype=np.int64)
+        #lists of node ids by cell for nodes added since the bulk build
+        self.added_cells = {}
+        self.added_count = 0
+
+        #the range of cells (sx, sy, ex, ey) any node has been in, so searches know when to stop
+        self.cell_range = None
+
+        if positions is not None:
+            self.build(positions, active)
+
+    def get_cell(self, x, y):
+        return int(x//self.cell_size), int(y//self.cell_size)
+
+    def build(self, positions, active=None):
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if active is None:
+            active = np.ones(len(positions), dtype=bool)
+        self.positions = positions.copy()
+        self.active = np.asarray(active, dtype=bool).copy()
+        self.added_cells = {}
+        self.added_count = 0
+
+        ids = np.flatnonzero(self.active)
+        if not ids.size:
+            self.grid_start = (0, 0)
+            self.grid_shape = (0, 0)
+            self.cell_starts = np.zeros(1, dtype=np.int64)
+            self.cell_ids = ids
+            self.cell_range = None
+            return
+
+        cells = np.floor(self.positions[ids]/self.cell_size).astype(np.int64)
+        start = cells.min(axis=0)
+        shape = cells.max(axis=0)-start+1
+        keys = ((cells[:, 0]-start[0])*shape[1])+(cells[:, 1]-start[1])
+        order = np.argsort(keys, kind="stable")
+
+        self.grid_start = tuple(start.tolist())
+        self.grid_shape = tuple(shape.tolist())
+        self.cell_ids = ids[order]
+        self.cell_starts = np.zeros((shape[0]*shape[1])+1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=shape[0]*shape[1]), out=self.cell_starts[1:])
+        self.cell_range = (self.grid_start[0], self.grid_start[1], self.grid_start[0]+self.grid_shape[0]-1, self.grid_start[1]+self.grid_shape[1]-1)
+
+    def add(self, node_id, x, y):
+        if node_id >= len(self.active):
+            capacity = max(node_id+1, len(self.active)*2)
+            self.positions = np.concatenate((self.positions, np.zeros((capacity-len(self.positions), 2))))
+            self.active = np.concatenate((self.active, np.zeros(capacity-len(self.active), dtype=bool)))
+        elif self.active[node_id]:
+            self.remove(node_id)
+
+        self.positions[node_id] = x, y
+        self.active[node_id] = True
+
+        cell = self.get_cell(x, y)
+        self.added_cells.setdefault(cell, []).append(node_id)
+        self.added_count += 1
+        if self.cell_range is None:
+            self.cell_range = cell+cell
+        else:
+            sx, sy, ex, ey = self.cell_range
+            self.cell_range = (min(sx, cell[0]), min(sy, cell[1]), max(ex, cell[0]), max(ey, cell[1]))
+
+        #searching lots of small lists is slow, so build it again once too many nodes have been added
+        if self.added_count > max(len(self.cell_ids), 256):
+            self.build(self.positions, self.active)
+
+    def remove(self, node_id):
+        if node_id < len(self.active):
+            self.active[node_id] = False
+
+    #get the active node ids in a cell
+    def get_cell_ids(self, cx, cy):
+        ids = []
+        x, y = cx-self.grid_start[0], cy-self.grid_start[1]
+        if 0 <= x < self.grid_shape[0] and 0 <= y < self.grid_shape[1]:
+            i = (x*self.grid_shape[1])+y
+            ids = self.cell_ids[self.cell_starts[i]:self.cell_starts[i+1]].tolist()
+        added_ids = self.added_cells.get((cx, cy))
+        if added_ids:
+            ids = ids+added_ids
+        active = self.active
+        return [node_id for node_id in ids if active[node_id]]
+
+    #yield (distance, node id) for every node in order of distance from a point
+    #cells are searched in growing square rings, and a node is only yielded once nothing in an unsearched cell could be closer
+    def iter_nearest(self, x, y, max_distance=None):
+        if self.cell_range is None:
+            return
+
+        cx, cy = self.get_cell(x, y)
+        sx, sy, ex, ey = self.cell_range
+        #the ring after which every cell with nodes has been searched
+        last_ring = max(cx-sx, cy-sy, ex-cx, ey-cy, 0)
+        positions = self.positions
+        candidates = []
+        #nodes that have been added again somewhere else can be in more than one cell
+        seen_ids = set()
+        ring = 0
+        while ring <= last_ring:
+            if ring == 0:
+                ring_cells = ((cx, cy),)
+            else:
+                ring_cells = [(cx+dx, cy-ring) for dx in range(-ring, ring+1)]+[(cx+dx, cy+ring) for dx in range(-ring, ring+1)]
+                ring_cells += [(cx-ring, cy+dy) for dy in range(-ring+1, ring)]+[(cx+ring, cy+dy) for dy in range(-ring+1, ring)]
+
+            for cell in ring_cells:
+                for node_id in self.get_cell_ids(*cell):
+                    if node_id in seen_ids:
+                        continue
+                    seen_ids.add(node_id)
+                    nx, ny = positions[node_id].tolist()
+                    heapq.heappush(candidates, (((nx-x)**2+(ny-y)**2)**0.5, node_id))
+
+            #anything outside the searched rings is at least this far away
+            searched_distance = ring*self.cell_size
+            if max_distance is not None and searched_distance > max_distance:
+                searched_distance = max_distance
+            while candidates and candidates[0][0] <= searched_distance:
+                yield heapq.heappop(candidates)
+            if max_distance is not None and searched_distance >= max_distance:
+                return
+            ring += 1
+
+        while candidates:
+            candidate = heapq.heappop(candidates)
+            if max_distance is not None and candidate[0] > max_distance:
+                return
+            yield candidate
+
 class Node_Map():
     def __init__(self, level):
         self.level = level
         self.node_list = []
+        #nodes by id, deleted nodes leave None so that ids don't change
+        self.nodes = []
+        self.zones = []
+
+        #the Nav_Graph used for pathfinding, rebuilt from the nodes when it is next needed after they change
+        self.graph = None
+        #the grid the nodes were generated on (if any), so jump point search can be used
+        self.grid_spacing = None
+        self.grid_origin = (0, 0)
+
+        #while lazy is True the graph was generated in bulk and is the only complete copy of the nodes and connections
+        #Node objects are only made for it when they are asked for with get_node, node_list only holds the ones that have been made
+        self.lazy = False
+        #settings used to make nodes for a generated graph
+        self.collision_dict = {}
+        self.node_radius = 1
+        self.node_connection_radius = 50
+        #the walkable grid cells and the settings used by generate_from_level
+        self.walkable = None
+        self.generation_settings = None
+        #areas of the level that have changed since the generated graph was made, see regenerate_changed_cells
+        self.changed_rects = []
+
+        #abstract graph over the level's segments for hierarchical pathfinding, and the index used for nearest node queries
+        #both are made the first time they are needed
+        self.segment_graph = None
+        self.node_index = None
+
+        #recently found paths, see get_path
+        self.path_cache = Path_Cache(self)
          
         g.node_maps.add(self)
 
+    def add_node(self, node, node_id=None):
+        self.node_list.append(node)
+        if node_id is None:
+            self.graph_changed(node.rect.inflate(node.connection_radius*2, node.connection_radius*2))
+            self.nodes.append(node)
+            if self.node_index is not None:
+                self.node_index.add(len(self.nodes)-1, node.x, node.y)
+            return len(self.nodes)-1
+        else:
+            self.nodes[node_id] = node
+            return node_id
+
+    def remove_node(self, node):
+        self.graph_changed(node.rect.inflate(node.connection_radius*2, node.connection_radius*2))
+        self.node_list.remove(node)
+        self.nodes[node.id] = None
+        if self.node_index is not None:
+            self.node_index.remove(node.id)
+
+    #get a node by its id, making it if it is part of a generated graph and hasn't been made yet
+    def get_node(self, node_id):
+        if self.lazy:
+            graph = self.get_graph()
+        node = self.nodes[node_id]
+        if node is None and self.lazy and graph.alive[node_id]:
+            x, y = graph.positions[node_id].tolist()
+            node = Node(int(x), int(y), self, self.collision_dict, radius=self.node_radius, connection_radius=self.node_connection_radius, node_id=node_id)
+        return node
+
+    #get every node, making any that haven't been made yet
+    def get_nodes(self):
+        if self.lazy:
+            for node_id in np.flatnonzero(self.get_graph().alive).tolist():
+                self.get_node(node_id)
+        return self.node_list
+
+    def load_connections(self, node):
+        graph = self.get_graph()
+        for i in range(graph.indptr[node.id], graph.indptr[node.id+1]):
+            Node_Connection(node, self.get_node(int(graph.indices[i])), update_graph=False)
+
+    #stop using the generated graph, so that the nodes can be changed (the graph gets rebuilt from the nodes afterwards)
+    def make_nodes(self):
+        if self.lazy:
+            for node in self.get_nodes():
+                node.connections
+            self.lazy = False
+
+    #rect is the area the change could affect, or None if it isn't known
+    def graph_changed(self, rect=None):
+        self.make_nodes()
+        self.graph = None
+        if self.segment_graph is not None:
+            self.segment_graph.invalidate(rect)
+        self.path_cache.invalidate(rect)
+
+    #called by the level when its tiles or structures in an area change
+    def area_changed(self, rect):
+        #generated nodes are updated the next time the graph is needed, so lots of changes at once only regenerate it once
+        if self.lazy and self.walkable is not None:
+            self.changed_rects.append(p.Rect(rect))
+        reach = self.node_connection_radius+self.node_radius
+        if self.segment_graph is not None:
+            self.segment_graph.invalidate(p.Rect(rect).inflate(reach*2, reach*2))
+        self.path_cache.invalidate(p.Rect(rect).inflate(reach*2, reach*2))
+
+    #update a generated graph for the areas of the level that have changed since it was made
+    def regenerate_changed_cells(self):
+        level = self.level
+        spacing = self.grid_spacing
+        settings = self.generation_settings
+        walkable = np.array(self.walkable)
+        width, height = walkable.shape
+        for rect in self.changed_rects:
+            sx = max(int((rect.left-level.x)//spacing), 0)
+            sy = max(int((rect.top-level.y)//spacing), 0)
+            ex = min(int((rect.right-1-level.x)//spacing)+1, width)
+            ey = min(int((rect.bottom-1-level.y)//spacing)+1, height)
+            if sx < ex and sy < ey:
+                walkable[sx:ex, sy:ey] = get_walkable_cells(level, spacing, (sx, sy, ex, ey))
+        self.changed_rects = []
+
+        indptr, indices, weights = get_connections(level, walkable, spacing, self.node_radius, self.node_connection_radius,
+                                                   cardinal=settings["cardinal"], diagonal=settings["diagonal"], all_directions=settings["all_directions"])
+        old_alive = self.graph.alive
+        self.walkable = walkable
+        self.graph = pathfinding.Nav_Graph(self.graph.positions, indptr, indices, weights, walkable.ravel(), grid_spacing=spacing, grid_origin=self.grid_origin)
+
+        if self.node_index is not None:
+            for node_id in np.flatnonzero(old_alive != self.graph.alive).tolist():
+                if self.graph.alive[node_id]:
+                    x, y = self.graph.positions[node_id].tolist()
+                    self.node_index.add(node_id, x, y)
+                else:
+                    self.node_index.remove(node_id)
+
+        #nodes that have been made reload their connections from the new graph, and ones in cells that aren't walkable any more are removed
+        node_list = []
+        for node in self.node_list:
+            if self.graph.alive[node.id]:
+                node.loaded_connections = None
+                node_list.append(node)
+            else:
+                self.nodes[node.id] = None
+                node.segment.nodes.discard(node)
+        self.node_list = node_list
+
+    def clear(self):
+        for node in self.node_list:
+            node.segment.nodes.discard(node)
+        self.node_list = []
+        self.nodes = []
+        self.graph = None
+        self.lazy = False
+        self.changed_rects = []
+        self.segment_graph = None
+        self.node_index = None
+        self.path_cache.clear()
+
+    def get_graph(self):
+        if self.lazy and self.changed_rects:
+            self.regenerate_changed_cells()
+
+        if self.graph is None:
+            node_count = len(self.nodes)
+            positions = np.zeros((node_count, 2))
+            alive = np.zeros(node_count, dtype=np.uint8)
+            connection_counts = np.zeros(node_count, dtype=np.intc)
+            indices = []
+            weights = []
+
+            for node_id, node in enumerate(self.nodes):
+                if node is None:
+                    continue
+                positions[node_id] = node.x, node.y
+                alive[node_id] = 1
+                for connection in node.connections:
+                    #skip connections to nodes that have been deleted
+                    if self.nodes[connection.node.id] is connection.node:
+                        indices.append(connection.node.id)
+                        weights.append(connection.distance)
+                        connection_counts[node_id] += 1
+
+            indptr = np.zeros(node_count+1, dtype=np.intc)
+            np.cumsum(connection_counts, out=indptr[1:])
+            self.graph = pathfinding.Nav_Graph(positions, indptr, indices, weights, alive, grid_spacing=self.grid_spacing, grid_origin=self.grid_origin)
+
+        return self.graph
+
+    def get_node_index(self):
+        if self.node_index is None:
+            if self.lazy:
+                graph = self.get_graph()
+                positions, active = graph.positions, graph.alive
+            else:
+                positions = np.zeros((len(self.nodes), 2))
+                active = np.zeros(len(self.nodes), dtype=bool)
+                for node in self.node_list:
+                    positions[node.id] = node.x, node.y
+                    active[node.id] = True
+            #cells about the size of the gaps between nodes keep the number of nodes searched per query small
+            cell_size = self.grid_spacing or self.level.segment_size
+            self.node_index = Node_Index(cell_size, positions, active)
+        return self.node_index
+
+    def get_segment_graph(self):
+        if self.segment_graph is None:
+            self.segment_graph = Segment_Graph(self)
+        return self.segment_graph
+
     def draw(self):
         g.screen.lock()
-        for node in self.node_list:
+        for node in self.get_nodes():
             g.camera.draw_transformed_ellipse(g.RED, node.rect, 1)
             for connection in node.connections:
                 g.camera.draw_transformed_line(g.GREEN, (node.x, node.y), (connection.node.x, connection.node.y))
         g.screen.unlock()
         
-    def generate_from_level(self, level, node_spacing, collision_dict, node_radius=5, node_connection_radius_override=None, cardinal=False, diagonal=False, all_directions=True):
-        if node_connection_radius_override is None:
-            if diagonal:
-                node_connection_radius = ((node_spacing**2)+(node_spacing**2))**0.5
+    def generate_from_level(self, level, node_spacing, collision_dict, node_radius=5, node_connection_radius_override=None, cardinal=False, diagonal=False, all_directions=True,
+    walkable=None):
+        generate_from_level(self, level, node_spacing, collision_dict, node_radius=node_radius, node_connection_radius_override=node_connection_radius_override,
+        cardinal=cardinal, diagonal=diagonal, all_directions=all_directions, walkable=walkable)
+
+    def save(self, path):
+        save_node_map(self, path)
+
+    def load(self, path, load_zones=True):
+        return load_node_map(self, path, load_zones=load_zones)
+
+#LRU cache of the paths (as node ids) found on a node map, keyed by get_path_cache_key
+#each path remembers the level segments it goes through, so a change to the level only removes the paths that go through the changed area
+#(paths that a change would make shorter aren't removed, they just stop being the best path until they are evicted)
+class Path_Cache():
+    def __init__(self, node_map, max_size=None):
+        self.node_map = node_map
+        if max_size is None:
+            max_size = g.PATH_CACHE_SIZE
+        self.max_size = max_size
+
+        #key: (path, segments)
+        self.entries = OrderedDict()
+        #the keys of the paths going through each segment index (sx*segments_height+sy)
+        self.segment_keys = {}
+
+        #counters for sizing the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def add(self, key, path):
+        if self.max_size <= 0:
+            return
+        if key in self.entries:
+            self.remove(key)
+
+        segments = self.get_path_segments(path)
+        self.entries[key] = (path, segments)
+        for segment in segments:
+            self.segment_keys.setdefault(segment, set()).add(key)
+
+        while len(self.entries) > self.max_size:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        path, segments = self.entries.pop(key)
+        for segment in segments:
+            keys = self.segment_keys[segment]
+            keys.discard(key)
+            if not keys:
+                del self.segment_keys[segment]
+
+    #get the segments covered by the connections along a path
+    def get_path_segments(self, path):
+        level = self.node_map.level
+        positions = self.node_map.get_graph().positions[list(path)].tolist()
+        segments = set()
+        for (x1, y1), (x2, y2) in zip(positions, positions[1:] or positions):
+            rect = p.Rect(int(min(x1, x2)), int(min(y1, y2)), int(abs(x2-x1))+1, int(abs(y2-y1))+1)
+            sx, sy, ex, ey = level.get_segment_range(rect)
+            for x in range(sx, ex):
+                for y in range(sy, ey):
+                    segments.add((x*level.segments_height)+y)
+        return segments
+
+    #remove the paths going through the segments a rect overlaps (every path if rect is None)
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.clear()
+            return
+
+        level = self.node_map.level
+        sx, sy, ex, ey = level.get_segment_range(rect)
+        for x in range(sx, ex):
+            for y in range(sy, ey):
+                for key in list(self.segment_keys.get((x*level.segments_height)+y, ())):
+                    self.remove(key)
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.segment_keys = {}
+
+    def get_hit_rate(self):
+        total = self.hits+self.misses
+        if not total:
+            return 0
+        return self.hits/total
+
+#shared navigation towards one target (a game object or a position) for any number of creatures
+#holds the cost from every node to the target's node, so the next node to move to from anywhere is a single lookup
+#when the target moves to a different node the field is rebuilt over the next few ticks (node_budget nodes per tick),
+#and the old field keeps being used until the new one is finished
+class Flow_Field():
+    def __init__(self, node_map, target, node_budget=None):
+        self.node_map = node_map
+        self.target = target
+        if node_budget is None:
+            node_budget = g.FLOW_FIELD_NODE_BUDGET
+        self.node_budget = node_budget
+
+        #the finished field that is read from, and the one being built
+        self.field = None
+        self.new_field = None
+        self.target_node_id = -1
+        self.deleted = False
+
+        g.flow_fields.add(self)
+        self.update()
+
+    def get_target_pos(self):
+        if isinstance(self.target, tuple):
+            return self.target
+        return self.target.rect.center
+
+    #get the id of the node a position is at, using the grid cell when the node map is a grid
+    def get_node_id(self, pos):
+        node_id = self.node_map.get_graph().get_cell_node(pos[0], pos[1])
+        if node_id == -1:
+            node = get_nearest_node(self.node_map, pos)
+            if node is None:
+                return -1
+            node_id = node.id
+        return node_id
+
+    def update(self):
+        if not isinstance(self.target, tuple) and self.target.deleted:
+            self.delete()
+            return
+
+        #start a new field if the target has moved to another node or the nodes have changed
+        #a field that is already being built is finished first, otherwise a target that keeps moving could stop it from ever finishing
+        if self.new_field is None:
+            graph = self.node_map.get_graph()
+            target_node_id = self.get_node_id(self.get_target_pos())
+            if target_node_id != self.target_node_id or (self.field is not None and self.field.graph is not graph):
+                self.target_node_id = target_node_id
+                if target_node_id != -1:
+                    self.new_field = pathfinding.Integration_Field(graph, [target_node_id])
+
+        if self.new_field is not None:
+            #there's nothing to use until the first field is finished, so that one is done all at once
+            if self.new_field.step(self.node_budget if self.field is not None else None):
+                self.field = self.new_field
+                self.new_field = None
+
+    #get the id of the node to move to next from a node, or -1 if it is the target or can't reach it
+    def get_next_node_id(self, node_id):
+        if self.field is None or node_id < 0 or node_id >= len(self.field.next_nodes):
+            return -1
+        return int(self.field.next_nodes[node_id])
+
+    #get the position to move towards next to reach the target, or None if there isn't one
+    def get_next_pos(self, pos):
+        next_node_id = self.get_next_node_id(self.get_node_id(pos))
+        if next_node_id == -1:
+            return None
+        x, y = self.field.graph.positions[next_node_id].tolist()
+        return (x, y)
+
+    #get the cost of the path from a position to the target, or None if it can't reach it
+    def get_cost(self, pos):
+        node_id = self.get_node_id(pos)
+        if self.field is None or node_id < 0 or node_id >= len(self.field.costs) or self.field.states[node_id] != 2:
+            return None
+        return float(self.field.costs[node_id])
+
+    def delete(self):
+        self.deleted = True
+        g.flow_fields.discard(self)
+
+#abstract graph over a node map's level segments for hierarchical (HPA*) pathfinding over long distances
+#the connections crossing from one segment to another are grouped into entrances, and the node in the middle of each entrance becomes an abstract node
+#abstract nodes in the same segment are connected with the cost of the cheapest path between them that stays inside the segment
+#paths are found by searching the small abstract graph, then filling in the nodes inside each segment on the route
+#only the segments that have been invalidated (by their nodes, tiles or structures changing) are worked out again
+class Segment_Graph():
+    def __init__(self, node_map):
+        self.node_map = node_map
+        self.level = node_map.level
+
+        #the node map's graph that this was made from
+        self.graph = None
+        self.node_count = 0
+        #the segment index (sx*segments_height+sy) of each node, -1 for dead nodes
+        self.node_segments = None
+
+        #by segment index: the ids of the nodes in the segment, the connections between them as a Nav_Graph (indexed by position in the ids),
+        #the chosen crossing connections (start id, end id, weight) leaving it, and an Integration_Field inside it towards each abstract node in it
+        self.segment_nodes = {}
+        self.local_graphs = {}
+        self.transitions = {}
+        self.fields = {}
+
+        self.dirty_segments = set()
+        self.all_dirty = True
+
+        #the compiled abstract graph, and the node id of each abstract node
+        self.abstract_graph = None
+        self.abstract_ids = None
+        self.abstract_index = None
+        #the index of each abstract node's spare connection, see find_path
+        self.spare_connections = None
+
+    #mark the segments a rect overlaps as needing to be worked out again (every segment if rect is None)
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.all_dirty = True
+            return
+
+        sx, sy, ex, ey = self.level.get_segment_range(rect)
+        for x in range(sx, ex):
+            for y in range(sy, ey):
+                self.dirty_segments.add((x*self.level.segments_height)+y)
+
+    #get the segments within reach segments of a segment
+    def get_nearby_segments(self, segment, reach):
+        width, height = self.level.segments_width, self.level.segments_height
+        sx, sy = divmod(segment, height)
+        return [(x*height)+y for x in range(max(sx-reach, 0), min(sx+reach+1, width)) for y in range(max(sy-reach, 0), min(sy+reach+1, height))]
+
+    #bring the abstract graph up to date with the node map
+    def update(self):
+        graph = self.node_map.get_graph()
+        if graph is self.graph and not self.dirty_segments and not self.all_dirty:
+            return
+
+        level = self.level
+        if graph.node_count != self.node_count:
+            self.all_dirty = True
+        self.graph = graph
+        self.node_count = graph.node_count
+
+        sx = np.clip(np.floor((graph.positions[:, 0]-level.x)/level.segment_width), 0, level.segments_width-1).astype(np.int64)
+        sy = np.clip(np.floor((graph.positions[:, 1]-level.y)/level.segment_height), 0, level.segments_height-1).astype(np.int64)
+        node_segments = (sx*level.segments_height)+sy
+        node_segments[graph.alive == 0] = -1
+        self.node_segments = node_segments
+
+        #node ids grouped by segment (in increasing order in each segment)
+        segment_count = level.segments_width*level.segments_height
+        order = np.argsort(node_segments, kind="stable")
+        bounds = np.searchsorted(node_segments[order], np.arange(segment_count+1))
+
+        if self.all_dirty:
+            self.segment_nodes = {}
+            self.local_graphs = {}
+            self.transitions = {}
+            self.fields = {}
+            dirty_segments = set(range(segment_count))
+            changed_segments = dirty_segments
+        else:
+            #the crossing connections and abstract nodes of segments next to the dirty ones can change too
+            dirty_segments = self.dirty_segments
+            reach = 1
+            if graph.weights.size:
+                reach = max(int(m.ceil(graph.weights.max()/min(level.segment_width, level.segment_height))), 1)
+            changed_segments = set()
+            for segment in dirty_segments:
+                changed_segments.update(self.get_nearby_segments(segment, reach))
+        self.dirty_segments = set()
+        self.all_dirty = False
+
+        for segment in changed_segments:
+            ids = order[bounds[segment]:bounds[segment+1]]
+            if not ids.size:
+                for segment_dict in (self.segment_nodes, self.local_graphs, self.transitions, self.fields):
+                    segment_dict.pop(segment, None)
+                continue
+
+            local_graph, crossings = self.get_segment_connections(segment, ids)
+            if segment in dirty_segments or segment not in self.local_graphs:
+                self.segment_nodes[segment] = ids
+                self.local_graphs[segment] = local_graph
+                self.fields[segment] = {}
+            self.transitions[segment] = self.get_transitions(segment, crossings)
+
+        #the abstract nodes of a segment are the ends of the transitions leaving and entering it
+        entrances = {segment:set() for segment in changed_segments if segment in self.local_graphs}
+        for transitions in self.transitions.values():
+            for start, end, weight in transitions:
+                for node_id in (start, end):
+                    segment = int(node_segments[node_id])
+                    if segment in entrances:
+                        entrances[segment].add(node_id)
+
+        #fields for abstract nodes that haven't changed are kept
+        for segment, segment_entrances in entrances.items():
+            ids = self.segment_nodes[segment]
+            old_fields = self.fields[segment]
+            fields = {}
+            for entrance in sorted(segment_entrances):
+                field = old_fields.get(entrance)
+                if field is None:
+                    field = pathfinding.Integration_Field(self.local_graphs[segment], [int(np.searchsorted(ids, entrance))])
+                    field.step()
+                fields[entrance] = field
+            self.fields[segment] = fields
+
+        self.compile()
+
+    #get the connections between the nodes in a segment as a Nav_Graph, and the connections leaving it as (start ids, end ids, weights, end segments)
+    def get_segment_connections(self, segment, ids):
+        graph = self.graph
+        row_starts = graph.indptr[ids].astype(np.int64)
+        row_lengths = graph.indptr[ids+1]-row_starts
+        rows = np.repeat(np.arange(ids.size), row_lengths)
+        connection_indices = np.arange(row_lengths.sum())+np.repeat(row_starts-(np.cumsum(row_lengths)-row_lengths), row_lengths)
+
+        ends = graph.indices[connection_indices]
+        weights = graph.weights[connection_indices]
+        end_segments = self.node_segments[ends]
+
+        inside = end_segments == segment
+        indptr = np.zeros(ids.size+1, dtype=np.intc)
+        np.cumsum(np.bincount(rows[inside], minlength=ids.size), out=indptr[1:])
+        local_graph = pathfinding.Nav_Graph(graph.positions[ids], indptr, np.searchsorted(ids, ends[inside]), weights[inside])
+
+        crossing = (end_segments != segment) & (end_segments >= 0)
+        crossings = (ids[rows[crossing]], ends[crossing], weights[crossing], end_segments[crossing])
+        return local_graph, crossings
+
+    #choose which crossing connections leaving a segment are used by the abstract graph
+    #the starts of the crossings into each other segment are grouped into entrances by whether they are connected to each other,
+    #and the crossing from the node nearest the middle of each entrance is used
+    def get_transitions(self, segment, crossings):
+        starts, ends, weights, end_segments = crossings
+        ids = self.segment_nodes[segment]
+        local_graph = self.local_graphs[segment]
+
+        transitions = []
+        for end_segment in np.unique(end_segments).tolist():
+            #the cheapest crossing from each node
+            best_crossings = {}
+            into_segment = end_segments == end_segment
+            for start, end, weight in zip(starts[into_segment].tolist(), ends[into_segment].tolist(), weights[into_segment].tolist()):
+                if start not in best_crossings or weight < best_crossings[start][1]:
+                    best_crossings[start] = (end, weight)
+
+            local_starts = np.searchsorted(ids, list(best_crossings)).tolist()
+            unvisited = set(local_starts)
+            for local_start in local_starts:
+                if local_start not in unvisited:
+                    continue
+                unvisited.remove(local_start)
+                entrance = [local_start]
+                for node in entrance:
+                    for neighbour in local_graph.indices[local_graph.indptr[node]:local_graph.indptr[node+1]].tolist():
+                        if neighbour in unvisited:
+                            unvisited.remove(neighbour)
+                            entrance.append(neighbour)
+
+                positions = local_graph.positions[entrance]
+                offsets = positions-positions.mean(axis=0)
+                start = int(ids[entrance[int(np.argmin(np.hypot(offsets[:, 0], offsets[:, 1])))]])
+                end, weight = best_crossings[start]
+                transitions.append((start, end, weight))
+
+        return transitions
+
+    def compile(self):
+        abstract_ids = np.array(sorted(entrance for fields in self.fields.values() for entrance in fields), dtype=np.int64)
+        abstract_count = abstract_ids.size
+        abstract_index = np.full(self.node_count, -1, dtype=np.int64)
+        abstract_index[abstract_ids] = np.arange(abstract_count)
+
+        starts = []
+        ends = []
+        weights = []
+        #connections between the abstract nodes in each segment
+        for segment, fields in self.fields.items():
+            if not fields:
+                continue
+            entrances = np.fromiter(fields, dtype=np.int64, count=len(fields))
+            local_entrances = np.searchsorted(self.segment_nodes[segment], entrances)
+            for target, field in fields.items():
+                reached = (field.states[local_entrances] == 2) & (entrances != target)
+                starts.append(abstract_index[entrances[reached]])
+                ends.append(np.full(np.count_nonzero(reached), abstract_index[target]))
+                weights.append(field.costs[local_entrances[reached]])
+
+        #the transitions between segments
+        transitions = np.array([transition for transitions in self.transitions.values() for transition in transitions], dtype=np.float64).reshape(-1, 3)
+        transition_starts = abstract_index[transitions[:, 0].astype(np.int64)]
+        transition_ends = abstract_index[transitions[:, 1].astype(np.int64)]
+        valid = (transition_starts >= 0) & (transition_ends >= 0)
+        starts.append(transition_starts[valid])
+        ends.append(transition_ends[valid])
+        weights.append(transitions[valid, 2])
+
+        #every abstract node gets a spare connection (a loop back to itself, which is never followed) that find_path points at the goal
+        starts.append(np.arange(abstract_count))
+        ends.append(np.arange(abstract_count))
+        weights.append(np.zeros(abstract_count))
+
+        starts = np.concatenate(starts)
+        order = np.argsort(starts, kind="stable")
+        indptr = np.zeros(abstract_count+1, dtype=np.intc)
+        np.cumsum(np.bincount(starts, minlength=abstract_count), out=indptr[1:])
+
+        self.abstract_graph = pathfinding.Nav_Graph(self.graph.positions[abstract_ids], indptr, np.concatenate(ends)[order], np.concatenate(weights)[order])
+        self.abstract_ids = abstract_ids
+        self.abstract_index = abstract_index
+        #the spare connections were added last, so they are at the end of each node's connections
+        self.spare_connections = indptr[1:]-1
+
+    #find a path of node ids between 2 node ids, returns None if the abstract graph can't find a complete path
+    def find_path(self, start, goal, max_nodes=None):
+        self.update()
+        if start == goal:
+            return [start]
+
+        node_segments = self.node_segments
+        start_segment = int(node_segments[start])
+        goal_segment = int(node_segments[goal])
+        if start_segment < 0 or goal_segment < 0:
+            return None
+
+        #the cost from each node in the goal's segment to the goal
+        goal_ids = self.segment_nodes[goal_segment]
+        goal_field = pathfinding.Integration_Field(self.local_graphs[goal_segment], [int(np.searchsorted(goal_ids, goal))])
+        goal_field.step()
+
+        #the start and goal are added to the abstract graph for this search, the goal as node abstract_count and the start after it
+        abstract_graph = self.abstract_graph
+        abstract_count = self.abstract_ids.size
+        goal_node = abstract_count
+        start_node = abstract_count+1
+
+        indices = abstract_graph.indices.copy()
+        weights = abstract_graph.weights.copy()
+        for entrance in self.fields[goal_segment]:
+            local_entrance = np.searchsorted(goal_ids, entrance)
+            if goal_field.states[local_entrance] == 2:
+                spare_connection = self.spare_connections[self.abstract_index[entrance]]
+                indices[spare_connection] = goal_node
+                weights[spare_connection] = goal_field.costs[local_entrance]
+
+        start_ids = self.segment_nodes[start_segment]
+        local_start = np.searchsorted(start_ids, start)
+        start_ends = []
+        start_weights = []
+        for entrance, field in self.fields[start_segment].items():
+            if field.states[local_start] == 2:
+                start_ends.append(self.abstract_index[entrance])
+                start_weights.append(field.costs[local_start])
+        if start_segment == goal_segment and goal_field.states[local_start] == 2:
+            start_ends.append(goal_node)
+            start_weights.append(goal_field.costs[local_start])
+
+        connection_count = indices.size
+        indptr = np.concatenate((abstract_graph.indptr, (connection_count, connection_count+len(start_ends))))
+        positions = np.concatenate((abstract_graph.positions, self.graph.positions[[goal, start]]))
+        search_graph = pathfinding.Nav_Graph(positions, indptr, np.concatenate((indices, np.array(start_ends, dtype=np.intc))),
+                                             np.concatenate((weights, np.array(start_weights, dtype=np.float64))))
+        route = pathfinding.find_path(search_graph, start_node, goal_node, max_nodes=max_nodes)
+        if route[-1] != goal_node:
+            return None
+
+        #fill in the nodes between the abstract nodes, crossings between segments are single connections
+        path = [start]
+        for abstract_node in route[1:]:
+            current = path[-1]
+            if abstract_node == goal_node:
+                target = goal
+                field = goal_field
             else:
-                node_connection_radius = node_spacing
+                target = int(self.abstract_ids[abstract_node])
+                field = self.fields[int(node_segments[current])].get(target)
+            if target == current:
+                continue
+            if node_segments[target] != node_segments[current]:
+                path.append(target)
+                continue
+
+            ids = self.segment_nodes[int(node_segments[current])]
+            local_node = int(np.searchsorted(ids, current))
+            next_nodes = field.next_nodes
+            while path[-1] != target:
+                local_node = int(next_nodes[local_node])
+                path.append(int(ids[local_node]))
+
+        return path
+
+#handle for a path or sightline worked out in the background (see request_path and request_sightline)
+#poll done on later ticks, result is set once it is done
+class Query():
+    def __init__(self, finish=None):
+        #called on the main thread with what the worker returned, to turn it into the result
+        self.finish = finish
+        self.done = False
+        self.result = None
+        self.cancelled = False
+
+    #the result will never be set, but the work may already be running
+    def cancel(self):
+        self.cancelled = True
+
+    def deliver(self, value):
+        if self.finish is not None:
+            value = self.finish(value)
+        self.result = value
+        self.done = True
+
+#threads that run query jobs on data that isn't changed while they run (Nav_Graphs and solidity snapshots)
+#the jobs mostly run in pathfinding kernels that release the GIL, so they don't stall the game while it is updating
+#finished jobs wait in a queue until update hands them back on the main thread, at most delivery_budget per tick
+class Query_Pool():
+    def __init__(self, workers=None, delivery_budget=None):
+        if workers is None:
+            workers = g.PATHFINDING_WORKERS
+        if delivery_budget is None:
+            delivery_budget = g.QUERY_DELIVERY_BUDGET
+        self.delivery_budget = delivery_budget
+
+        #with no workers jobs are run straight away when they are submitted, but are still delivered by update
+        if workers > 0:
+            self.executor = futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="POT_query")
         else:
-            node_connection_radius = node_connection_radius_override
-    
-        node_mask = p.Mask((node_spacing, node_spacing),fill=True)
-        
-        for x in range(int(level.rect.w/node_spacing)):
-            for y in range(int(level.rect.h/node_spacing)):
-                solid = False
-                rect = p.Rect( level.x+(x*node_spacing), level.y+(y*node_spacing), node_spacing, node_spacing)
-    
-                if isinstance(level, levels.Mask_Level):
-                    mask = node_mask 
-                else:
-                    mask = None
-                
-                solid = level.check_collision(rect, mask)
-                                  
-                if not solid:
-                    node = Node(rect.centerx, rect.centery, self, collision_dict, radius=node_radius, connection_radius=node_connection_radius)
-                    node.connect(cardinal=cardinal, diagonal=diagonal, all_directions=all_directions)
+            self.executor = None
+        self.finished = queue.SimpleQueue()
+
+    def submit(self, query, job, *args):
+        if self.executor is None:
+            self.run(query, job, args)
+        else:
+            self.executor.submit(self.run, query, job, args)
+        return query
+
+    def run(self, query, job, args):
+        if query.cancelled:
+            return
+        try:
+            self.finished.put((query, job(*args), None))
+        except Exception as error:
+            self.finished.put((query, None, error))
+
+    #hand back finished queries, errors from jobs are raised here so they aren't lost on the worker threads
+    def update(self):
+        delivered = 0
+        while delivered < self.delivery_budget:
+            try:
+                query, value, error = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if query.cancelled:
+                continue
+            if error is not None:
+                raise error
+            query.deliver(value)
+            delivered += 1
+
+    def get_waiting_count(self):
+        return self.finished.qsize()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
 
 def draw_path(path):
     for node in path:
         node.draw()
 
 
-def generate_from_level(node_map, level, node_spacing, collision_dict, node_radius=5, node_connection_radius_override=None, cardinal=False, diagonal=False, all_directions=True):
+#check which cells of a node_spacing sized grid over the level are clear of collision, cell_range is an optional (sx, sy, ex, ey) range of cells
+#returns a 2d boolean array in [x][y] order
+def get_walkable_cells(level, node_spacing, cell_range=None):
+    if cell_range is None:
+        cell_range = (0, 0, int(level.rect.w/node_spacing), int(level.rect.h/node_spacing))
+    sx, sy, ex, ey = cell_range
+
+    #check every potential node rect against the level at once
+    cell_x, cell_y = np.meshgrid(np.arange(sx, ex), np.arange(sy, ey), indexing="ij")
+    rects = np.empty((cell_x.size, 4), dtype=np.int64)
+    rects[:, 0] = level.x+(cell_x.ravel()*node_spacing)
+    rects[:, 1] = level.y+(cell_y.ravel()*node_spacing)
+    rects[:, 2] = node_spacing
+    rects[:, 3] = node_spacing
+
+    solid, indices = level.check_collision_many(rects)
+    return ~solid.reshape(ex-sx, ey-sy)
+
+#get the connections between the walkable cells of a grid as CSR arrays (indptr, indices, weights), with the node id of a cell being x*height+y
+#cells within the connection radius (and in an allowed direction) are connected if the rect covering both node rects is clear
+#node rects that fit in their cells only need to check the walkable cells, so diagonal connections can't cut corners
+def get_connections(level, walkable, node_spacing, node_radius, node_connection_radius, cardinal=False, diagonal=False, all_directions=True):
+    width, height = walkable.shape
+    ids = np.arange(width*height).reshape(width, height)
+    reach = int(node_connection_radius//node_spacing)
+
+    starts = []
+    ends = []
+    weights = []
+    for dx in range(-reach, reach+1):
+        for dy in range(-reach, reach+1):
+            distance = util.get_distance(0, 0, dx*node_spacing, dy*node_spacing)
+            if (dx == 0 and dy == 0) or distance > node_connection_radius+1e-9:
+                continue
+            if not all_directions:
+                if not ((cardinal and (dx == 0 or dy == 0)) or (diagonal and abs(dx) == abs(dy))):
+                    continue
+
+            #the range of cells that have another cell at this offset
+            sx, ex = max(-dx, 0), width-max(dx, 0)
+            sy, ey = max(-dy, 0), height-max(dy, 0)
+            if sx >= ex or sy >= ey:
+                continue
+
+            can_connect = walkable[sx:ex, sy:ey] & walkable[sx+dx:ex+dx, sy+dy:ey+dy]
+            if abs(dx) <= 1 and abs(dy) <= 1 and node_radius*2 <= node_spacing:
+                if dx and dy:
+                    can_connect &= walkable[sx+dx:ex+dx, sy:ey] & walkable[sx:ex, sy+dy:ey+dy]
+            else:
+                cell_x, cell_y = np.nonzero(can_connect)
+                rects = np.empty((cell_x.size, 4), dtype=np.int64)
+                rects[:, 0] = level.x+((cell_x+sx+min(dx, 0))*node_spacing)+(node_spacing//2)-node_radius
+                rects[:, 1] = level.y+((cell_y+sy+min(dy, 0))*node_spacing)+(node_spacing//2)-node_radius
+                rects[:, 2] = (abs(dx)*node_spacing)+(node_radius*2)
+                rects[:, 3] = (abs(dy)*node_spacing)+(node_radius*2)
+                blocked, indices = level.check_collision_many(rects)
+                can_connect[cell_x[blocked], cell_y[blocked]] = False
+
+            start_ids = ids[sx:ex, sy:ey][can_connect]
+            starts.append(start_ids)
+            ends.append(start_ids+(dx*height)+dy)
+            weights.append(np.full(start_ids.size, distance))
+
+    if starts:
+        starts = np.concatenate(starts)
+        order = np.argsort(starts, kind="stable")
+        indices = np.concatenate(ends)[order]
+        weights = np.concatenate(weights)[order]
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+        indices = np.zeros(0, dtype=np.intc)
+        weights = np.zeros(0)
+
+    indptr = np.zeros((width*height)+1, dtype=np.intc)
+    np.cumsum(np.bincount(starts, minlength=width*height), out=indptr[1:])
+    return indptr, indices, weights
+
+#generate a grid of nodes over the level in bulk, straight from its collision data
+#the result is stored as a Nav_Graph, and Node objects are only made when they are asked for (see Node_Map.get_node)
+#walkable can be given to choose which cells get nodes instead of working it out from the level's collision (the cache isn't used then)
+def generate_from_level(node_map, level, node_spacing, collision_dict, node_radius=5, node_connection_radius_override=None, cardinal=False, diagonal=False, all_directions=True,
+walkable=None):
     if node_connection_radius_override is None:
         if diagonal:
             node_connection_radius = ((node_spacing**2)+(node_spacing**2))**0.5
@@ -183,59 +1191,193 @@ def generate_from_level(node_map, level, node_spacing, collision_dict, node_radi
     else:
         node_connection_radius = node_connection_radius_override
 
-    node_mask = p.Mask((node_spacing, node_spacing),fill=True)
-    
-    for x in range(int(level.rect.w/node_spacing)):
-        for y in range(int(level.rect.h/node_spacing)):
-            solid = False
-            rect = p.Rect( level.x+(x*node_spacing), level.y+(y*node_spacing), node_spacing, node_spacing)
+    generation_settings = {"node_spacing":node_spacing, "node_radius":node_radius, "node_connection_radius":node_connection_radius,
+                           "cardinal":cardinal, "diagonal":diagonal, "all_directions":all_directions}
 
-            if isinstance(level, levels.Mask_Level):
-                mask = node_mask 
-            else:
-                mask = None
-            
-            solid = level.check_collision(rect, mask)
-                              
-            if not solid:
-                node = Node(rect.centerx, rect.centery, node_map, collision_dict, radius=node_radius, connection_radius=node_connection_radius)
-                node.connect(cardinal=cardinal, diagonal=diagonal, all_directions=all_directions)
+    #use the saved copy of the node map if this level has been generated with the same settings before
+    cache_path = None
+    if g.ENABLE_NODE_MAP_CACHE and walkable is None:
+        cache_key = get_node_map_cache_key(level, collision_dict, generation_settings)
+        if cache_key is not None:
+            cache_path = g.NODE_MAP_CACHE_DIR+cache_key+NODE_MAP_FILE_EXTENSION
+            if os.path.exists(cache_path) and load_node_map(node_map, cache_path, load_zones=False):
+                return
 
-def get_nearest_node(node_map, pos, max_segment_offset=2):
-    original_sx = int( (pos[0]-node_map.level.x) / node_map.level.segment_size)-(max_segment_offset)
-    original_sy = int( (pos[1]-node_map.level.y) / node_map.level.segment_size)-(max_segment_offset)
-    nodes = []
+    if walkable is None:
+        walkable = get_walkable_cells(level, node_spacing)
+    width, height = walkable.shape
+    indptr, indices, weights = get_connections(level, walkable, node_spacing, node_radius, node_connection_radius, cardinal=cardinal, diagonal=diagonal, all_directions=all_directions)
 
-    for ax in range(max_segment_offset*2):
-        for ay in range(max_segment_offset*2):
-            sx = original_sx+ax#max(min(original_sx+ax, node_map.level.segments_width-1),0)
-            sy = original_sy+ay#max(min(original_sy+ay, node_map.level.segments_height-1),0)
+    #every cell gets a node id, the nodes of solid cells are just dead
+    cell_x, cell_y = np.meshgrid(np.arange(width), np.arange(height), indexing="ij")
+    positions = np.empty((width*height, 2))
+    positions[:, 0] = level.x+(cell_x.ravel()*node_spacing)+(node_spacing//2)
+    positions[:, 1] = level.y+(cell_y.ravel()*node_spacing)+(node_spacing//2)
 
-            if sx < 0:
-                sx += int(node_map.level.width/node_map.level.segment_size)
+    node_map.clear()
+    node_map.collision_dict = collision_dict
+    node_map.node_radius = node_radius
+    node_map.node_connection_radius = node_connection_radius
+    node_map.grid_spacing = node_spacing
+    node_map.grid_origin = (level.x, level.y)
+    node_map.walkable = walkable
+    node_map.generation_settings = generation_settings
 
-            if sx >= int(node_map.level.width/node_map.level.segment_size):
-                sx -= int(node_map.level.width/node_map.level.segment_size)
+    node_map.nodes = [None]*(width*height)
+    node_map.graph = pathfinding.Nav_Graph(positions, indptr, indices, weights, walkable.ravel(), grid_spacing=node_spacing, grid_origin=(level.x, level.y))
+    node_map.lazy = True
 
-            if sy < 0:
-                sy += int(node_map.level.height/node_map.level.segment_size)
+    if cache_path is not None:
+        #the cache is only there to speed up loading, so failing to write it shouldn't stop the level from loading
+        try:
+            os.makedirs(g.NODE_MAP_CACHE_DIR, exist_ok=True)
+            save_node_map(node_map, cache_path)
+        except OSError:
+            pass
 
-            if sy >= int(node_map.level.height/node_map.level.segment_size):
-                sy -= int(node_map.level.height/node_map.level.segment_size)
+#get the name a generated node map is cached under, a hash of everything that affects the generated nodes
+#returns None if the level's collision can't be hashed
+def get_node_map_cache_key(level, collision_dict, generation_settings):
+    collision_data = level.get_collision_data()
+    if collision_data is None:
+        return None
 
-            segment = node_map.level.segments[sx][sy]
-            nodes += segment.nodes
+    key_hash = hashlib.sha1()
+    key_hash.update(NODE_MAP_FILE_MAGIC+NODE_MAP_FILE_VERSION.to_bytes(4, "little"))
+    key_hash.update(collision_data)
+    key_hash.update(repr(sorted(collision_dict.items())).encode())
+    key_hash.update(repr(sorted(generation_settings.items())).encode())
+    return key_hash.hexdigest()
+
+#save a node map's graph, zones and settings to a binary file
+#the file is a short json header describing the arrays, followed by the raw (aligned) array data, so it can be memory mapped when it is loaded
+#only what the graph stores is saved, so nodes come back as plain nodes (without their node_type)
+def save_node_map(node_map, path):
+    graph = node_map.get_graph()
+
+    arrays = {"positions":graph.positions, "indptr":graph.indptr, "indices":graph.indices, "weights":graph.weights, "alive":graph.alive,
+              "zone_rects":np.array([tuple(zone.rect) for zone in node_map.zones], dtype=np.int64).reshape(-1, 4)}
+    if node_map.walkable is not None:
+        arrays["walkable"] = node_map.walkable
+    if graph.grid is not None:
+        arrays["grid"] = graph.grid
+        arrays["cells"] = graph.cells
+
+    array_info = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        array_info[name] = (array.dtype.str, array.shape, offset)
+        offset += -(-array.nbytes//NODE_MAP_FILE_ALIGNMENT)*NODE_MAP_FILE_ALIGNMENT
+
+    header = {"version":NODE_MAP_FILE_VERSION, "arrays":array_info, "zone_types":[zone.zone_type for zone in node_map.zones],
+              "collision_dict":node_map.collision_dict, "node_radius":node_map.node_radius, "node_connection_radius":node_map.node_connection_radius,
+              "grid_spacing":graph.grid_spacing, "grid_origin":tuple(graph.grid_origin), "generation_settings":node_map.generation_settings}
+    header_data = json.dumps(header).encode()
+    data_start = get_node_map_data_start(len(header_data))
+
+    #write to a temporary file first, so a half written file is never loaded
+    temp_path = path+".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(NODE_MAP_FILE_MAGIC)
+        file.write(len(header_data).to_bytes(4, "little"))
+        file.write(header_data)
+        for name, array in arrays.items():
+            file.seek(data_start+array_info[name][2])
+            file.write(array.tobytes())
+        file.truncate(data_start+offset)
+    os.replace(temp_path, path)
+
+#load a node map saved with save_node_map, the arrays are memory mapped rather than read into memory
+#returns False if the file isn't a valid node map file
+def load_node_map(node_map, path, load_zones=True):
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(NODE_MAP_FILE_MAGIC)) != NODE_MAP_FILE_MAGIC:
+                return False
+            header_length = int.from_bytes(file.read(4), "little")
+            header = json.loads(file.read(header_length))
+        if header["version"] != NODE_MAP_FILE_VERSION:
+            return False
+
+        #copy on write, so the arrays can still be used by code that needs writable buffers without changing the file
+        data = np.memmap(path, dtype=np.uint8, mode="c")
+        data_start = get_node_map_data_start(header_length)
+        arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            dtype = np.dtype(dtype)
+            start = data_start+offset
+            arrays[name] = data[start:start+(int(np.prod(shape))*dtype.itemsize)].view(dtype).reshape(shape)
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    node_map.clear()
+    node_map.collision_dict = header["collision_dict"]
+    node_map.node_radius = header["node_radius"]
+    node_map.node_connection_radius = header["node_connection_radius"]
+    node_map.grid_spacing = header["grid_spacing"]
+    node_map.grid_origin = tuple(header["grid_origin"])
+    node_map.walkable = arrays.get("walkable")
+    node_map.generation_settings = header["generation_settings"]
 
-    closest_node = None
-    smallest_distance = None
-    for node in nodes:
-        dist = util.get_distance(pos[0], pos[1], node.x, node.y)
-        if closest_node is None or dist < smallest_distance:
-            closest_node = node
-            smallest_distance = dist
+    #the jump point search grid was checked when the file was saved, so it doesn't need to be worked out again
+    graph = pathfinding.Nav_Graph(arrays["positions"], arrays["indptr"], arrays["indices"], arrays["weights"], arrays["alive"])
+    graph.grid_spacing = node_map.grid_spacing
+    graph.grid_origin = node_map.grid_origin
+    graph.grid = arrays.get("grid")
+    graph.cells = arrays.get("cells")
 
-    return closest_node
+    node_map.nodes = [None]*graph.node_count
+    node_map.graph = graph
+    node_map.lazy = True
 
+    if load_zones:
+        node_map.zones = []
+        for rect, zone_type in zip(arrays["zone_rects"].tolist(), header["zone_types"]):
+            Zone(p.Rect(rect), zone_type, node_map)
+
+    return True
+
+def get_node_map_data_start(header_length):
+    header_end = len(NODE_MAP_FILE_MAGIC)+4+header_length
+    return -(-header_end//NODE_MAP_FILE_ALIGNMENT)*NODE_MAP_FILE_ALIGNMENT
+
+#max_segment_offset is no longer used, the nearest node is found wherever it is
+def get_nearest_node(node_map, pos, max_segment_offset=2):
+    for distance, node_id in node_map.get_node_index().iter_nearest(pos[0], pos[1]):
+        return node_map.get_node(node_id)
+    return None
+
+#get the k nearest nodes to a position, nearest first
+def get_nearest_nodes(node_map, pos, k, max_distance=None):
+    nodes = []
+    for distance, node_id in node_map.get_node_index().iter_nearest(pos[0], pos[1], max_distance=max_distance):
+        nodes.append(node_map.get_node(node_id))
+        if len(nodes) >= k:
+            break
+    return nodes
+
+#get the nearest node that can be walked to in a straight line from a position (without going through the level)
+#if from_node is given the node also has to be connected to it, so a path can be found between them
+#max_checks limits how many of the nearest nodes are tried before giving up and returning None
+def get_nearest_reachable_node(node_map, pos, from_node=None, max_distance=None, max_checks=32):
+    if from_node is not None:
+        components = node_map.get_graph().get_components()
+        component = components[from_node.id]
+
+    level = node_map.level
+    for i, (distance, node_id) in enumerate(node_map.get_node_index().iter_nearest(pos[0], pos[1], max_distance=max_distance)):
+        if i >= max_checks:
+            break
+        if from_node is not None and components[node_id] != component:
+            continue
+        x, y = node_map.get_node_index().positions[node_id].tolist()
+        if not level.check_line_collision(pos, (x, y)):
+            return node_map.get_node(node_id)
+    return None
+
+#old exhaustive search, kept for scripts that use it directly (get_path uses A* through pathfinding.find_path)
 def get_path_recursive(start_node, goal_node, node_count, max_nodes, visited_nodes):
     visited_nodes = visited_nodes[:]
     if node_count == max_nodes:
@@ -261,7 +1403,12 @@ def get_path_recursive(start_node, goal_node, node_count, max_nodes, visited_nod
         else:
             return visited_nodes
         
-def get_path(node_map, start_pos, goal_pos, max_nodes=5):
+#get the list of nodes from the start to the goal, positions are replaced with their nearest node
+#max_nodes is how many nodes the search can expand (g.PATHFINDING_NODE_BUDGET by default). If the goal can't be reached within it
+#the path to the closest node to the goal is returned, so check path[-1] == goal_node to see if the path is complete
+#jump_points uses jump point search, which is quicker on open grids but only works for node maps generated with diagonal connections
+#hierarchical uses the node map's Segment_Graph, which is much faster for long paths on big maps but the paths aren't always the shortest
+def get_path(node_map, start_pos, goal_pos, max_nodes=None, jump_points=False, hierarchical=False):
     if isinstance(start_pos, Node):
         start_node = start_pos
     else:
@@ -273,11 +1420,30 @@ def get_path(node_map, start_pos, goal_pos, max_nodes=5):
         goal_node = get_nearest_node(node_map, goal_pos)
 
     if start_node and goal_node:
-        path = get_path_recursive(start_node, goal_node, 1, max_nodes, [start_node])
-        return path
+        path = None
+        if g.ENABLE_PATH_CACHE:
+            cache_key = get_path_cache_key(node_map, start_node.id, goal_node.id, max_nodes, jump_points, hierarchical)
+            path = node_map.path_cache.get(cache_key)
+
+        if path is None:
+            if hierarchical:
+                path = node_map.get_segment_graph().find_path(start_node.id, goal_node.id, max_nodes=max_nodes)
+            if path is None:
+                path = pathfinding.find_path(node_map.get_graph(), start_node.id, goal_node.id, max_nodes=max_nodes, jump_points=jump_points)
+            path = tuple(path)
+            if g.ENABLE_PATH_CACHE:
+                node_map.path_cache.add(cache_key, path)
+
+        return [node_map.get_node(node_id) for node_id in path]
     else:
         return None
 
+#paths are cached by their end nodes, the collision profile of the node map and the search settings
+def get_path_cache_key(node_map, start_id, goal_id, max_nodes=None, jump_points=False, hierarchical=False):
+    if max_nodes is None:
+        max_nodes = g.PATHFINDING_NODE_BUDGET
+    return (start_id, goal_id, tuple(sorted(node_map.collision_dict.items())), max_nodes, jump_points, hierarchical)
+
 def get_path_quick(node_map, start_pos, goal_pos, max_nodes=10):
     if isinstance(start_pos, Node):
         start_node = start_pos
@@ -321,3 +1487,93 @@ def get_path_quick(node_map, start_pos, goal_pos, max_nodes=10):
     return path
             
         
+
+#get the flow field towards a target on a node map, making it if there isn't one yet, so that everything chasing the same target shares it
+def get_flow_field(node_map, target, node_budget=None):
+    for flow_field in g.flow_fields:
+        if flow_field.node_map is node_map and (flow_field.target is target or (isinstance(target, tuple) and flow_field.target == target)):
+            return flow_field
+    return Flow_Field(node_map, target, node_budget=node_budget)
+
+def update_flow_fields():
+    for flow_field in list(g.flow_fields):
+        flow_field.update()
+
+def get_query_pool():
+    if g.query_pool is None:
+        g.query_pool = Query_Pool()
+    return g.query_pool
+
+#start finding a path in the background, returns a Query whose result is the same as get_path would return
+#the nearest nodes are found now, the search runs on a worker with the node map's current Nav_Graph
+#hierarchical paths aren't supported, since the Segment_Graph is updated as it is used
+def request_path(node_map, start_pos, goal_pos, max_nodes=None, jump_points=False):
+    if isinstance(start_pos, Node):
+        start_node = start_pos
+    else:
+        start_node = get_nearest_node(node_map, start_pos)
+
+    if isinstance(goal_pos, Node):
+        goal_node = goal_pos
+    else:
+        goal_node = get_nearest_node(node_map, goal_pos)
+
+    if not start_node or not goal_node:
+        query = Query()
+        query.deliver(None)
+        return query
+
+    cache_key = get_path_cache_key(node_map, start_node.id, goal_node.id, max_nodes, jump_points)
+    if g.ENABLE_PATH_CACHE:
+        path = node_map.path_cache.get(cache_key)
+        if path is not None:
+            query = Query()
+            query.deliver([node_map.get_node(node_id) for node_id in path])
+            return query
+
+    graph = node_map.get_graph()
+
+    def finish(path):
+        path = tuple(path)
+        #the path is only cached if the nodes haven't changed since the search started
+        if g.ENABLE_PATH_CACHE and node_map.graph is graph:
+            node_map.path_cache.add(cache_key, path)
+        return [node_map.get_node(node_id) for node_id in path]
+
+    return get_query_pool().submit(Query(finish), pathfinding.find_path, graph, start_node.id, goal_node.id, max_nodes, 1, jump_points)
+
+#start checking a line against the active levels in the background, returns a Query whose result is the first
+#tile (or other level object) the line hits or False, like levels.Level.check_line_collision
+#tile levels are checked on a worker using a snapshot of their solidity, other levels are checked straight away
+def request_sightline(p1, p2):
+    grids = []
+    for level in g.active_levels:
+        if isinstance(level, levels.Tile_Level):
+            grids.append((level, level.get_solidity_snapshot()))
+        else:
+            colliding = level.check_line_collision(p1, p2)
+            if colliding:
+                query = Query()
+                query.deliver(colliding)
+                return query
+
+    def check_grids():
+        for i, (level, solidity) in enumerate(grids):
+            cell = pathfinding.check_grid_line(solidity, p1, p2, level.tw, level.th, level.x, level.y)
+            if cell is not None:
+                return i, cell
+        return None
+
+    def finish(hit):
+        if hit is None:
+            return False
+        #the tile in the cell now, which is None if it has been removed since the snapshot
+        i, (cx, cy) = hit
+        return grids[i][0].tiles[cx][cy] or False
+
+    return get_query_pool().submit(Query(finish), check_grids)
+
+#hand back finished path and sightline queries, called once per tick
+def update_queries():
+    if g.query_pool is not None:
+        g.query_pool.update()
@@ -0,0 +1,233 @@
+#stress benchmarks for comparing engine code paths
+#run with "python -m POT.benchmarks" from the directory containing the POT package
+from . import global_values as g
+from . import utilities as util
+from . import entities
+from . import levels
+from . import game_objects
+from . import ai
+
+import pygame as p
+import numpy as np
+import random as r
+import timeit
+
+
+def benchmark_collision(entity_amount=300, query_amount=2000, level_size=3000, number=5, seed=0):
+    r.seed(seed)
+    level = levels.Level(True, {}, p.Rect(0, 0, level_size, level_size))
+
+    spawned_entities = []
+    for i in range(entity_amount):
+        size = r.randint(16, 32)
+        rect = p.Rect(r.randint(0, level_size-size), r.randint(0, level_size-size), size, size)
+        spawned_entities.append(entities.Entity(rect, collision_dict={"levels":False, "border":False}))
+
+    for entity in spawned_entities:
+        entity.update_segments()
+
+    query_rects = []
+    query_lines = []
+    for i in range(query_amount):
+        x, y = r.randint(0, level_size-24), r.randint(0, level_size-24)
+        query_rects.append(p.Rect(x, y, 24, 24))
+        query_lines.append(((x, y), (x+r.randint(-300, 300), y+r.randint(-300, 300))))
+
+    collision_dict = {"levels":False, "border":False, "class_Entity":True}
+    query_mask = p.mask.Mask((24, 24), fill=True)
+
+    def run_rect_queries():
+        for rect in query_rects:
+            util.check_collision(rect, query_mask, collision_dict, [])
+
+    def run_line_queries():
+        for p1, p2 in query_lines:
+            util.check_line_collision(p1, p2, collision_dict, [])
+
+    old_enable_broadphase = g.ENABLE_BROADPHASE
+    results = {}
+    for name, enable_broadphase in (("segments", False), ("broadphase", True)):
+        g.ENABLE_BROADPHASE = enable_broadphase
+        results[name] = (timeit.timeit(run_rect_queries, number=number), timeit.timeit(run_line_queries, number=number))
+    g.ENABLE_BROADPHASE = old_enable_broadphase
+
+    print("collision:", entity_amount, "entities,", query_amount, "queries x", number)
+    for name, (rect_time, line_time) in results.items():
+        print("    "+name.ljust(12), "rects:", round(rect_time, 4), "lines:", round(line_time, 4))
+
+    for entity in spawned_entities:
+        entity.delete()
+    level.deactivate()
+
+    return results
+
+
+def benchmark_object_churn(population=1000, churn_amount=200, ticks=10, number=3, seed=0):
+    r.seed(seed)
+    level = levels.Level(True, {}, p.Rect(0, 0, 3000, 3000))
+
+    def spawn(i):
+        rect = (r.randint(0, 2900), r.randint(0, 2900), 8, 8)
+        if i % 2:
+            return entities.Projectile(rect, 0, 0, None, None, collision_dict={"levels":False, "border":False})
+        return entities.Effect(rect, 0, 0, 1000, None)
+
+    alive = [spawn(i) for i in range(population)]
+
+    #each tick deletes a random selection of live projectiles/effects and spawns the same amount again
+    def run_churn():
+        for tick in range(ticks):
+            r.shuffle(alive)
+            for obj in alive[-churn_amount:]:
+                obj.delete()
+            del alive[-churn_amount:]
+            alive.extend(spawn(i) for i in range(churn_amount))
+
+    #the same removal pattern on just the containers, comparing the old list storage against the registry
+    def run_container(container_class):
+        objects = [object() for i in range(population)]
+        container = container_class(objects)
+        def run():
+            for tick in range(ticks):
+                r.shuffle(objects)
+                for obj in objects[-churn_amount:]:
+                    container.remove(obj)
+                for obj in objects[-churn_amount:]:
+                    container.append(obj)
+        return run
+
+    results = {"churn":timeit.timeit(run_churn, number=number),
+               "list":timeit.timeit(run_container(list), number=number),
+               "registry":timeit.timeit(run_container(game_objects.Game_Object_Registry), number=number)}
+
+    print("object churn:", population, "objects,", churn_amount, "deleted/spawned per tick,", ticks, "ticks x", number)
+    for name, time_taken in results.items():
+        print("    "+name.ljust(12), round(time_taken, 4))
+
+    for obj in alive:
+        obj.delete()
+    level.deactivate()
+
+    return results
+
+
+def benchmark_integrator(entity_amount=1000, ticks=60, number=3, seed=0):
+    old_enable_integrator = g.ENABLE_PHYSICS_INTEGRATOR
+    level = levels.Level(True, {}, p.Rect(0, 0, 3000, 3000))
+    level.set_gravity(0.5, 1.5)
+
+    results = {}
+    for name, enable_integrator in (("per object", False), ("integrator", True)):
+        r.seed(seed)
+        g.ENABLE_PHYSICS_INTEGRATOR = enable_integrator
+        spawned_entities = [entities.Entity((r.randint(0, 2900), r.randint(0, 2900), 8, 8), vx=r.uniform(-10, 10), vy=r.uniform(-10, 10),
+                                            collision_dict={"levels":False, "border":False}) for i in range(entity_amount)]
+
+        #just the clamping, damping and gravity that the integrator replaces
+        if enable_integrator:
+            def run_kinematics():
+                for tick in range(ticks):
+                    for entity in spawned_entities:
+                        g.physics_integrator.prepare_move(entity)
+                    g.physics_integrator.post_update()
+        else:
+            def run_kinematics():
+                for tick in range(ticks):
+                    for entity in spawned_entities:
+                        entity.clamp_velocity()
+                        entity.slow_velocity()
+                        gx, gy = levels.get_gravity(entity.collide_rect)
+                        entity.vx += gx*entity.gravity_strength
+                        entity.vy += gy*entity.gravity_strength
+
+        #the whole update, including movement
+        def run_updates():
+            for tick in range(ticks):
+                for entity in spawned_entities:
+                    entity.update()
+                g.physics_integrator.post_update()
+
+        results[name] = (timeit.timeit(run_kinematics, number=number), timeit.timeit(run_updates, number=number))
+
+        for entity in spawned_entities:
+            entity.delete()
+
+    g.ENABLE_PHYSICS_INTEGRATOR = old_enable_integrator
+    level.deactivate()
+
+    print("integrator:", entity_amount, "entities,", ticks, "ticks x", number)
+    for name, (kinematics_time, update_time) in results.items():
+        print("    "+name.ljust(12), "kinematics:", round(kinematics_time, 4), "updates:", round(update_time, 4))
+
+    return results
+
+
+def benchmark_flow_field(creature_amount=200, ticks=10, level_size=1600, node_spacing=16, number=3, seed=0):
+    r.seed(seed)
+    level = levels.Level(True, {}, p.Rect(0, 0, level_size, level_size))
+
+    #walls with a few gaps in them, so that paths aren't just straight lines
+    cells = level_size//node_spacing
+    walkable = np.ones((cells, cells), dtype=bool)
+    for x in range(cells//8, cells, cells//4):
+        walkable[x, :] = False
+        for gap in r.sample(range(cells), 3):
+            walkable[x, gap] = True
+    node_map = ai.Node_Map(level)
+    ai.generate_from_level(node_map, level, node_spacing, {}, diagonal=True, walkable=walkable)
+
+    open_cells = np.argwhere(walkable)
+    def get_random_pos():
+        x, y = open_cells[r.randrange(len(open_cells))].tolist()
+        return ((x*node_spacing)+(node_spacing//2), (y*node_spacing)+(node_spacing//2))
+
+    creature_positions = [get_random_pos() for i in range(creature_amount)]
+    #the target moves to a new cell every tick
+    target_positions = [get_random_pos()]
+    for tick in range(ticks-1):
+        x, y = target_positions[-1]
+        cx, cy = x//node_spacing, (y//node_spacing)+1
+        if cy < cells and walkable[cx, cy]:
+            target_positions.append((x, y+node_spacing))
+        else:
+            target_positions.append(get_random_pos())
+
+    #every creature searching for its own path each tick
+    def run_paths():
+        for target_pos in target_positions:
+            for pos in creature_positions:
+                ai.get_path(node_map, pos, target_pos)
+
+    #one shared field, rebuilt whenever the target moves (with no tick budget), that every creature reads its next move from
+    def run_flow_field():
+        flow_field = ai.Flow_Field(node_map, target_positions[0], node_budget=-1)
+        for target_pos in target_positions:
+            flow_field.target = target_pos
+            flow_field.update()
+            for pos in creature_positions:
+                flow_field.get_next_pos(pos)
+        flow_field.delete()
+
+    results = {"paths":timeit.timeit(run_paths, number=number),
+               "flow field":timeit.timeit(run_flow_field, number=number)}
+
+    print("flow field:", creature_amount, "creatures,", walkable.sum(), "nodes,", ticks, "ticks x", number)
+    for name, time_taken in results.items():
+        print("    "+name.ljust(12), round(time_taken, 4))
+
+    node_map.clear()
+    g.node_maps.discard(node_map)
+    level.deactivate()
+
+    return results
+
+
+def run_all():
+    benchmark_collision()
+    benchmark_object_churn()
+    benchmark_integrator()
+    benchmark_flow_field()
+
+
+if __name__ == "__main__":
+    run_all()
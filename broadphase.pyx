@@ -0,0 +1,126 @@
+# cython: profile=True
+# cython: language_level=3
+# cython: infer_types=True
+
+from . import global_values as g
+from . import utilities as util
+
+#persistent uniform grid of entity collide rects, used by utilities.check_collision instead of rebuilding candidate lists every query
+#each cell stores a dictionary of class aliases, where each alias points to a dictionary of entities (used as an ordered set)
+#so queries only ever touch entities of the classes being asked for
+class Spatial_Hash():
+    def __init__(self, cell_size=g.BROADPHASE_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+        #the inclusive cell range (sx, sy, ex, ey) that each entity currently occupies
+        self.entity_ranges = {}
+
+    def get_cell_range(self, rect):
+        cell_size = self.cell_size
+        sx = rect.left//cell_size
+        sy = rect.top//cell_size
+        #right and bottom are exclusive, so the last pixel of the rect is used
+        ex = max((rect.right-1)//cell_size, sx)
+        ey = max((rect.bottom-1)//cell_size, sy)
+        return sx, sy, ex, ey
+
+    def add_to_cell(self, entity, cell_key):
+        cell = self.cells.get(cell_key)
+        if cell is None:
+            cell = {}
+            self.cells[cell_key] = cell
+
+        for alias in entity.class_aliases:
+            bucket = cell.get(alias)
+            if bucket is None:
+                cell[alias] = {entity:None}
+            else:
+                bucket[entity] = None
+
+    def remove_from_cell(self, entity, cell_key):
+        cell = self.cells.get(cell_key)
+        if cell is None:
+            return
+
+        for alias in entity.class_aliases:
+            bucket = cell.get(alias)
+            if bucket is not None:
+                bucket.pop(entity, None)
+                if not bucket:
+                    del cell[alias]
+
+        if not cell:
+            del self.cells[cell_key]
+
+    #move an entity into the cells covered by its collide rect
+    #only the cells that have actually changed are touched, so this is almost free for entities that don't cross a cell boundary
+    def update(self, entity):
+        new_range = self.get_cell_range(entity.collide_rect)
+        old_range = self.entity_ranges.get(entity)
+        if old_range == new_range:
+            return
+
+        nsx, nsy, nex, ney = new_range
+        if old_range is not None:
+            osx, osy, oex, oey = old_range
+            for cx in range(osx, oex+1):
+                for cy in range(osy, oey+1):
+                    if not (nsx <= cx <= nex and nsy <= cy <= ney):
+                        self.remove_from_cell(entity, (cx, cy))
+        else:
+            osx, osy, oex, oey = 0, 0, -1, -1
+
+        for cx in range(nsx, nex+1):
+            for cy in range(nsy, ney+1):
+                if not (osx <= cx <= oex and osy <= cy <= oey):
+                    self.add_to_cell(entity, (cx, cy))
+
+        self.entity_ranges[entity] = new_range
+
+    def remove(self, entity):
+        old_range = self.entity_ranges.pop(entity, None)
+        if old_range is not None:
+            sx, sy, ex, ey = old_range
+            for cx in range(sx, ex+1):
+                for cy in range(sy, ey+1):
+                    self.remove_from_cell(entity, (cx, cy))
+
+    def clear(self):
+        self.cells.clear()
+        self.entity_ranges.clear()
+
+    #get all the entities with at least one of the given class aliases that share a cell with the rect
+    #returns a dictionary so that results are unique and keep a stable order
+    def query(self, rect, aliases):
+        found = {}
+        cells = self.cells
+        sx, sy, ex, ey = self.get_cell_range(rect)
+        for cx in range(sx, ex+1):
+            for cy in range(sy, ey+1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    for alias in aliases:
+                        bucket = cell.get(alias)
+                        if bucket:
+                            found.update(bucket)
+        return found
+
+    #get all the entities with at least one of the given class aliases in the cells that the line passes through
+    def query_line(self, p1, p2, aliases):
+        found = {}
+        cells = self.cells
+        for cell_key in util.traverse_grid(p1, p2, self.cell_size, self.cell_size):
+            cell = cells.get(cell_key)
+            if cell:
+                for alias in aliases:
+                    bucket = cell.get(alias)
+                    if bucket:
+                        found.update(bucket)
+        return found
+
+def get_collision_aliases(collision_dict):
+    return [ent_type for ent_type, can_collide in collision_dict.items() if can_collide and ent_type.startswith("class_")]
+
+if g.spatial_hash is None:
+    g.spatial_hash = Spatial_Hash()
@@ -15,7 +15,7 @@ class Camera(entities.Entity):
         self.rect = rect
         self.update_scale()
         
-        kwargs = {"vx_keep":0.95, "vy_keep":0.95, "gravity_strength":0, "visible":False, "static":False, "solid":False, "max_v":100}
+        kwargs = {"vx_keep":0.95, "vy_keep":0.95, "gravity_strength":0, "visible":False, "static":False, "solid":False, "max_v":100, "enable_lod":False}
         kwargs.update(_kwargs)
         entities.Entity.__init__(self, rect, **kwargs)
 
@@ -40,8 +40,9 @@ class Camera(entities.Entity):
             self.rect.center = c
             self.set_from_rect()
 
+    #scaled surfaces stay in g.surface_cache when the zoom changes (see gfx.Surface_Cache)
     def change_scale(self):
-        g.clear_surface_cache()
+        pass
 
     def update(self):
         entities.Entity.update(self)
@@ -50,14 +51,6 @@ class Camera(entities.Entity):
         if self.width != self.old_width or self.height != self.old_height:
             self.change_scale()
 
-    def update_segments(self):
-        self.segments.clear()
-        for level in g.active_levels:
-            if level.enable_segmenting:
-                for segment in level.get_segments(self.rect):
-                    segment.entities.add(self)
-                    self.segments.add(segment)
-
     def update_scale(self):
         self.scale_x = g.WIDTH/self.rect.width
         self.scale_y = g.HEIGHT/self.rect.height
@@ -179,7 +172,7 @@ class Camera(entities.Entity):
         if angle:
             gfx.draw_rotated_surface(new_surface, rect.topleft, angle, cx=cx, cy=cy, ox=ox, oy=oy)
         else:
-            g.screen.blit(new_surface, new_rect)
+            gfx.queue_blit(new_surface, new_rect.topleft)
             
     def draw_transformed_graphics(self, graphics, rect, angle=0, cx=0.5, cy=0.5, ox=0, oy=0):
         surface = gfx.get_surface(graphics)
@@ -187,15 +180,18 @@ class Camera(entities.Entity):
 
     def draw_transformed_rect(self, colour, rect, border=0):
         rect = self.transform_rect(rect)
+        gfx.flush_render_queue()
         p.draw.rect(g.screen, colour, rect, border)
 
     def draw_transformed_ellipse(self, colour, rect, border=0):
         rect = self.transform_rect(rect)
+        gfx.flush_render_queue()
         p.draw.ellipse(g.screen, colour, rect, border)
 
     def draw_transformed_line(self, colour, p1, p2, width=1):
         transformed_p1 = self.transform_point(p1[0], p1[1])
         transformed_p2 = self.transform_point(p2[0], p2[1])
+        gfx.flush_render_queue()
         p.draw.line(g.screen, colour, transformed_p1, transformed_p2, width)
         
     #draw an arrow
@@ -218,4 +214,5 @@ class Camera(entities.Entity):
 
     def draw_screen_outline(self, colour, border=1):
         transformed_rect = g.camera.transform_rect(self.rect)
+        gfx.flush_render_queue()
         p.draw.rect(g.screen, colour, transformed_rect, border)
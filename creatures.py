@@ -35,10 +35,10 @@ class Creature(entities.Entity):
         if collision_dict is None:
             collision_dict = self.collision_dict
             
-        if isinstance(target, entiites.Entity):
-            target = target.rect.midpoint
+        if isinstance(target, entities.Entity):
+            target = target.rect.center
 
-        sightline = check_line_collision(self.rect.midbottom, target, collision_dict, [self])
+        sightline = util.check_line_collision(self.rect.midbottom, target, collision_dict, [self])
 
         return sightline
 
@@ -67,10 +67,20 @@ class Creature(entities.Entity):
             self.accelerate_self(m.pi/2, magnitude)
 
     def update_position_and_velocity(self):
-        self.clamp_velocity()
+        if self.physics_index is None:
+            self.clamp_velocity()
+        else:
+            g.physics_integrator.prepare_move(self)
+
         self.move(self.vx, self.vy)
         self.move(self.self_vx, self.self_vy)
-        self.slow_velocity()
+
+        if self.physics_index is None:
+            self.slow_velocity()
+        else:
+            #only the creature's own velocity still needs to be slowed
+            self.self_vx *= self.self_vx_keep
+            self.self_vy *= self.self_vy_keep
 
     def change_health(self, amount):
         self.health += amount
@@ -107,7 +117,7 @@ class Creature(entities.Entity):
 
 class Player(Creature):
     def __init__(self, rect, animation_system, health, acceleration, **_kwargs):
-        kwargs = {"cw":1, "ch":0.5, "overwrite_player":True}
+        kwargs = {"cw":1, "ch":0.5, "overwrite_player":True, "enable_lod":False}
         kwargs.update(_kwargs)
 
         if kwargs["overwrite_player"]:
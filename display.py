@@ -4,6 +4,7 @@ from . import graphics as gfx
 
 import pygame as p
 import random as r
+import math as m
 
 def setup_display(flags=0, icon_name=None, caption=None, rare_caption=None, rare_caption_chance=0.2):
     g.screen = p.display.set_mode((g.WIDTH, g.HEIGHT), flags=flags)
@@ -23,3 +24,129 @@ def setup_display(flags=0, icon_name=None, caption=None, rare_caption=None, rare
         icon_surface = p.image.load(g.gfx_dir+icon_name)
         p.display.set_icon(icon_surface)
         
+
+#redraws only the parts of the screen that changed since the last frame, and only sends those parts to the display
+#each drawn object's screen rect (Game_Object.get_screen_rect) and look (Game_Object.get_draw_state) are remembered between frames,
+#and both the old and new rects of anything that moved, changed, appeared or disappeared are redrawn
+#objects whose draw state is None are redrawn every frame, and if something drawn can't give a screen rect (like levels or overlay events),
+#the camera has moved in the main state, or lighting is on, the whole screen is redrawn instead
+class Dirty_Rect_Renderer():
+    def __init__(self):
+        #id of each object drawn last frame -> (object, screen rect, draw state)
+        self.records = {}
+        #rects that need redrawing next frame as well as the ones found by comparing the objects
+        self.extra_rects = []
+        self.full_redraw = True
+        self.old_camera_view = None
+
+        #the rects that were redrawn last frame, and whether it was a full redraw
+        self.dirty_rects = []
+        self.last_full_redraw = True
+
+    #make an area (or the whole screen if rect is None) be redrawn next frame
+    def mark_dirty(self, rect=None):
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.extra_rects.append(p.Rect(rect))
+
+    #the screen rect of an object, grown to fit its rotation, or None if it can't be known
+    def get_screen_rect(self, obj):
+        get_screen_rect = getattr(obj, "get_screen_rect", None)
+        if get_screen_rect is None:
+            return None
+
+        rect = get_screen_rect()
+        angle = obj.angle
+        if angle:
+            #objects are rotated around their center
+            cos_angle = abs(m.cos(angle))
+            sin_angle = abs(m.sin(angle))
+            center = rect.center
+            rect.size = (int(rect.w*cos_angle+rect.h*sin_angle)+2, int(rect.w*sin_angle+rect.h*cos_angle)+2)
+            rect.center = center
+        return rect
+
+    #merge overlapping rects so no area is redrawn twice, and drop the parts off screen
+    def merge_rects(self, rects):
+        merged = []
+        for rect in rects:
+            rect = rect.clip(g.screen.get_rect())
+            if not rect.w or not rect.h:
+                continue
+
+            #keep growing the rect until it doesn't overlap any of the others
+            i = rect.collidelist(merged)
+            while i != -1:
+                rect.union_ip(merged.pop(i))
+                i = rect.collidelist(merged)
+            merged.append(rect)
+
+        return merged
+
+    def draw(self, drawing_objects, draw_background, draw_objects, draw_lighting):
+        full_redraw = self.full_redraw
+        self.full_redraw = False
+        rects = self.extra_rects
+        self.extra_rects = []
+
+        #moving or zooming the camera moves everything in the world
+        if g.camera is not None and "main" in g.current_states:
+            camera_view = (tuple(g.camera.rect), g.camera.scale_x, g.camera.scale_y)
+            if camera_view != self.old_camera_view:
+                full_redraw = True
+            self.old_camera_view = camera_view
+
+        if g.ENABLE_LIGHTING and "main" in g.current_states:
+            full_redraw = True
+
+        old_records = self.records
+        records = {}
+        drawn_rects = []
+        for obj in drawing_objects:
+            rect = self.get_screen_rect(obj)
+            drawn_rects.append(rect)
+            if rect is None:
+                full_redraw = True
+                continue
+
+            state = obj.get_draw_state()
+            old_record = old_records.pop(id(obj), None)
+            if old_record is None or old_record[0] is not obj:
+                rects.append(rect)
+            elif state is None or old_record[1] != rect or old_record[2] != state:
+                rects.append(old_record[1])
+                rects.append(rect)
+            records[id(obj)] = (obj, rect, state)
+
+        #the objects that aren't drawn any more
+        for obj, rect, state in old_records.values():
+            rects.append(rect)
+        self.records = records
+
+        if not full_redraw:
+            rects = self.merge_rects(rects)
+            dirty_area = sum(rect.w*rect.h for rect in rects)
+            if dirty_area > g.screen.get_width()*g.screen.get_height()*g.DIRTY_RECT_FULL_REDRAW_AREA:
+                full_redraw = True
+
+        self.last_full_redraw = full_redraw
+        if full_redraw:
+            self.dirty_rects = [g.screen.get_rect()]
+            draw_background()
+            draw_objects(drawing_objects)
+            draw_lighting()
+            p.display.flip()
+
+        else:
+            self.dirty_rects = rects
+            for rect in rects:
+                g.screen.set_clip(rect)
+                draw_background()
+                draw_objects([obj for obj, obj_rect in zip(drawing_objects, drawn_rects) if obj_rect.colliderect(rect)])
+            g.screen.set_clip(None)
+            if rects:
+                p.display.update(rects)
+
+if g.dirty_rect_renderer is None:
+    g.dirty_rect_renderer = Dirty_Rect_Renderer()
@@ -8,9 +8,12 @@ from . import graphics as gfx
 from . import game_objects
 from . import levels
 from . import events
+from . import broadphase
+from . import physics
 
 import pygame as p
 import math as m
+import numpy as np
 
 #abstract parent class for g.game_objects["class_Entity"]
 class Entity(game_objects.Game_Object):
@@ -18,6 +21,8 @@ class Entity(game_objects.Game_Object):
 
         #how much the entity is affected by gravity
         self.gravity_strength = 1
+        #if True (and g.ENABLE_PHYSICS_INTEGRATOR is set) the entity's velocity is integrated by g.physics_integrator
+        self.integrate_physics = True
         
         #collision attributes
         self.cw = 1
@@ -27,7 +32,12 @@ class Entity(game_objects.Game_Object):
         self.solid = True
         self.collision_exceptions = []
         self.safe_movement = True
+        #if True, movement is resolved analytically against tile rects and entity collide rects (time of impact per axis)
+        #instead of one collision check per pixel. Falls back to stepping for mask collision and Mask_Levels
+        self.continuous_collision = False
         self.segments = set()
+        #the range of segments (sx, sy, ex, ey) the entity is in for each level, so membership only changes when a segment boundary is crossed
+        self.segment_ranges = {}
         self.push_bias = 0
         self.push_velocity_transfer = 0.2
 
@@ -45,6 +55,19 @@ class Entity(game_objects.Game_Object):
         #the last thing this entity collided with
         self.last_collision = None
 
+        #sleep attributes
+        #sleeping entities are skipped by game.update_entities until something touches, pushes or accelerates them
+        #this is opt-in since lots of entities do more than just physics in update
+        self.can_sleep = False
+        self.sleeping = False
+        self.still_ticks = 0
+
+        #level of detail attributes, see lod.LOD_Scheduler
+        #set enable_lod to False for entities that always need to be updated every tick (like the player)
+        self.enable_lod = True
+        self.lod_interval = 1
+        self.lod_mode = None
+
         #ground attributes
         self.check_grounded = False
         self.grounded = False
@@ -70,6 +93,9 @@ class Entity(game_objects.Game_Object):
         self.update_surface()
         self.update_mask()
 
+        if g.ENABLE_PHYSICS_INTEGRATOR and self.integrate_physics and not self.temp:
+            g.physics_integrator.add(self)
+
     def update_rect(self):
         game_objects.Game_Object.update_rect(self)
         self.collide_rect = p.Rect(0, 0, self.width*self.cw, self.height*self.ch)
@@ -85,6 +111,10 @@ class Entity(game_objects.Game_Object):
         self.collide_rect.x += diff_x
         self.collide_rect.y += diff_y
 
+        #keep the entity's cells in the broadphase up to date
+        if not self.temp and not self.deleted:
+            g.spatial_hash.update(self)
+
     def set_parent(self, parent, offset=False, forced=False):
         game_objects.Game_Object.set_parent(self, parent)
         self.forced_parent = forced
@@ -141,8 +171,8 @@ class Entity(game_objects.Game_Object):
         #print(type(self))
         game_objects.Game_Object.update(self)
 
-        #apply gravity
-        if not self.static:
+        #apply gravity (integrated entities get it from g.physics_integrator)
+        if not self.static and self.physics_index is None:
             gx, gy = levels.get_gravity(self.collide_rect)
             self.vx += gx*self.gravity_strength
             self.vy += gy*self.gravity_strength
@@ -161,21 +191,111 @@ class Entity(game_objects.Game_Object):
             if not self.grounded: 
                 self.airtime += 1
 
+        self.update_sleep()
+
     def ground(self):
         pass
 
+    #cheap stand-in for update used on the ticks a far away entity isn't updated (see lod.LOD_Scheduler)
+    #it keeps moving with its velocity and gravity, but the movement is only checked for collision at its end
+    def update_kinematic(self):
+        if self.static:
+            return
+
+        if self.physics_index is None:
+            gx, gy = levels.get_gravity(self.collide_rect)
+            self.vx += gx*self.gravity_strength
+            self.vy += gy*self.gravity_strength
+            self.clamp_velocity()
+        else:
+            g.physics_integrator.prepare_move(self)
+
+        self.move(self.vx, self.vy, safe_override=False)
+
+        if self.physics_index is None:
+            self.slow_velocity()
+
+    def update_sleep(self):
+        if self.can_sleep and g.ENABLE_SLEEPING:
+            if abs(self.real_vx) < g.SLEEP_VELOCITY_THRESHOLD and abs(self.real_vy) < g.SLEEP_VELOCITY_THRESHOLD:
+                self.still_ticks += 1
+                if self.still_ticks >= g.SLEEP_DELAY:
+                    self.sleep()
+            else:
+                self.still_ticks = 0
+
+    def sleep(self):
+        self.sleeping = True
+        self.vx = 0
+        self.vy = 0
+        self.real_vx = 0
+        self.real_vy = 0
+
+    #wake up the entity, along with every sleeping entity touching it (since they might have been resting on it)
+    def wake(self):
+        if not self.sleeping:
+            return
+
+        waking_entities = [self]
+        while waking_entities:
+            entity = waking_entities.pop()
+            if not entity.sleeping:
+                continue
+            entity.sleeping = False
+            entity.still_ticks = 0
+
+            if not entity.temp and not entity.deleted:
+                for touching_entity in g.spatial_hash.query(entity.collide_rect.inflate(2, 2), ("class_Entity",)):
+                    if touching_entity.sleeping and touching_entity.collide_rect.colliderect(entity.collide_rect.inflate(2, 2)):
+                        waking_entities.append(touching_entity)
+
     def clear_old_segments(self):
         for segment in self.segments:
-            segment.entities.remove(self)
+            segment.entities.discard(self)
         self.segments.clear()
+        self.segment_ranges.clear()
 
     def update_segments(self):
-        self.clear_old_segments()
+        cdef long cx, cy, osx, osy, oex, oey, nsx, nsy, nex, ney
+
+        #leave levels that have stopped being active or segmented
+        for level in list(self.segment_ranges):
+            if not level.active or not level.enable_segmenting:
+                osx, osy, oex, oey = self.segment_ranges.pop(level)
+                for cx in range(osx, oex):
+                    for cy in range(osy, oey):
+                        segment = level.segments[cx][cy]
+                        segment.entities.discard(self)
+                        self.segments.discard(segment)
+
         for level in g.active_levels:
             if level.enable_segmenting:
-                for segment in level.get_segments(self.rect):
-                    segment.entities.add(self)
-                    self.segments.add(segment)
+                new_range = level.get_segment_range(self.rect)
+                old_range = self.segment_ranges.get(level)
+                if new_range == old_range:
+                    continue
+
+                #only segments that the entity has entered or left are changed
+                nsx, nsy, nex, ney = new_range
+                if old_range is not None:
+                    osx, osy, oex, oey = old_range
+                    for cx in range(osx, oex):
+                        for cy in range(osy, oey):
+                            if not (nsx <= cx < nex and nsy <= cy < ney):
+                                segment = level.segments[cx][cy]
+                                segment.entities.discard(self)
+                                self.segments.discard(segment)
+                else:
+                    osx, osy, oex, oey = 0, 0, 0, 0
+
+                for cx in range(nsx, nex):
+                    for cy in range(nsy, ney):
+                        if not (osx <= cx < oex and osy <= cy < oey):
+                            segment = level.segments[cx][cy]
+                            segment.entities.add(self)
+                            self.segments.add(segment)
+
+                self.segment_ranges[level] = new_range
 
     def move(self, ax, ay, safe_override=None, check=False, start_x_override=None, start_y_override=None, break_on_collide=False):
         return self.transform(ax, ay, 0, 0, safe_override=safe_override, check=check, start_x_override=start_x_override, start_y_override=start_y_override, break_on_collide=break_on_collide)
@@ -247,6 +367,10 @@ class Entity(game_objects.Game_Object):
         can_move_x = True
         can_move_y = True
 
+        #each axis only resolves one push chain per transform
+        pushed_x = False
+        pushed_y = False
+
         #exception variable used instead of just self.collision_exceptions
         exceptions = [self]+self.collision_exceptions
 
@@ -262,6 +386,13 @@ class Entity(game_objects.Game_Object):
         if ax == 0 and ay == 0 and aw == 0 and ah == 0:
             return finish_movement()
 
+        #resolve movement with a swept collision check if possible
+        if self.continuous_collision and not aw and not ah:
+            sweep_results = self.sweep(ax, ay, nx, ny, nw, nh, exceptions, check=check, break_on_collide=break_on_collide)
+            if sweep_results is not None:
+                nx, ny, can_move_x, can_move_y = sweep_results
+                return finish_movement()
+
         #set additional variables needed for movement collision checking
         #compact step calculation method
         steps = m.ceil(max(abs(ax), abs(ay), abs(aw), abs(ah)))
@@ -337,26 +468,15 @@ class Entity(game_objects.Game_Object):
                 
                 colliding = util.check_collision(check_rect, self.collision_mask, self.collision_dict, exceptions, obj=self)
 
-                #push entities that can be pushed (according to push_bias)
-                while colliding and isinstance(colliding, Entity) and self.push_bias > colliding.push_bias:
-                    colliding.collide_pushed(self)
-                    self.collide_pushing(colliding)
-
-                    vx_transfer = self.vx*self.push_velocity_transfer
-                    self.vx -= vx_transfer
-                    colliding.vx += vx_transfer
-
-                    
+                #push entities that can be pushed (according to push_bias) by the rest of the movement all at once
+                if colliding and isinstance(colliding, Entity) and self.push_bias > colliding.push_bias and not pushed_x and not g.resolving_push_chain:
+                    pushed_x = True
                     if colliding.rect.centerx < check_rect.centerx:
-                        colliding.move(step_x-(step_w/2), 0)
+                        self.push_chain(colliding, (step_x-(step_w/2))*(steps-step), 0)
                     else:
-                        colliding.move(step_x+(step_w/2), 0)
+                        self.push_chain(colliding, (step_x+(step_w/2))*(steps-step), 0)
 
-                    old_colliding = colliding
                     colliding = util.check_collision(check_rect, self.collision_mask, self.collision_dict, exceptions, obj=self)
-
-                    if colliding == old_colliding:
-                        break
                 
                 can_move_x = not colliding
                 if not check and can_move_y and not can_move_x:
@@ -399,25 +519,15 @@ class Entity(game_objects.Game_Object):
 
                 colliding = util.check_collision(check_rect, self.collision_mask, self.collision_dict, exceptions, obj=self)
 
-                #push entities that can be pushed (according to push_bias)
-                while colliding and isinstance(colliding, Entity) and self.push_bias > colliding.push_bias:
-                    colliding.collide_pushed(self)
-                    self.collide_pushing(colliding)
-
-                    vy_transfer = self.vy*self.push_velocity_transfer
-                    self.vy -= vy_transfer
-                    colliding.vy += vy_transfer
-
+                #push entities that can be pushed (according to push_bias) by the rest of the movement all at once
+                if colliding and isinstance(colliding, Entity) and self.push_bias > colliding.push_bias and not pushed_y and not g.resolving_push_chain:
+                    pushed_y = True
                     if colliding.rect.centery < check_rect.centery:
-                        colliding.move(0, step_y-(step_h/2))
+                        self.push_chain(colliding, 0, (step_y-(step_h/2))*(steps-step))
                     else:
-                        colliding.move(0, step_y+(step_h/2))
+                        self.push_chain(colliding, 0, (step_y+(step_h/2))*(steps-step))
 
-                    old_colliding = colliding
                     colliding = util.check_collision(check_rect, self.collision_mask, self.collision_dict, exceptions, obj=self)
-
-                    if colliding == old_colliding:
-                        break
                 
                 can_move_y = not colliding
                 if not check and can_move_x and not can_move_y:
@@ -463,6 +573,349 @@ class Entity(game_objects.Game_Object):
 
         return finish_movement()
 
+    #get everything the entity could collide with inside a rectangle as a list of (rect, object) tuples
+    #returns None if collision can't be described using rects (mask collision, Mask_Levels, camera collision)
+    def get_sweep_obstacles(self, rect, exceptions):
+        if self.mask_collision or self.collision_dict.get("camera", False):
+            return None
+
+        obstacles = []
+        if self.collision_dict.get("levels", False):
+            for level in g.active_levels:
+                level_obstacles = level.get_collision_rects(rect)
+                if level_obstacles is None:
+                    return None
+                obstacles += level_obstacles
+
+        aliases = broadphase.get_collision_aliases(self.collision_dict)
+        if aliases:
+            if not g.ENABLE_BROADPHASE:
+                return None
+
+            for entity in g.spatial_hash.query(rect, aliases):
+                if entity not in exceptions and entity.solid:
+                    if entity.mask_collision:
+                        return None
+                    obstacles.append((entity.collide_rect, entity))
+
+        return obstacles
+
+    #get the rect that the entity has to stay inside of because of "border" collision
+    #returns False if there is no border and None if it can't be swept against
+    def get_sweep_border(self, rect):
+        if not self.collision_dict.get("border", False):
+            return False
+
+        #moving between several touching levels can't be described by a single rect
+        if len(g.active_levels) != 1:
+            return None
+
+        border_rect = g.active_levels[0].rect
+        if border_rect.contains(rect):
+            return border_rect
+        return None
+
+    #get the fraction (0-1) of a movement at which the collide rect (positioned at px, py) starts overlapping a rect
+    #returns None if they don't collide, otherwise the time of impact, the axis that was hit and the position on that axis when touching
+    def get_time_of_impact(self, double px, double py, int w, int h, double ax, double ay, rect):
+        cdef double entry_x, exit_x, entry_y, exit_y, entry_time, exit_time, lo, hi, inf
+        inf = m.inf
+
+        #the collide rect overlaps the rect on the x axis while lo <= x < hi
+        lo = rect.left-w+1
+        hi = rect.right
+        if ax > 0:
+            if px >= hi:
+                return None
+            entry_x = (lo-px)/ax if px < lo else -inf
+            exit_x = (hi-px)/ax
+        elif ax < 0:
+            if px < lo:
+                return None
+            entry_x = (hi-px)/ax if px >= hi else -inf
+            exit_x = (lo-px)/ax
+        else:
+            if not lo <= px < hi:
+                return None
+            entry_x = -inf
+            exit_x = inf
+
+        lo = rect.top-h+1
+        hi = rect.bottom
+        if ay > 0:
+            if py >= hi:
+                return None
+            entry_y = (lo-py)/ay if py < lo else -inf
+            exit_y = (hi-py)/ay
+        elif ay < 0:
+            if py < lo:
+                return None
+            entry_y = (hi-py)/ay if py >= hi else -inf
+            exit_y = (lo-py)/ay
+        else:
+            if not lo <= py < hi:
+                return None
+            entry_y = -inf
+            exit_y = inf
+
+        entry_time = max(entry_x, entry_y)
+        exit_time = min(exit_x, exit_y)
+        if entry_time >= exit_time or entry_time > 1:
+            return None
+
+        if entry_x >= entry_y:
+            #moving left only starts overlapping once the rect's right edge has been passed
+            if entry_time == 1 and ax < 0:
+                return None
+            return entry_time, 0, rect.left-w if ax > 0 else rect.right
+        else:
+            if entry_time == 1 and ay < 0:
+                return None
+            return entry_time, 1, rect.top-h if ay > 0 else rect.bottom
+
+    #swept (continuous) version of the collision part of transform
+    #the collide rect is moved straight to the closest time of impact, then slides along whichever axis wasn't blocked
+    #returns None if the movement can't be swept, in which case the normal stepped movement should be used instead
+    def sweep(self, double ax, double ay, double nx, double ny, double nw, double nh, exceptions, check=False, break_on_collide=False):
+        cdef double cx_offset, cy_offset, px, py, time, bump_height, gnx, gny
+        cdef int w, h, iterations, sx, sy
+
+        cx_offset = nw*(1-self.cw)
+        cy_offset = nh*(1-self.ch)
+        w = int(nw*self.cw)
+        h = int(nh*self.ch)
+
+        px = nx+cx_offset
+        py = ny+cy_offset
+        can_move_x = True
+        can_move_y = True
+        pushed_axes = set()
+
+        iterations = 0
+        while (ax or ay) and iterations < 16:
+            iterations += 1
+
+            sx = m.floor(px)
+            sy = m.floor(py)
+            start_rect = p.Rect(sx, sy, w, h)
+            end_rect = p.Rect(m.floor(px+ax), m.floor(py+ay), w, h)
+            bound_rect = start_rect.union(end_rect).inflate(self.bump_amount*2+2, self.bump_amount*2+2)
+
+            obstacles = self.get_sweep_obstacles(bound_rect, exceptions)
+            border_rect = self.get_sweep_border(start_rect)
+            if obstacles is None or border_rect is None:
+                return None
+
+            #find the closest time of impact
+            time = 1
+            axis = None
+            contact = 0
+            blocker = None
+            for obstacle_rect, obstacle in obstacles:
+                if obstacle_rect.colliderect(start_rect):
+                    #already overlapping, let the stepped movement deal with it
+                    return None
+
+                impact = self.get_time_of_impact(px, py, w, h, ax, ay, obstacle_rect)
+                if impact is not None and (impact[0] < time or blocker is None):
+                    time, axis, contact = impact
+                    blocker = obstacle
+
+            if border_rect:
+                if ax > 0 and (border_rect.right-w+1-px)/ax <= time:
+                    time, axis, contact, blocker = (border_rect.right-w+1-px)/ax, 0, border_rect.right-w, True
+                elif ax < 0 and (border_rect.left-px)/ax < time:
+                    time, axis, contact, blocker = (border_rect.left-px)/ax, 0, border_rect.left, True
+                if ay > 0 and (border_rect.bottom-h+1-py)/ay <= time:
+                    time, axis, contact, blocker = (border_rect.bottom-h+1-py)/ay, 1, border_rect.bottom-h, True
+                elif ay < 0 and (border_rect.top-py)/ay < time:
+                    time, axis, contact, blocker = (border_rect.top-py)/ay, 1, border_rect.top, True
+
+            if blocker is None:
+                px += ax
+                py += ay
+                break
+
+            #move up to the point of contact (the last position where the rects aren't overlapping)
+            if axis == 0:
+                time = max((contact-px)/ax, 0)
+            else:
+                time = max((contact-py)/ay, 0)
+            px += ax*time
+            py += ay*time
+            ax -= ax*time
+            ay -= ay*time
+            if axis == 0:
+                px = contact
+                remaining = ax
+            else:
+                py = contact
+                remaining = ay
+
+            #push entities that can be pushed (according to push_bias)
+            if not check and isinstance(blocker, Entity) and self.push_bias > blocker.push_bias and axis not in pushed_axes and not g.resolving_push_chain:
+                pushed_axes.add(axis)
+                old_blocker_x, old_blocker_y = blocker.x, blocker.y
+                if axis == 0:
+                    self.push_chain(blocker, remaining, 0)
+                else:
+                    self.push_chain(blocker, 0, remaining)
+
+                if blocker.x != old_blocker_x or blocker.y != old_blocker_y:
+                    continue
+
+            #attempt to "bump" up the object (like a stair)
+            if not check and self.bump_amount:
+                contact_rect = p.Rect(m.floor(px), m.floor(py), w, h)
+                gnx, gny = levels.get_gravity(contact_rect, normalized=True)
+                if (axis == 0 and abs(gny) > abs(gnx)) or (axis == 1 and abs(gnx) > abs(gny)):
+                    if axis == 0:
+                        contact_rect.x += 1 if remaining > 0 else -1
+                    else:
+                        contact_rect.y += 1 if remaining > 0 else -1
+
+                    obstacle_rects = [obstacle_rect for obstacle_rect, obstacle in obstacles]
+                    bumped = False
+                    bump_height = 0
+                    while self.bump_amount > bump_height:
+                        bump_height = min(bump_height+self.bump_step, self.bump_amount)
+                        bump_rect = contact_rect.move(-gnx*bump_height, -gny*bump_height)
+                        if bump_rect.collidelist(obstacle_rects) == -1 and (not border_rect or border_rect.contains(bump_rect)):
+                            px += -gnx*bump_height
+                            py += -gny*bump_height
+                            bumped = True
+                            break
+
+                    if bumped:
+                        continue
+
+            #blocked, so slide along the other axis
+            if axis == 0:
+                ax = 0
+                can_move_x = False
+            else:
+                ay = 0
+                can_move_y = False
+
+            if not check:
+                self.collide(blocker)
+                if break_on_collide or self.deleted:
+                    break
+
+        return px-cx_offset, py-cy_offset, can_move_x, can_move_y
+
+    #get every entity that would be pushed if the entity pushed another one by ax, ay
+    #returns a list of (pusher, pushed) links, where entities only push entities with a lower push_bias
+    #an entity can have more than one link if several entities in the chain could push it
+    def get_push_chain(self, first, double ax, double ay):
+        links = [(self, first)]
+        found_entities = {self, first}
+
+        pushers = [first]
+        i = 0
+        while i < len(pushers):
+            pusher = pushers[i]
+            i += 1
+
+            #everything in the way of the pusher's collide rect as it moves
+            swept_rect = pusher.collide_rect.union(pusher.collide_rect.move(ax, ay))
+            aliases = broadphase.get_collision_aliases(pusher.collision_dict)
+            if g.ENABLE_BROADPHASE:
+                candidates = g.spatial_hash.query(swept_rect, aliases)
+            else:
+                #without the broadphase every entity with one of the aliases has to be checked
+                candidates = {}
+                for alias in aliases:
+                    candidates.update(dict.fromkeys(g.game_objects.get(alias, ())))
+            for entity in candidates:
+                if entity is pusher or entity is self or entity in pusher.collision_exceptions or not entity.solid:
+                    continue
+                if pusher.push_bias > entity.push_bias and entity.collide_rect.colliderect(swept_rect):
+                    links.append((pusher, entity))
+                    if entity not in found_entities:
+                        found_entities.add(entity)
+                        pushers.append(entity)
+
+        return links
+
+    #push a chain of entities along one axis, solving the whole chain at once instead of every pushed entity pushing the next one every step
+    def push_chain(self, first, double ax, double ay):
+        cdef double gap, distance, direction
+
+        links = self.get_push_chain(first, ax, ay)
+        distance = ax if ax else ay
+        direction = 1 if distance > 0 else -1
+
+        #how far along the push direction an entity's leading edge is
+        def get_position(entity):
+            if ax > 0:
+                return entity.collide_rect.right
+            elif ax < 0:
+                return -entity.collide_rect.left
+            elif ay > 0:
+                return entity.collide_rect.bottom
+            else:
+                return -entity.collide_rect.top
+
+        #entities further back are solved first, since they are the ones that push the entities in front of them
+        pushed_links = {}
+        for pusher, entity in links:
+            pushed_links.setdefault(entity, []).append(pusher)
+        chain = sorted(pushed_links, key=get_position)
+
+        #how far each entity has to move to get out of the way of the entities pushing it
+        required_distances = {self:abs(distance)}
+        primary_pushers = {}
+        for entity in chain:
+            for pusher in pushed_links[entity]:
+                if pusher not in required_distances:
+                    continue
+
+                if pusher is self:
+                    gap = 0
+                else:
+                    gap = max(get_position(entity)-get_position(pusher)-(entity.collide_rect.w if ax else entity.collide_rect.h), 0)
+
+                if required_distances[pusher]-gap > required_distances.get(entity, 0):
+                    required_distances[entity] = required_distances[pusher]-gap
+                    primary_pushers[entity] = pusher
+
+        chain = [entity for entity in chain if entity in primary_pushers]
+        for entity in chain:
+            entity.collide_pushed(primary_pushers[entity])
+            primary_pushers[entity].collide_pushing(entity)
+
+        #move the entities furthest down the chain first so they are out of the way of the ones behind them
+        old_resolving_push_chain = g.resolving_push_chain
+        g.resolving_push_chain = True
+        try:
+            for entity in reversed(chain):
+                if ax:
+                    move_x, move_y = required_distances[entity]*direction, 0
+                else:
+                    move_x, move_y = 0, required_distances[entity]*direction
+
+                #pushes are along one axis, so if the area covering the whole movement is clear the entity can skip stepping
+                swept_rect = entity.collide_rect.union(entity.collide_rect.move(move_x, move_y))
+                if not entity.mask_collision and not util.check_collision(swept_rect, p.Mask(swept_rect.size, fill=True), entity.collision_dict, [entity]+entity.collision_exceptions, obj=entity):
+                    entity.move(move_x, move_y, safe_override=False)
+                else:
+                    entity.move(move_x, move_y)
+        finally:
+            g.resolving_push_chain = old_resolving_push_chain
+
+        #transfer velocity down the chain
+        for entity in chain:
+            pusher = primary_pushers[entity]
+            if ax:
+                vx_transfer = pusher.vx*pusher.push_velocity_transfer
+                pusher.vx -= vx_transfer
+                entity.vx += vx_transfer
+            else:
+                vy_transfer = pusher.vy*pusher.push_velocity_transfer
+                pusher.vy -= vy_transfer
+                entity.vy += vy_transfer
+
     def update_surface(self):
         if self.graphics:
             self.sprite = gfx.get_sprite(self.graphics)
@@ -480,8 +933,13 @@ class Entity(game_objects.Game_Object):
             transformed_rect = g.camera.transform_rect(self.rect)
             if self.surface:
                 transformed_surface = gfx.scale_surface(self.surface, (transformed_rect.w, transformed_rect.h))
-                gfx.draw_rotated_surface(transformed_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5)
+                #unrotated sprites don't need the anchor maths
+                if self.angle == 0:
+                    gfx.queue_blit(transformed_surface, transformed_rect.topleft)
+                else:
+                    gfx.draw_rotated_surface(transformed_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, cache=self.cache_rotations)
             else:
+                gfx.flush_render_queue()
                 p.draw.rect(g.screen, g.BLUE, transformed_rect)
 
         transformed_rect = g.camera.transform_rect(self.collide_rect)
@@ -490,18 +948,26 @@ class Entity(game_objects.Game_Object):
         #for segment in self.segments:
         #    segment.draw()
 
+    def get_screen_rect(self):
+        return g.camera.transform_rect(self.rect)
+
     def draw_outline(self, colour=g.BLUE, border=6):
         g.camera.draw_transformed_rect(g.BLUE, self.rect, border=border)
 
     def delete(self):
         self.clear_old_segments()
+        g.spatial_hash.remove(self)
+        g.physics_integrator.remove(self)
         game_objects.Game_Object.delete(self)
 
     def collide(self, colliding_object):
         self.last_collision = colliding_object
+        if isinstance(colliding_object, Entity):
+            colliding_object.wake()
 
     def collide_pushed(self, colliding_object):
         self.last_collision = colliding_object
+        self.wake()
 
     def collide_pushing(self, colliding_object):
         self.last_collision = colliding_object
@@ -520,7 +986,7 @@ class Highlightable():
             transformed_rect = g.camera.transform_rect(self.rect)
             transformed_surface = gfx.scale_surface(self.surface.highlighted_surface, (transformed_rect.w, transformed_rect.h))
             
-            gfx.draw_rotated_surface(transformed_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5)
+            gfx.draw_rotated_surface(transformed_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, cache=self.cache_rotations)
 
 class Detail(Entity):
     def __init__(self, rect, graphics, **_kwargs):
@@ -532,7 +998,7 @@ class Detail(Entity):
 class World_Interface_Component(Entity):
     def __init__(self, rect, interface_component, **_kwargs):
         self.interface_component = interface_component
-        kwargs = {"active":True}
+        kwargs = {"active":True, "enable_lod":False}
         kwargs.update(_kwargs)
         
         Entity.__init__(self, rect, **kwargs)
@@ -605,18 +1071,168 @@ class Projectile(Entity):
 
     
 
+#stand-in for a temporary Entity when checking whether a rect can move somewhere (see check_path_clear and ai.Node.connect)
+#it only has what Entity.transform needs (a collide rect, a mask and a collision profile), so it is moved with exactly the same
+#collision code, but it isn't a game object: it has no pipe, isn't in g.game_objects or the spatial hash and is never collided with
+#it also never pushes or wakes the entities it hits. Probes are reused, so get them with get_collision_probe and release them after
+class Collision_Probe(Entity):
+    def __init__(self):
+        self.physics_index = None
+        self.rect = p.Rect(0, 0, 0, 0)
+        self.collide_rect = p.Rect(0, 0, 0, 0)
+        self.x = 0
+        self.y = 0
+        self.width = 0
+        self.height = 0
+        self.cw = 1
+        self.ch = 1
+
+        self.collision_dict = {}
+        self.collision_exceptions = []
+        self.collision_mask = None
+        self.mask_collision = False
+        self.solid = True
+        self.safe_movement = True
+        self.continuous_collision = False
+        self.push_bias = -m.inf
+        self.bump_amount = 10
+        self.bump_step = 2
+        self.last_collision = None
+
+        self.vx = 0
+        self.vy = 0
+        self.bounce_vx = 0
+        self.bounce_vy = 0
+        self.static = False
+        self.sleeping = False
+        self.children = []
+        self.parent = None
+        self.class_aliases = set()
+        self.temp = True
+        self.deleted = False
+        self.in_use = False
+
+    #move the probe to a rect and give it the collision profile to check with, the same as the Entity keyword arguments
+    def setup(self, rect, collision_dict=None, exceptions=(), safe_movement=True, continuous_collision=False):
+        self.x, self.y, self.width, self.height = rect
+        self.update_rect()
+
+        #the mask is only made again when the size changes
+        size = self.rect.size
+        if self.collision_mask is None or self.collision_mask.get_size() != size:
+            self.collision_mask = p.Mask(size, fill=True)
+
+        self.collision_dict.clear()
+        self.collision_dict.update({"levels":True, "border":True, "camera":False})
+        if collision_dict:
+            self.collision_dict.update(collision_dict)
+        self.collision_exceptions[:] = exceptions
+        self.safe_movement = safe_movement
+        self.continuous_collision = continuous_collision
+        self.vx = 0
+        self.vy = 0
+        self.last_collision = None
+
+    def update_rect(self):
+        rect = self.rect
+        rect.x = int(self.x)
+        rect.y = int(self.y)
+        rect.w = int(self.width)
+        rect.h = int(self.height)
+        self.collide_rect.update(rect)
+
+    def update(self):
+        pass
+
+    def wake(self):
+        pass
+
+    def collide(self, colliding_object):
+        self.last_collision = colliding_object
+
+    def collide_pushed(self, colliding_object):
+        self.last_collision = colliding_object
+
+    def collide_pushing(self, colliding_object):
+        self.last_collision = colliding_object
+
+    #put the probe back in the pool, it shouldn't be used again after this
+    def release(self):
+        if self.in_use:
+            self.in_use = False
+            self.collision_exceptions.clear()
+            self.last_collision = None
+            g.collision_probes.append(self)
+
+    def delete(self):
+        self.release()
+
+#get an unused Collision_Probe from the pool (or a new one if they are all being used), set up like Collision_Probe.setup
+def get_collision_probe(rect, collision_dict=None, exceptions=(), safe_movement=True, continuous_collision=False):
+    if g.collision_probes:
+        probe = g.collision_probes.pop()
+    else:
+        probe = Collision_Probe()
+    probe.in_use = True
+    probe.setup(rect, collision_dict=collision_dict, exceptions=exceptions, safe_movement=safe_movement, continuous_collision=continuous_collision)
+    return probe
+
 def check_path_clear(start_p, end_p, width, height, collision_dict, exceptions=[], centered=True, details=False, step=None):
     rect = p.Rect(0, 0, width, height)
     if centered:
         rect.center = start_p
     else:
         rect.topleft = end_p
-        
-    check_entity = Entity(rect, collision_dict=collision_dict, collision_exceptions=exceptions, temp=True)
 
-    
-    
-    check_entity.update()
+    #the probe collides with the levels and border unless the collision dict says otherwise
+    full_collision_dict = {"levels":True, "border":True, "camera":False}
+    full_collision_dict.update(collision_dict)
+
+    #if only level (and border) collision matters, every pixel step of the path can be checked against the levels in one batch
+    level_only = full_collision_dict["levels"] and not any(can_collide for collision_type, can_collide in full_collision_dict.items() if collision_type not in ("levels", "border"))
+    if level_only and not details and not step:
+        #the same movement the probe would be given below
+        ax = end_p[0]-start_p[0]
+        ay = end_p[1]-start_p[1]
+        steps = m.ceil(max(abs(ax), abs(ay)))
+        #the probe doesn't check anything if it isn't moved
+        if steps == 0:
+            return True
+        fractions = np.linspace(0, 1, steps+1)
+
+        #each step moves along x before y, so the rects between steps (moved along x only) are checked too
+        xs = rect.x+np.floor(fractions*ax)
+        ys = rect.y+np.floor(fractions*ay)
+        rects = np.empty((steps*2+1, 4), dtype=np.int64)
+        rects[0::2, 0] = xs
+        rects[0::2, 1] = ys
+        rects[1::2, 0] = xs[1:]
+        rects[1::2, 1] = ys[:-1]
+        rects[:, 2] = rect.w
+        rects[:, 3] = rect.h
+
+        mask = p.Mask(rect.size, fill=True)
+        for level in g.active_levels:
+            colliding, indices = level.check_collision_many(rects, mask)
+            if colliding.any():
+                return False
+
+        #every step has to be fully inside one of the active levels
+        if full_collision_dict["border"]:
+            inside = np.zeros(len(rects), dtype=bool)
+            for level in g.active_levels:
+                level_rect = level.rect
+                inside |= (rects[:, 0] >= level_rect.left) & (rects[:, 1] >= level_rect.top) & (rects[:, 0]+rects[:, 2] <= level_rect.right) & (rects[:, 1]+rects[:, 3] <= level_rect.bottom)
+            if not inside.all():
+                return False
+        return True
+
+    #the probe is given to the caller with details, so it is a new one instead of one from the pool
+    if details:
+        check_entity = Collision_Probe()
+        check_entity.setup(rect, collision_dict=collision_dict, exceptions=exceptions)
+    else:
+        check_entity = get_collision_probe(rect, collision_dict=collision_dict, exceptions=exceptions)
 
     if step:
         angle = util.get_angle(start_p[0], start_p[1], end_p[0], end_p[1])
@@ -640,13 +1256,13 @@ def check_path_clear(start_p, end_p, width, height, collision_dict, exceptions=[
     else:
         ax = end_p[0]-start_p[0]
         ay = end_p[1]-start_p[1]
-        print(ax, ay)
         move_results = check_entity.move(ax, ay, break_on_collide=True)
                         
     can_move_x, can_move_y = move_results[4], move_results[5]
     if details:
         return can_move_x, can_move_y, check_entity
     else:
+        check_entity.release()
         if can_move_x and can_move_y:
             return True
         else:
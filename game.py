@@ -25,6 +25,7 @@ from . import ai
 from . import particles
 from . import light
 from . import npc
+from . import lod
 
 from . import global_values as g
 from . import utilities as util
@@ -221,9 +222,29 @@ def update_lighting(force=False):
 def update_entities(force=False):
     #update entities
     if "main" in g.current_states or force:
+        #move the flow fields on to their targets' current positions before anything reads them
+        ai.update_flow_fields()
+        #hand back the paths and sightlines that finished in the background, so creatures see them this tick
+        ai.update_queries()
+
+        #work out how often each entity should be updated from how far it is from the camera
+        if g.ENABLE_LOD:
+            g.lod_scheduler.update(g.game_objects.get("class_Entity", []))
+
         for entity in g.game_objects.get("class_Entity", []):
+            if entity.sleeping:
+                #something has changed the entity's velocity, so it needs to start moving again
+                if entity.vx or entity.vy:
+                    entity.wake()
+                else:
+                    continue
+            if g.ENABLE_LOD and not g.lod_scheduler.check_update(entity):
+                continue
             entity.update()
 
+        #damp the velocities of integrated entities, apply gravity and clamp them for the next tick
+        g.physics_integrator.post_update()
+
 def update_interface_components():
     for interface_component in g.game_objects.get("class_Interface_Component", []):
         interface_component.update()
@@ -297,6 +318,30 @@ def draw_background():
         else:
             g.screen.fill(g.BACKGROUND_COLOUR)
 
+#draw objects in order, batching the blits of each run of entities through the render queue if g.ENABLE_RENDER_QUEUE is set
+def draw_objects(drawing_objects):
+    render_queue = g.render_queue
+    for obj in drawing_objects:
+        if g.ENABLE_RENDER_QUEUE and isinstance(obj, entities.Entity):
+            render_queue.begin()
+        else:
+            render_queue.end()
+        obj.draw()
+    render_queue.end()
+
+#draw a frame and show it on the display, redrawing only the parts that changed if g.ENABLE_DIRTY_RECTS is set
+def draw_frame(include_entities=True, include_interface_components=True):
+    reset_lighting()
+    drawing_objects = get_objects_to_draw(include_entities, include_interface_components)
+
+    if g.ENABLE_DIRTY_RECTS:
+        g.dirty_rect_renderer.draw(drawing_objects, draw_background, draw_objects, draw_lighting)
+    else:
+        draw_background()
+        draw_objects(drawing_objects)
+        draw_lighting()
+        p.display.flip()
+
 elapsed_time = 0
 def wait_for_update(last_update_type):
     #wait to next thing
@@ -11,9 +11,108 @@ import inspect
 import math as m
 
 
+#the collection stored for each class alias in g.game_objects
+#objects are kept in a list with an index dictionary, so adding and removing is O(1) and iteration keeps insertion order
+#removed objects leave a hole (None) in the list which gets compacted away later, so objects can be added or removed while the registry is being iterated over
+#objects added during iteration will still be reached by that iteration, and removed objects that haven't been reached yet are skipped
+class Game_Object_Registry():
+    def __init__(self, objects=()):
+        self.objects = []
+        self.indices = {}
+        self.holes = 0
+        #the number of iterations currently running over the registry, compaction is delayed until this is 0
+        self.iterating = 0
+
+        for obj in objects:
+            self.append(obj)
+
+    def append(self, obj):
+        if obj in self.indices:
+            return
+        self.indices[obj] = len(self.objects)
+        self.objects.append(obj)
+
+    def remove(self, obj):
+        index = self.indices.pop(obj, None)
+        if index is None:
+            raise ValueError("Game_Object_Registry.remove(obj): obj not in registry")
+
+        self.objects[index] = None
+        self.holes += 1
+        self.compact()
+
+    def discard(self, obj):
+        if obj in self.indices:
+            self.remove(obj)
+
+    #remove the holes left by removed objects once they make up over half of the list
+    def compact(self, force=False):
+        if self.iterating or not self.holes:
+            return
+        if not force and (self.holes < 16 or self.holes*2 < len(self.objects)):
+            return
+
+        self.objects = [obj for obj in self.objects if obj is not None]
+        self.indices = {obj:i for i, obj in enumerate(self.objects)}
+        self.holes = 0
+
+    def clear(self):
+        #objects can't be reused while an iteration is still running, so they are just blanked out
+        if self.iterating:
+            for i in range(len(self.objects)):
+                self.objects[i] = None
+            self.holes = len(self.objects)
+        else:
+            self.objects = []
+            self.holes = 0
+        self.indices = {}
+
+    def copy(self):
+        return [obj for obj in self.objects if obj is not None]
+
+    def __iter__(self):
+        self.iterating += 1
+        try:
+            objects = self.objects
+            i = 0
+            #the length is checked every step so objects appended during iteration are included
+            while i < len(objects):
+                obj = objects[i]
+                if obj is not None:
+                    yield obj
+                i += 1
+        finally:
+            self.iterating -= 1
+            self.compact()
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __bool__(self):
+        return bool(self.indices)
+
+    def __contains__(self, obj):
+        return obj in self.indices
+
+    #works with ints and slices, the holes are compacted away first so the list can be indexed directly
+    #(while the registry is being iterated over it can't be compacted, so a copy without the holes is indexed instead)
+    def __getitem__(self, index):
+        if self.holes:
+            if self.iterating:
+                return self.copy()[index]
+            self.compact(force=True)
+        return self.objects[index]
+
+    def __repr__(self):
+        return "Game_Object_Registry("+repr(self.copy())+")"
+
+
 # abstact parent class for basically anything in the game
 class Game_Object():
     def __init__(self, rect, **_kwargs):
+        # the slot of the game object in g.physics_integrator, None if it isn't integrated
+        self.physics_index = None
+
         self.rect = p.Rect(rect)
         # x, y, width, height attributes are needed since pygame rect can only store int values
         self.x = self.rect.x
@@ -54,6 +153,8 @@ class Game_Object():
         self.graphics = None
         self.surface = None
         self.cache_surfaces = True
+        # set to False to always rotate by the exact angle instead of using g.rotation_cache
+        self.cache_rotations = True
         self.angle = 0
         self.draw_bias = 0
 
@@ -101,7 +202,7 @@ class Game_Object():
             if alias in g.game_objects.keys():
                 g.game_objects[alias].append(self)
             else:
-                g.game_objects.update({alias: [self]})
+                g.game_objects.update({alias: Game_Object_Registry([self])})
 
     def set_max_v(self, value):
         self.max_v = value
@@ -278,9 +379,16 @@ class Game_Object():
         self.vy *= self.vy_keep
 
     def update_position_and_velocity(self):
-        self.clamp_velocity()
+        # integrated game objects are damped and clamped by g.physics_integrator for every object at once
+        if self.physics_index is None:
+            self.clamp_velocity()
+        else:
+            g.physics_integrator.prepare_move(self)
+
         self.move(self.vx, self.vy)
-        self.slow_velocity()
+
+        if self.physics_index is None:
+            self.slow_velocity()
 
     def update(self):
         if self.width != self.old_width or self.height != self.old_height:
@@ -330,7 +438,19 @@ class Game_Object():
         if self.surface:
             # TODO, test whether pygame will accept non-whole numbers in scale instructions
             draw_surface = gfx.scale_surface(self.surface, (self.rect.w, self.rect.h), cache=self.cache_surfaces)
-            gfx.draw_rotated_surface(draw_surface, self.rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5)
+            if self.angle == 0:
+                gfx.queue_blit(draw_surface, self.rect.topleft)
+            else:
+                gfx.draw_rotated_surface(draw_surface, self.rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, cache=self.cache_surfaces and self.cache_rotations)
+
+    # the rect the object covers on the screen when it is drawn (before rotation), used by display.Dirty_Rect_Renderer
+    def get_screen_rect(self):
+        return self.rect.copy()
+
+    # something that changes whenever the object would look different when drawn at the same screen rect
+    # None means the object can't tell, so the dirty rect renderer redraws it every frame
+    def get_draw_state(self):
+        return None
 
     def set_old_properties(self):
         self.old_x = self.x
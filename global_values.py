@@ -6,15 +6,16 @@ import gc
 
 
 def clear_surface_cache():
-    global surface_cache
-    surface_cache = {}
+    if surface_cache is not None:
+        surface_cache.clear()
+    if rotation_cache is not None:
+        rotation_cache.clear()
     gc.collect()
 
+#the filter mode is part of each scaled surface's key in the surface cache, so it doesn't need clearing
 def set_filtering(enable):
-    old_enable = g.FILTER_SCALING
-    g.FILTER_SCALING = enable
-    if old_enable != g.FILER_SCALING:
-        clear_surface_cache()
+    global FILTER_SCALING
+    FILTER_SCALING = enable
         
 def get_default_surface():
     width, height = 16,16
@@ -111,6 +112,77 @@ CHUNK_HEIGHT = 80
 
 DEFAULT_LEVEL_SEGMENT_SIZE = 100
 ENABLE_SEGMENT_ENTITY_THRESHOLD = 30
+
+#use the persistent spatial hash (broadphase.Spatial_Hash) for entity collision queries instead of level segments
+ENABLE_BROADPHASE = True
+BROADPHASE_CELL_SIZE = 64
+
+#entities with can_sleep set stop being updated after their real velocity has stayed below the threshold for SLEEP_DELAY ticks
+ENABLE_SLEEPING = True
+SLEEP_VELOCITY_THRESHOLD = 0.05
+SLEEP_DELAY = 60
+
+#entities created while this is True store their velocity attributes in physics.Physics_Integrator (g.physics_integrator)
+#which damps, applies gravity to and clamps all of them at once each tick
+#in a benchmark of 1000 moving entities this took about 1ms a tick instead of 1.4ms, which is small next to the rest of Entity.update
+#integrated entities have their class swapped for a subclass (so type(entity) is Entity is False), and their velocity is already clamped between ticks
+ENABLE_PHYSICS_INTEGRATOR = False
+
+#the most nodes a single ai.get_path search will expand before giving up and returning the path to the closest node found
+PATHFINDING_NODE_BUDGET = 20000
+
+#node maps made by ai.generate_from_level are saved in this folder, and loaded from it instead of being generated again
+#when the level's collision and the generation settings are the same
+ENABLE_NODE_MAP_CACHE = True
+NODE_MAP_CACHE_DIR = data_dir+"node_map_cache"+os.path.sep
+
+#the most nodes each ai.Flow_Field will expand per tick while it is being rebuilt after its target moves
+FLOW_FIELD_NODE_BUDGET = 5000
+
+#the most paths each node map keeps in its ai.Path_Cache
+ENABLE_PATH_CACHE = True
+PATH_CACHE_SIZE = 512
+
+#paths and sightlines requested with ai.request_path and ai.request_sightline are worked out on this many background threads
+#(0 to work them out as soon as they are requested), and at most QUERY_DELIVERY_BUDGET finished ones are handed back each tick
+PATHFINDING_WORKERS = 2
+QUERY_DELIVERY_BUDGET = 32
+
+#entities far from the camera (and g.lod_scheduler.interest_points) are updated less often, see lod.LOD_Scheduler
+#each band is (max distance, update interval, mode) nearest first, and the last band's distance can be None for everything further away
+#on the ticks they aren't updated, entities in "kinematic" bands still move with their velocity while entities in "skip" bands are frozen
+ENABLE_LOD = False
+LOD_BANDS = ((800, 1, None), (1600, 2, "kinematic"), (3200, 4, "kinematic"), (None, 8, "skip"))
+
+#Tile_Level.draw bakes the still tiles in each square of TILE_CHUNK_SIZE by TILE_CHUNK_SIZE tiles onto one surface (a levels.Tile_Chunk)
+#so that drawing them is one blit per chunk, and keeps up to TILE_CHUNK_CACHE_SIZE of the most recently drawn chunks of each level
+#using at most TILE_CHUNK_CACHE_MAX_BYTES of memory (the chunks on screen are always kept, even if there are more than that)
+ENABLE_TILE_CHUNKS = True
+TILE_CHUNK_SIZE = 16
+TILE_CHUNK_CACHE_SIZE = 128
+TILE_CHUNK_CACHE_MAX_BYTES = 64*1024*1024
+
+#game.draw_frame only redraws and updates the parts of the screen that changed since the last frame (see display.Dirty_Rect_Renderer)
+#falling back to redrawing everything when more than DIRTY_RECT_FULL_REDRAW_AREA of the screen changed
+ENABLE_DIRTY_RECTS = False
+DIRTY_RECT_FULL_REDRAW_AREA = 0.5
+
+#game.draw_objects pushes the screen blits made while drawing entities into gfx.Render_Queue (g.render_queue)
+#and does them with Surface.blits, RENDER_QUEUE_BATCH_SIZE at a time, instead of one blit call each
+ENABLE_RENDER_QUEUE = False
+RENDER_QUEUE_BATCH_SIZE = 256
+
+#the most memory graphics.scale_surface's cache (g.surface_cache) can use for scaled surfaces before the least recently used are dropped
+#entries are grouped by the camera zoom they were last used at, in steps of SURFACE_CACHE_ZOOM_STEP powers of 2
+SURFACE_CACHE_MAX_BYTES = 128*1024*1024
+SURFACE_CACHE_ZOOM_STEP = 0.25
+
+#graphics.draw_rotated_surface keeps rotated surfaces (and where to draw them) in g.rotation_cache, with angles rounded to ROTATION_CACHE_ANGLE_STEP
+#objects with cache_rotations set to False are always rotated by their exact angle
+ENABLE_ROTATION_CACHE = True
+ROTATION_CACHE_ANGLE_STEP = m.radians(2)
+ROTATION_CACHE_MAX_BYTES = 64*1024*1024
+
 GLOBAL_VOLUME = 1
 
 ENTITY_STEP_SNAP_THRESHOLD = 15
@@ -157,10 +229,14 @@ spritesheets = {}
 fonts = {}
 logs = {}
 node_maps = set()
+flow_fields = set()
 light_grids = set()
 pressed_buttons = set()
 
-surface_cache = {}
+#graphics.Surface_Cache for graphics.scale_surface
+surface_cache = None
+#graphics.Surface_Cache for graphics.draw_rotated_surface
+rotation_cache = None
 sound_properties = {}
 pot_sounds = {}
 saved_data_dicts = {}
@@ -172,6 +248,16 @@ pg_events = []
 current_pressed_button = None
 
 active_levels = []
+spatial_hash = None
+#entities.Collision_Probes that aren't being used
+collision_probes = []
+physics_integrator = None
+lod_scheduler = None
+dirty_rect_renderer = None
+render_queue = None
+query_pool = None
+#True while Entity.push_chain is moving the entities in a chain, so they don't start pushing chains of their own
+resolving_push_chain = False
 structure_classes = {}
 current_level = None
 camera = None
@@ -8,6 +8,7 @@ from . import global_values as g
 import math as m
 import pygame as p
 import os
+from collections import OrderedDict
 
 class Sprite():
     def __init__(self, surface, create_extras=False, mask_threshold=127, highlight_colour=g.YELLOW, highlight_aa=False, highlight_thickness=1, convert=True):            
@@ -578,24 +579,111 @@ def scale_graphics(graphics, size, cache=True):
     scaled_surface = scale_surface(surface, size, cache=cache)
     return scaled_surface
     
+#a least recently used cache of transformed surfaces (g.surface_cache holds the one for scale_surface) limited to max_bytes of surface memory
+#entries are grouped into buckets by the camera's zoom (in steps of g.SURFACE_CACHE_ZOOM_STEP powers of 2) when they were last used,
+#and the buckets that haven't been used for longest are emptied first, so zooming doesn't throw away the surfaces for other zoom levels
+#but the sizes only needed partway through a zoom are the first to go
+#the source surface of each entry is kept alive with it, so keys using id(source) can't be reused by a new surface while it is cached
+class Surface_Cache():
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        #zoom bucket -> OrderedDict of key -> (value, size in bytes, source surface), least recently used first in both
+        self.buckets = OrderedDict()
+        self.key_buckets = {}
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_zoom_bucket(self):
+        if g.camera is None:
+            return 0
+        return round(m.log2(g.camera.scale_x)/g.SURFACE_CACHE_ZOOM_STEP)
+
+    def get(self, key):
+        bucket_key = self.key_buckets.get(key)
+        if bucket_key is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        bucket = self.buckets[bucket_key]
+        current_bucket_key = self.get_zoom_bucket()
+        if bucket_key == current_bucket_key:
+            bucket.move_to_end(key)
+            self.buckets.move_to_end(bucket_key)
+            return bucket[key][0]
+
+        #move the entry to the bucket for the current zoom
+        entry = bucket.pop(key)
+        if not bucket:
+            del self.buckets[bucket_key]
+        self.get_bucket(current_bucket_key)[key] = entry
+        self.key_buckets[key] = current_bucket_key
+        return entry[0]
+
+    def get_bucket(self, bucket_key):
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = OrderedDict()
+            self.buckets[bucket_key] = bucket
+        else:
+            self.buckets.move_to_end(bucket_key)
+        return bucket
+
+    def add(self, key, value, size_bytes, source=None):
+        if key in self.key_buckets:
+            self.remove(key)
+
+        bucket_key = self.get_zoom_bucket()
+        self.get_bucket(bucket_key)[key] = (value, size_bytes, source)
+        self.key_buckets[key] = bucket_key
+        self.bytes += size_bytes
+
+        while self.bytes > self.max_bytes and len(self.key_buckets) > 1:
+            bucket_key, bucket = next(iter(self.buckets.items()))
+            key, (value, size_bytes, source) = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[bucket_key]
+            del self.key_buckets[key]
+            self.bytes -= size_bytes
+            self.evictions += 1
+
+    def remove(self, key):
+        bucket_key = self.key_buckets.pop(key)
+        bucket = self.buckets[bucket_key]
+        value, size_bytes, source = bucket.pop(key)
+        if not bucket:
+            del self.buckets[bucket_key]
+        self.bytes -= size_bytes
+
+    def clear(self):
+        self.buckets = OrderedDict()
+        self.key_buckets = {}
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.key_buckets)
+
+def get_surface_bytes(surface):
+    return surface.get_pitch()*surface.get_height()
+
 def scale_surface(surface, size, cache=True):
     width, height = int(size[0]), int(size[1])
 
     if cache:
-        if size != surface.get_size():
-            #cache the surface to improve performance by minimising transforms        
-            #multiplying (height) by a very small number drastically reduces the chance of hash collisions
-            surface_hash = hash(surface)+(width)+(height*0.13)
-            if g.surface_cache.get(surface_hash, False):
-                scaled_surface = g.surface_cache[surface_hash]
-            else:
+        if (width, height) != surface.get_size():
+            #cache the surface to improve performance by minimising transforms
+            key = (id(surface), width, height, g.FILTER_SCALING)
+            scaled_surface = g.surface_cache.get(key)
+            if scaled_surface is None:
                 if g.FILTER_SCALING:
                     scaled_surface = p.transform.smoothscale(surface, (width, height))
                 else:
                     scaled_surface = p.transform.scale(surface, (width, height))
                     
-                #print("mustlock:", scaled_surface.mustlock(), "flags:", bin(scaled_surface.get_flags()), "width:",width, "height:",height)
-                g.surface_cache.update({surface_hash:scaled_surface})
+                g.surface_cache.add(key, scaled_surface, get_surface_bytes(scaled_surface), surface)
                 
             return scaled_surface
         else:
@@ -604,17 +692,109 @@ def scale_surface(surface, size, cache=True):
         scaled_surface = p.transform.scale(surface, (width, height))
         return scaled_surface
 
+#collects the blits to the screen made while it is active, so they can be done together with Surface.blits when it is flushed
+#instead of one blit call each (game.draw_objects keeps it active while drawing runs of entities when g.ENABLE_RENDER_QUEUE is set)
+#blits are done in order of layer, and in the order they were pushed within a layer
+#anything that draws to the screen without going through the queue while it is active should flush it first
+class Render_Queue():
+    def __init__(self):
+        self.active = False
+        self.records = []
+        self.layered = False
+
+        #how many blits and Surface.blits calls were made by the last flush
+        self.blit_count = 0
+        self.batch_count = 0
+
+    def begin(self):
+        self.active = True
+
+    def push(self, surface, dest, area=None, special_flags=0, layer=0):
+        self.records.append((layer, (surface, dest, area, special_flags)))
+        if layer:
+            self.layered = True
+
+    def flush(self):
+        records = self.records
+        self.blit_count = len(records)
+        self.batch_count = 0
+        if not records:
+            return
+
+        self.records = []
+        #sort is stable, so records in the same layer keep their order
+        if self.layered:
+            records.sort(key=get_record_layer)
+            self.layered = False
+
+        blit_sequence = [record[1] for record in records]
+        batch_size = g.RENDER_QUEUE_BATCH_SIZE
+        for i in range(0, len(blit_sequence), batch_size):
+            g.screen.blits(blit_sequence[i:i+batch_size], doreturn=False)
+            self.batch_count += 1
+
+    def end(self):
+        if self.active:
+            self.flush()
+            self.active = False
+
+def get_record_layer(record):
+    return record[0]
+
+#blit to the screen, through the render queue if it is active
+def queue_blit(surface, dest, area=None, special_flags=0, layer=0):
+    if g.render_queue.active:
+        g.render_queue.push(surface, dest, area, special_flags, layer)
+    else:
+        g.screen.blit(surface, dest, area=area, special_flags=special_flags)
+
+#draw anything that blits to the screen directly after everything already in the render queue
+def flush_render_queue():
+    if g.render_queue.active:
+        g.render_queue.flush()
+
 def draw_scaled_graphics(graphics, rect, draw_surface_override=None, draw_area=None, special_flags=0, cache=True):
+    surface = scale_surface(get_surface(graphics), (rect.w, rect.h), cache=cache)
+
     if draw_surface_override:
-        draw_surface = draw_surface_override
+        draw_surface_override.blit(surface, rect, area=draw_area, special_flags=special_flags)
     else:
-        draw_surface = g.screen
+        queue_blit(surface, (rect[0], rect[1]), draw_area, special_flags)
 
-    surface = scale_surface(get_surface(graphics), (rect.w, rect.h), cache=cache)
+#rotate a surface and work out where to draw it relative to pos so the anchor (cx, cy) lands on pos moved by (ox, oy) of the surface's size
+def rotate_surface(surface, angle, cx=0.5, cy=0.5, ox=0, oy=0):
+    rotated_surface = p.transform.rotate(surface, m.degrees(angle))
+
+    w, h = surface.get_size()
+    surface_rect = p.Rect(0, 0, w, h)
+    anchor_point = surface_rect.x+(cx*w), surface_rect.y+(cy*h)
+
+    anchor_to_center_difference = anchor_point[0]-surface_rect.centerx, anchor_point[1]-surface_rect.centery
 
-    draw_surface.blit(surface, rect, area=draw_area, special_flags=special_flags)
+    w, h = rotated_surface.get_size()
+    rotated_surface_rect = p.Rect(0, 0, w, h)
+
+    rotated_anchor_point = rotated_surface_rect.centerx+anchor_to_center_difference[0], rotated_surface_rect.centery+anchor_to_center_difference[1]
+    rotated_anchor_point = util.rotate_point(rotated_surface_rect.center, rotated_anchor_point, -angle)
+
+    offset_x = -rotated_anchor_point[0]+(surface_rect.w*ox)
+    offset_y = -rotated_anchor_point[1]+(surface_rect.h*oy)
+    return rotated_surface, offset_x, offset_y
 
-def draw_rotated_surface(surface, pos, angle, cx=0.5, cy=0.5, ox=0, oy=0, draw_surface_override=None, draw_area=None, special_flags=0):
+#get a rotated surface and its offset from g.rotation_cache, with the angle rounded to the nearest g.ROTATION_CACHE_ANGLE_STEP
+def get_cached_rotation(surface, angle, cx=0.5, cy=0.5, ox=0, oy=0):
+    steps = round(m.tau/g.ROTATION_CACHE_ANGLE_STEP)
+    step = round(angle/m.tau*steps)%steps
+    key = (id(surface), surface.get_size(), step, cx, cy, ox, oy)
+
+    rotation = g.rotation_cache.get(key)
+    if rotation is None:
+        rotation = rotate_surface(surface, step*m.tau/steps, cx=cx, cy=cy, ox=ox, oy=oy)
+        g.rotation_cache.add(key, rotation, get_surface_bytes(rotation[0]), surface)
+    return rotation
+
+#cache can be set to False to rotate by the exact angle, like for surfaces that are only drawn once
+def draw_rotated_surface(surface, pos, angle, cx=0.5, cy=0.5, ox=0, oy=0, draw_surface_override=None, draw_area=None, special_flags=0, cache=True):
     if draw_surface_override:
         draw_surface = draw_surface_override
     else:
@@ -622,28 +802,33 @@ def draw_rotated_surface(surface, pos, angle, cx=0.5, cy=0.5, ox=0, oy=0, draw_s
         
     if angle == 0:
         #blit surface normally if angle == 0
-        draw_surface.blit(surface, pos, area=draw_area, special_flags=special_flags)
+        if draw_surface_override:
+            draw_surface.blit(surface, pos, area=draw_area, special_flags=special_flags)
+        else:
+            queue_blit(surface, pos, draw_area, special_flags)
         return
+    elif cache and g.ENABLE_ROTATION_CACHE:
+        rotated_surface, offset_x, offset_y = get_cached_rotation(surface, angle, cx=cx, cy=cy, ox=ox, oy=oy)
     else:
-        rotated_surface = p.transform.rotate(surface, m.degrees(angle))
+        rotated_surface, offset_x, offset_y = rotate_surface(surface, angle, cx=cx, cy=cy, ox=ox, oy=oy)
 
-    w, h = surface.get_size()
-    surface_rect = p.Rect(pos[0], pos[1], w, h)
-    anchor_point = surface_rect.x+(cx*w), surface_rect.y+(cy*h)
-
-    anchor_to_center_difference = anchor_point[0]-surface_rect.centerx, anchor_point[1]-surface_rect.centery
+    rotated_surface_rect = rotated_surface.get_rect()
+    rotated_surface_rect.x = pos[0]+offset_x
+    rotated_surface_rect.y = pos[1]+offset_y
+    if draw_surface_override:
+        draw_surface.blit(rotated_surface, rotated_surface_rect, area=draw_area, special_flags=special_flags)
+    else:
+        queue_blit(rotated_surface, rotated_surface_rect, draw_area, special_flags)
 
-    w, h = rotated_surface.get_size()
-    rotated_surface_rect = p.Rect(pos[0], pos[1], w, h)
+def draw_rotated_graphics(graphics, pos, angle, cx=0.5, cy=0.5, ox=0, oy=0, draw_surface_override=None, draw_area=None, special_flags=0, cache=True):
+    surface = get_surface(graphics)
+    return draw_rotated_surface(surface, pos, angle, cx=cx, cy=cy, ox=ox, oy=oy, draw_surface_override=draw_surface_override, draw_area=draw_area, special_flags=special_flags, cache=cache)
 
-    rotated_anchor_point = rotated_surface_rect.centerx+anchor_to_center_difference[0], rotated_surface_rect.centery+anchor_to_center_difference[1]
-    rotated_anchor_point = util.rotate_point(rotated_surface_rect.center, rotated_anchor_point, -angle)
+if g.render_queue is None:
+    g.render_queue = Render_Queue()
 
-    difference = pos[0]-rotated_anchor_point[0], pos[1]-rotated_anchor_point[1]
-    rotated_surface_rect.x += difference[0]+(surface_rect.w*ox)
-    rotated_surface_rect.y += difference[1]+(surface_rect.h*oy)
-    draw_surface.blit(rotated_surface, rotated_surface_rect, area=draw_area, special_flags=special_flags)
+if g.surface_cache is None:
+    g.surface_cache = Surface_Cache(g.SURFACE_CACHE_MAX_BYTES)
 
-def draw_rotated_graphics(graphics, pos, angle, cx=0.5, cy=0.5, ox=0, oy=0, draw_surface_override=None, draw_area=None, special_flags=0):
-    surface = get_surface(graphics)
-    return draw_rotated_surface(surface, pos, angle, cx=cx, cy=cy, ox=ox, oy=oy, draw_surface_override=draw_surface_override, draw_area=draw_area, special_flags=special_flags)
+if g.rotation_cache is None:
+    g.rotation_cache = Surface_Cache(g.ROTATION_CACHE_MAX_BYTES)
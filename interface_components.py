@@ -143,6 +143,9 @@ class Decoration(Interface_Component):
         self.surface = gfx.scale_graphics(self.graphics, (self.rect.width, self.rect.height))
         g.screen.blit(self.surface, self.rect)
 
+    def get_draw_state(self):
+        return gfx.get_surface(self.graphics)
+
 class Background(Decoration):
     def __init__(self, graphics, active_states, **_kwargs):
         kwargs = {"background":True}
@@ -329,6 +332,9 @@ class Button(Interface_Component):
         if self.highlighted and self.highlighted_colour:
             p.draw.rect(g.screen, self.highlighted_colour, rect, self.highlighted_thickness)
 
+    def get_draw_state(self):
+        return (self.surface, self.pressed, self.highlighted)
+
 class Button_List(Interface_Component):
     def __init__(self, name, buttons_info, x, y, button_width, button_height, active_states, **_kwargs):
         kwargs = {"direction":"horizontal", "spacing":0, "path_prefix":"", "button_type":"hold", "radio_buttons":False, "highlighted_colour":g.GREEN, "highlighted_thickness":4}
@@ -393,6 +399,10 @@ class Button_List(Interface_Component):
         
         for button in self.buttons:
             button.active_override = self.active
+
+    #the buttons are drawn by themselves, so the list itself never needs redrawing
+    def get_draw_state(self):
+        return ()
         
             
 class Slides(Interface_Component):
@@ -423,6 +433,9 @@ class Slides(Interface_Component):
         Interface_Component.draw(self)
         g.screen.blit(self.surface, self.rect)
 
+    def get_draw_state(self):
+        return self.surface
+
 class Measurement(Interface_Component):
     def __init__(self, graphics, pos, gfx_size, variable_name, gfx_value, active_states, **_kwargs):
         #round:
@@ -593,6 +606,9 @@ class Text_Box(Interface_Component):
     def draw(self):    
         g.screen.blit(self.surface, self.rect)
 
+    def get_draw_state(self):
+        return self.surface
+
 class Monitor(Text_Box):
     def __init__(self, rect, font, variable_name, active_states, text_colour, **_kwargs):
         self.variable_name = variable_name
@@ -5,10 +5,13 @@
 from . import global_values as g
 from . import utilities as util
 from . import graphics as gfx
+from . import pathfinding
 
 import math as m
 import pygame as p
 import random as r
+import numpy as np
+from collections import OrderedDict
 
 #dictionary for keeping track of different tile types
 tiles_info = {}
@@ -111,6 +114,18 @@ def get_tile_t(tx, ty, level=None, bounded=False):
                 if tile:
                     return tile
 
+#turn a list of rects (or anything that can be turned into an (N, 4) array of x, y, w, h values) into an int array
+def get_rect_array(rects):
+    rect_array = np.asarray([tuple(rect) for rect in rects] if isinstance(rects, list) else rects, dtype=np.int64)
+    return rect_array.reshape(-1, 4)
+
+#wake up every sleeping entity touching a rect
+def wake_entities(rect):
+    if g.spatial_hash is not None:
+        for entity in g.spatial_hash.query(rect, ("class_Entity",)):
+            if entity.sleeping and entity.collide_rect.colliderect(rect):
+                entity.wake()
+
 def get_segments(rect, tags=None):
     segments = []
     for level in g.active_levels:
@@ -184,24 +199,34 @@ class Level():
     def update(self):
         pass
 
+    #should be called whenever the tiles or structures in an area of the level change, so that node maps made from the level can update
+    def area_changed(self, rect):
+        for node_map in g.node_maps:
+            if node_map.level is self:
+                node_map.area_changed(rect)
+
+    #get the range of segment indices (sx, sy, ex, ey) that a rect overlaps, clamped to the level (end exclusive)
+    def get_segment_range(self, rect):
+        sx = max(int((rect.x-self.x)/self.segment_width), 0)
+        sy = max(int((rect.y-self.y)/self.segment_height), 0)
+        ex = min(int((rect.right-self.x)/self.segment_width)+1, self.segments_width)
+        ey = min(int((rect.bottom-self.y)/self.segment_height)+1, self.segments_height)
+        return sx, sy, max(ex, sx), max(ey, sy)
+
     def get_segments(self, rect, tags=None):
         segments = []
-            
-        sx = int((rect.x-self.x)/self.segment_width)
-        sy = int((rect.y-self.y)/self.segment_height)
-        ex = int((rect.right-self.x)/self.segment_width)+1
-        ey = int((rect.bottom-self.y)/self.segment_height)+1
+
+        sx, sy, ex, ey = self.get_segment_range(rect)
         y_range = range(sy,ey)
         for x in range(sx,ex):
             for y in y_range:
-                if x >= 0 and y >= 0 and x < self.width/self.segment_width and y < self.height/self.segment_height:
-                    segment = self.segments[x][y]
-                    
-                    if tags:
-                        if not tags.isdisjoint(segment.tags):
-                            segments.append(segment)
-                    else:
+                segment = self.segments[x][y]
+
+                if tags:
+                    if not tags.isdisjoint(segment.tags):
                         segments.append(segment)
+                else:
+                    segments.append(segment)
                     
         return segments
         
@@ -263,13 +288,31 @@ class Level():
         self.gx = m.cos(direction)*strength
         self.gy = m.sin(direction)*strength
         
-    def check_collision(self, rect, mask):
+    def check_collision(self, rect, mask, obj=None):
         return False
 
+    #check collision for lots of rects at once, rects should be an (N, 4) array of x, y, w, h values
+    #masks can be None (the rects are filled), a single mask used for every rect or a list with one mask per rect
+    #returns a boolean array of which rects are colliding and an int array of the flat index ([x][y] order) of the tile or chunk
+    #each rect collided with, or -1 if it isn't colliding
+    def check_collision_many(self, rects, masks=None):
+        rects = get_rect_array(rects)
+        return np.zeros(len(rects), dtype=bool), np.full(len(rects), -1, dtype=np.int64)
+
     #check collision between a line and the level
     def check_line_collision(self, p1, p2):
         return False
 
+    #get the solid parts of the level inside a rect as a list of (rect, object) tuples, used for swept collision
+    #returns None if the level's collision can't be described using rects
+    def get_collision_rects(self, rect):
+        return []
+
+    #get bytes describing everything that affects the level's collision, used to tell if cached data made from it (like node maps) is still valid
+    #returns None if the collision can't be described this way
+    def get_collision_data(self):
+        return np.array(self.rect, dtype=np.int64).tobytes()
+
     def draw(self):
         pass
 
@@ -278,7 +321,8 @@ class Level():
             segment.draw()
 
 class Mask_Level(Level):
-    def __init__(self, data, info_data, cw, ch, x=0, y=0, level_scale_x=1, level_scale_y=1, active=True, enable_segmenting=True, segment_size=g.DEFAULT_LEVEL_SEGMENT_SIZE):
+    def __init__(self, data, info_data, cw, ch, x=0, y=0, level_scale_x=1, level_scale_y=1, active=True, enable_segmenting=True, segment_size=g.DEFAULT_LEVEL_SEGMENT_SIZE,
+    build_occupancy=True):
 
         self.cw = cw
         self.ch = ch
@@ -322,6 +366,9 @@ class Mask_Level(Level):
         self.c_width = m.ceil(self.rect.width/self.cw)
         self.c_height = m.ceil(self.rect.height/self.ch)
 
+        #built the first time check_collision_many is used
+        self.solid_chunk_table = None
+
         for x in range(self.c_width):
             cx = x*self.cw
             self.chunks.append([])
@@ -335,6 +382,30 @@ class Mask_Level(Level):
                 self.chunk_list.append(chunk)
                 self.chunks[-1].append(chunk)
 
+        #list of boolean arrays (indexed [x, y]) of which pixels are solid, where each array is half the size of the previous one
+        #a cell is solid if any of the pixels it covers are, so big empty areas can be skipped over by collision checks and raycasts
+        self.occupancy_levels = None
+        if build_occupancy:
+            self.build_occupancy(collision_surface)
+
+    def build_occupancy(self, collision_surface):
+        #made the same way as chunk masks, just for the whole level at once
+        occupancy_surface = p.Surface((self.rect.width, self.rect.height)).convert()
+        occupancy_surface.blit(collision_surface, (0,0))
+        occupancy_mask = p.mask.from_threshold(occupancy_surface, (0,0,0,255), (255,255,255,255))
+
+        occupancy = p.surfarray.array_red(occupancy_mask.to_surface()) > 0
+        self.occupancy_levels = [occupancy]
+        while max(occupancy.shape) > 1:
+            width, height = occupancy.shape
+            padded_occupancy = np.zeros((width+(width % 2), height+(height % 2)), dtype=bool)
+            padded_occupancy[:width, :height] = occupancy
+            occupancy = padded_occupancy.reshape(padded_occupancy.shape[0]//2, 2, padded_occupancy.shape[1]//2, 2).any(axis=(1, 3))
+            self.occupancy_levels.append(occupancy)
+
+        #flat copies ([x*height+y] indexed) that are faster to look single cells up in
+        self.occupancy_bytes = [(occupancy.tobytes(), occupancy.shape[1]) for occupancy in self.occupancy_levels]
+
     def update(self):
         Level.update(self)
         self.set_active_chunks(g.player.rect.center)
@@ -342,8 +413,8 @@ class Mask_Level(Level):
     def get_chunk(self, px, py, bounded=False):
         px -= self.x
         py -= self.y
-        tx = int(px/self.tw)
-        ty = int(py/self.th)
+        tx = int(px/self.cw)
+        ty = int(py/self.ch)
 
         if bounded:
             tx = max(min(tx,len(self.chunks)-1),0)
@@ -357,9 +428,29 @@ class Mask_Level(Level):
         return chunk
 
     def check_collision(self, rect, mask, obj=None):
+        cdef int k, sx, sy, ex, ey
+
         colliding = Level.check_collision(self, rect, mask)
         if colliding:
             return colliding
+
+        #skip checking chunk masks if there aren't any solid pixels under the rect
+        if self.occupancy_levels is not None:
+            sx = max(rect.left-self.x, 0)
+            sy = max(rect.top-self.y, 0)
+            ex = min(rect.right-self.x, self.rect.w)
+            ey = min(rect.bottom-self.y, self.rect.h)
+            if sx >= ex or sy >= ey:
+                return False
+
+            #first check the level where the rect only covers a couple of cells, then check every pixel
+            k = 0
+            while (1 << k) < max(ex-sx, ey-sy) and k < len(self.occupancy_levels)-1:
+                k += 1
+            if not self.occupancy_levels[k][sx >> k:((ex-1) >> k)+1, sy >> k:((ey-1) >> k)+1].any():
+                return False
+            if not self.occupancy_levels[0][sx:ex, sy:ey].any():
+                return False
         
         sx = int((rect.x-self.x)/self.cw)
         sy = int((rect.y-self.y)/self.ch)
@@ -373,28 +464,163 @@ class Mask_Level(Level):
                         return chunk
         return False
 
+    #rects are rejected in bulk if every chunk they overlap is empty, the rest are checked against chunk masks one by one
+    def check_collision_many(self, rects, masks=None):
+        rects = get_rect_array(rects)
+        hits = np.zeros(len(rects), dtype=bool)
+        indices = np.full(len(rects), -1, dtype=np.int64)
+        if not len(rects):
+            return hits, indices
+
+        #summed area table of which chunks have solid pixels, so the amount of solid chunks in any range can be looked up at once
+        if self.solid_chunk_table is None:
+            solid_chunks = np.array([[chunk.mask.count() > 0 for chunk in column] for column in self.chunks], dtype=np.int64)
+            self.solid_chunk_table = np.zeros((self.c_width+1, self.c_height+1), dtype=np.int64)
+            self.solid_chunk_table[1:, 1:] = solid_chunks.cumsum(0).cumsum(1)
+
+        #chunk ranges (end exclusive) matching the ones used by check_collision
+        sx = np.clip((rects[:, 0]-self.x)//self.cw, 0, self.c_width)
+        sy = np.clip((rects[:, 1]-self.y)//self.ch, 0, self.c_height)
+        ex = np.clip(((rects[:, 0]+rects[:, 2]-self.x)//self.cw)+2, 0, self.c_width)
+        ey = np.clip(((rects[:, 1]+rects[:, 3]-self.y)//self.ch)+2, 0, self.c_height)
+        ex = np.maximum(ex, sx)
+        ey = np.maximum(ey, sy)
+
+        table = self.solid_chunk_table
+        solid_amounts = table[ex, ey]-table[sx, ey]-table[ex, sy]+table[sx, sy]
+
+        for i in np.flatnonzero(solid_amounts):
+            rect = p.Rect(rects[i].tolist())
+            if masks is None:
+                mask = p.Mask(rect.size, fill=True)
+            elif isinstance(masks, p.mask.Mask):
+                mask = masks
+            else:
+                mask = masks[i]
+
+            chunk = self.check_collision(rect, mask)
+            if chunk:
+                hits[i] = True
+                indices[i] = ((chunk.rect.x-self.x)//self.cw)*self.c_height+((chunk.rect.y-self.y)//self.ch)
+
+        return hits, indices
+
+    #collision is pixel perfect so it can't be swept
+    def get_collision_rects(self, rect):
+        return None
+
+    def get_collision_data(self):
+        if self.occupancy_levels is None:
+            return None
+        return Level.get_collision_data(self)+np.packbits(self.occupancy_levels[0]).tobytes()
+
+    def check_point_collision(self, point):
+        x = m.floor(point[0]-self.x)
+        y = m.floor(point[1]-self.y)
+        if not (0 <= x < self.rect.w and 0 <= y < self.rect.h):
+            return False
+
+        if self.occupancy_levels is not None:
+            if not self.occupancy_levels[0][x, y]:
+                return False
+            return self.get_chunk(point[0], point[1])
+
+        chunk = self.get_chunk(point[0], point[1])
+        if chunk and chunk.check_point_collision((x+self.x, y+self.y)):
+            return chunk
+        return False
+
     #check collision between a line and the level
-    #this version uses a "step" to speed things up but it makes it more innacurate
+    #if the level has occupancy levels the line skips over empty cells as big as possible, and every pixel it passes through is checked
+    #otherwise this version uses a "step" to speed things up but it makes it more innacurate
     #so change it as required on a per-game basis
     def check_line_collision(self, p1, p2, step=10):
+        cdef double x1, y1, dx, dy, t, t_end, t_x, t_y, px, py, size
+        cdef int k, top_k, cx, cy, height
+
         colliding = Level.check_line_collision(self, p1, p2)
         if colliding:
             return colliding
-        
-        angle = util.get_angle(p1[0], p1[1], p2[0], p2[1])
-        distance = util.get_distance(p1[0], p1[1], p2[0], p2[1])
-        step_dist = step#CHANGE AS REQUIRED
-        dx = m.cos(angle)*step_dist
-        dy = m.sin(angle)*step_dist
-
-        x, y = p1
-        for step in range(distance//step_dist):
-            chunk = self.get_chunk(x,y)
-            if chunk.check_point_collision((x,y)):
-                return chunk
-            
-            x += dx
-            y += dy
+
+        if self.occupancy_levels is None:
+            angle = util.get_angle(p1[0], p1[1], p2[0], p2[1])
+            distance = util.get_distance(p1[0], p1[1], p2[0], p2[1])
+            step_dist = step#CHANGE AS REQUIRED
+            dx = m.cos(angle)*step_dist
+            dy = m.sin(angle)*step_dist
+
+            x, y = p1
+            for step in range(int(distance//step_dist)):
+                chunk = self.check_point_collision((x, y))
+                if chunk:
+                    return chunk
+
+                x += dx
+                y += dy
+            return None
+
+        x1 = p1[0]-self.x
+        y1 = p1[1]-self.y
+        dx = p2[0]-p1[0]
+        dy = p2[1]-p1[1]
+
+        #clip the line to the level
+        t = 0
+        t_end = 1
+        for start, delta, size in ((x1, dx, self.rect.w), (y1, dy, self.rect.h)):
+            if delta == 0:
+                if not 0 <= start < size:
+                    return None
+            else:
+                t_x = (0-start)/delta
+                t_y = (size-start)/delta
+                t = max(t, min(t_x, t_y))
+                t_end = min(t_end, max(t_x, t_y))
+        if t > t_end:
+            return None
+
+        occupancy_bytes = self.occupancy_bytes
+        top_k = len(occupancy_bytes)-1
+
+        #start at the level where the cells are about as big as the line is long
+        k = 0
+        while (1 << k) < max(abs(dx), abs(dy)) and k < top_k:
+            k += 1
+
+        while t <= t_end:
+            px = min(max(x1+dx*t, 0), self.rect.w-1)
+            py = min(max(y1+dy*t, 0), self.rect.h-1)
+            cx = int(px) >> k
+            cy = int(py) >> k
+            data, height = occupancy_bytes[k]
+            if data[cx*height+cy]:
+                if k == 0:
+                    return self.get_chunk(px+self.x, py+self.y, bounded=True)
+                #look at the smaller cells inside this one
+                k -= 1
+                continue
+
+            #skip to where the line leaves this empty cell
+            size = 1 << k
+            if dx > 0:
+                t_x = ((cx+1)*size-x1)/dx
+            elif dx < 0:
+                t_x = (cx*size-x1)/dx
+            else:
+                t_x = m.inf
+            if dy > 0:
+                t_y = ((cy+1)*size-y1)/dy
+            elif dy < 0:
+                t_y = (cy*size-y1)/dy
+            else:
+                t_y = m.inf
+
+            #nudge forwards so the line is actually inside the next cell
+            t = max(min(t_x, t_y), t)+1e-9
+            if k < top_k:
+                k += 1
+
+        return None
 
     def set_active_chunks(self, point):
         self.active_chunks.clear()
@@ -470,16 +696,16 @@ class Chunk():
         self.rect = rect
         
         self.surface = p.Surface((self.rect.width, self.rect.height)).convert()
-        self.surface.blit(surface, (0,0), self.rect)
+        self.surface.blit(surface, (0,0), self.rect.move(-self.level.x, -self.level.y))
 
         self.collision_surface = p.Surface((self.rect.width, self.rect.height)).convert()
-        self.collision_surface.blit(collision_surface, (0,0), self.rect)
+        self.collision_surface.blit(collision_surface, (0,0), self.rect.move(-self.level.x, -self.level.y))
 
         self.mask = p.mask.from_threshold(self.collision_surface, (0,0,0,255), (255,255,255,255))
 
     def check_collision(self, rect, mask):
-        if self.rect.move(self.level.x, self.level.y).colliderect(rect):
-            collision_offset = (rect.x-(self.level.x+self.rect.x), rect.y-(self.level.y+self.rect.y))
+        if self.rect.colliderect(rect):
+            collision_offset = (rect.x-self.rect.x, rect.y-self.rect.y)
             collision = self.mask.overlap(mask, collision_offset )
 
             return collision
@@ -508,6 +734,14 @@ class Tile_Level(Level):
         self.tile_list = []
         self.structure_list = []
 
+        #the baked Tile_Chunks (key: (cx, cy)), least recently drawn first, and the tile size on screen they were baked at
+        #made before the tiles, since structures tell the level when they are added
+        self.tile_chunks = OrderedDict()
+        self.tile_chunk_scale = None
+        #the memory used by the baked chunks' surfaces, and a count of draw_chunks calls so the chunks on screen aren't evicted
+        self.tile_chunk_bytes = 0
+        self.tile_chunk_frame = 0
+
         #dictionary containing lists of structures, where each list contains all the level structures with particular
         self.structure_tag_dict = {}
 
@@ -589,6 +823,10 @@ class Tile_Level(Level):
 
         self.tile_surface_cache = {}
 
+        #packed copy of which tiles are solid (indexed [tx, ty]), used for fast collision and line of sight checks
+        #kept up to date by tile_changed
+        self.build_solidity()
+
         
 
         rect = p.Rect(x, y, width, height)       
@@ -701,71 +939,145 @@ class Tile_Level(Level):
 
         return tiles
 
+    def build_solidity(self):
+        self.solidity = np.zeros((self.t_width, self.t_height), dtype=bool)
+        for column in self.tiles:
+            for tile in column:
+                if tile and tile.solid:
+                    self.solidity[tile.tx, tile.ty] = True
+        self.solidity_snapshot = None
+
+    #get a copy of the solidity grid as uint8 that is never changed, so it can be read from other threads (see ai.request_sightline)
+    #a new copy is only made after the solidity has changed
+    def get_solidity_snapshot(self):
+        if self.solidity_snapshot is None:
+            self.solidity_snapshot = self.solidity.astype(np.uint8)
+        return self.solidity_snapshot
+
+    #rebake the chunks in an area the next time they are drawn
+    def area_changed(self, rect):
+        Level.area_changed(self, rect)
+        if self.tile_chunks:
+            size = g.TILE_CHUNK_SIZE
+            sx, sy, ex, ey = self.get_tile_range(rect)
+            for cx in range(sx//size, ((ex-1)//size)+1):
+                for cy in range(sy//size, ((ey-1)//size)+1):
+                    self.remove_tile_chunk((cx, cy))
+
+    #should be called whenever a tile is deleted or its solidity or graphics are changed
+    def tile_changed(self, tile):
+        if 0 <= tile.tx < self.t_width and 0 <= tile.ty < self.t_height:
+            self.solidity[tile.tx, tile.ty] = bool(self.tiles[tile.tx][tile.ty] is tile and tile.solid)
+            self.solidity_snapshot = None
+
+        #entities resting on or against the tile might need to start moving
+        wake_entities(tile.rect.inflate(2, 2))
+        self.area_changed(tile.rect)
+
+    #get the range of tile indices (end exclusive) that a rect overlaps, clamped to the level
+    def get_tile_range(self, rect):
+        cdef long sx, sy, ex, ey
+        sx = max((rect.left-self.x)//self.tw, 0)
+        sy = max((rect.top-self.y)//self.th, 0)
+        ex = min(((rect.right-1-self.x)//self.tw)+1, self.t_width)
+        ey = min(((rect.bottom-1-self.y)//self.th)+1, self.t_height)
+        return sx, sy, ex, ey
+
     def check_collision(self, rect, mask, obj=None):
         colliding = Level.check_collision(self, rect, mask)
         if colliding:
             return colliding
-        
-        sx = max(int((rect.left-self.x)/self.tw), 0) #must be ints because they are used as indices
-        sy = max(int((rect.top-self.y)/self.th), 0) #must be ints because they are used as indices
-        ex = min(( (rect.right-self.x)//self.tw)+2, self.t_width)
-        ey = min(( (rect.bottom-self.y)//self.th)+2, self.t_height)
 
-        if not obj:
-            
-            x = sx
-            while x < ex:
-                y = sy
-                while y < ey:
-                    tile = self.tiles[x][y]
-                    if tile and tile.solid and tile.rect.colliderect(rect):
-                        return tile
-                    
-                    y += 1
-                x += 1
+        if rect.w <= 0 or rect.h <= 0:
+            return None
+
+        sx, sy, ex, ey = self.get_tile_range(rect)
+        if sx >= ex or sy >= ey:
+            return None
+
+        solid_area = self.solidity[sx:ex, sy:ey]
+        if solid_area.any():
+            #return the first solid tile (the area is small so flattening it is cheap)
+            x, y = divmod(int(solid_area.argmax()), ey-sy)
+            return self.tiles[sx+x][sy+y]
+
+    #the tiles inside every rect are checked together, one tile offset at a time
+    #so the amount of array operations depends on how many tiles the rects cover, not how many rects there are
+    def check_collision_many(self, rects, masks=None):
+        rects = get_rect_array(rects)
+        hits = np.zeros(len(rects), dtype=bool)
+        indices = np.full(len(rects), -1, dtype=np.int64)
+        if not len(rects) or not self.t_height:
+            return hits, indices
+
+        #tile ranges (end exclusive) matching get_tile_range
+        sx = np.maximum((rects[:, 0]-self.x)//self.tw, 0)
+        sy = np.maximum((rects[:, 1]-self.y)//self.th, 0)
+        ex = np.minimum(((rects[:, 0]+rects[:, 2]-1-self.x)//self.tw)+1, self.t_width)
+        ey = np.minimum(((rects[:, 1]+rects[:, 3]-1-self.y)//self.th)+1, self.t_height)
+        valid = (rects[:, 2] > 0) & (rects[:, 3] > 0) & (sx < ex) & (sy < ey)
+        if not valid.any():
+            return hits, indices
+
+        max_span_x = int((ex-sx)[valid].max())
+        max_span_y = int((ey-sy)[valid].max())
+        if max_span_x*max_span_y > 64:
+            #rects are too big to check one offset at a time, so check them one by one
+            for i in np.flatnonzero(valid):
+                tile = self.check_collision(p.Rect(rects[i].tolist()), None)
+                if tile:
+                    hits[i] = True
+                    indices[i] = tile.tx*self.t_height+tile.ty
+            return hits, indices
 
-        else:
+        #x then y order so the same tile is found as check_collision
+        for ox in range(max_span_x):
+            for oy in range(max_span_y):
+                check = valid & ~hits & (sx+ox < ex) & (sy+oy < ey)
+                tx = np.where(check, sx+ox, 0)
+                ty = np.where(check, sy+oy, 0)
+                solid = check & self.solidity[tx, ty]
+                hits |= solid
+                indices[solid] = tx[solid]*self.t_height+ty[solid]
 
-            y = sy
-            while y < ey:
+        return hits, indices
 
-                x = sx
-                while x < ex:
-                    tile = self.tiles[x][y]#tile.rect.right > rect.left and tile.rect.left < rect.right and
-                    if (obj.collide_rect.bottom-obj.bump_amount <= (y*self.th)+self.y) or tile.solid:
-                        if tile and tile.solid and tile.rect.colliderect(rect):
-                            return tile
-                        
-                    x += 1
-                y += 1
+    def get_collision_data(self):
+        return Level.get_collision_data(self)+np.array((self.tw, self.th, self.t_width, self.t_height), dtype=np.int64).tobytes()+np.packbits(self.solidity).tobytes()
+
+    def get_collision_rects(self, rect):
+        collision_rects = []
+        if rect.w <= 0 or rect.h <= 0:
+            return collision_rects
+
+        sx, sy, ex, ey = self.get_tile_range(rect)
+        if sx >= ex or sy >= ey:
+            return collision_rects
+
+        for x, y in np.argwhere(self.solidity[sx:ex, sy:ey]):
+            tile = self.tiles[sx+x][sy+y]
+            collision_rects.append((tile.rect, tile))
+
+        return collision_rects
 
     #check collision between a line and the level
+    #every tile the line passes through is checked in order, so the closest solid tile is returned
     def check_line_collision(self, p1, p2):
         colliding = Level.check_line_collision(self, p1, p2)
         if colliding:
             return colliding
-        
-        angle = util.get_angle(p1[0], p1[1], p2[0], p2[1])
-        distance = util.get_distance(p1[0], p1[1], p2[0], p2[1])
 
-        #min is not used for this because it like... breaks cython?
-        if self.tw >= self.th:
-            step_dist = self.tw
-        else:
-            step_dist = self.th
-        
-        dx = m.cos(angle)*step_dist
-        dy = m.sin(angle)*step_dist
-
-        x, y = p1
-        for step in range(int(distance//step_dist)):
-            tile = self.get_tile(x, y, bounded=True)
-            if tile and tile.solid and tile.rect.clipline(p1, p2):
-                return tile
-            x += dx
-            y += dy
+        #the bool grid is read as uint8 without copying it
+        cell = pathfinding.check_grid_line(self.solidity.view(np.uint8), p1, p2, self.tw, self.th, self.x, self.y)
+        if cell is not None:
+            return self.tiles[cell[0]][cell[1]]
                 
     def draw(self, quick=True):
+        if quick and g.ENABLE_TILE_CHUNKS:
+            Level.draw(self)
+            self.draw_chunks()
+            return
+
         if quick:
             self.tile_surface_cache = {}
             
@@ -824,6 +1136,149 @@ class Tile_Level(Level):
         #draw all structures that are part of the drawn tiles
         for structure in structures_to_draw:
             structure.draw()
+
+    #get the baked chunk at chunk indices cx, cy, baking it if it isn't baked yet
+    def get_tile_chunk(self, cx, cy, d_tw, d_th):
+        key = (cx, cy)
+        chunk = self.tile_chunks.get(key)
+        if chunk is None:
+            chunk = Tile_Chunk(self, cx, cy)
+            chunk.bake(d_tw, d_th)
+            chunk.last_drawn_frame = self.tile_chunk_frame
+            self.tile_chunks[key] = chunk
+            self.tile_chunk_bytes += chunk.bytes
+
+            #evict the least recently drawn chunks, but never ones drawn this frame, so a frame showing more chunks than fit doesn't rebake them all every frame
+            while len(self.tile_chunks) > g.TILE_CHUNK_CACHE_SIZE or self.tile_chunk_bytes > g.TILE_CHUNK_CACHE_MAX_BYTES:
+                oldest_key, oldest_chunk = next(iter(self.tile_chunks.items()))
+                if oldest_chunk.last_drawn_frame == self.tile_chunk_frame:
+                    break
+                self.remove_tile_chunk(oldest_key)
+        else:
+            self.tile_chunks.move_to_end(key)
+            chunk.last_drawn_frame = self.tile_chunk_frame
+        return chunk
+
+    def remove_tile_chunk(self, key):
+        chunk = self.tile_chunks.pop(key, None)
+        if chunk is not None:
+            self.tile_chunk_bytes -= chunk.bytes
+
+    def clear_tile_chunks(self):
+        self.tile_chunks.clear()
+        self.tile_chunk_bytes = 0
+
+    #quick draw using Tile_Chunks, so each chunk of still tiles on the screen is a single blit
+    #animated tiles and structures are drawn on top of the chunks every frame
+    def draw_chunks(self):
+        if not self.t_width or not self.t_height:
+            return
+
+        d_tw = self.tw*g.camera.scale_x
+        d_th = self.th*g.camera.scale_y
+
+        #the chunks have to be baked again when the zoom changes
+        if (d_tw, d_th) != self.tile_chunk_scale:
+            self.clear_tile_chunks()
+            self.tile_surface_cache = {}
+            self.tile_chunk_scale = (d_tw, d_th)
+
+        sx = max(int((g.camera.screen_x-self.x)/self.tw), 0) #must be ints because they are used as indices
+        sy = max(int((g.camera.screen_y-self.y)/self.th), 0) #must be ints because they are used as indices
+        ex = min(((g.camera.rect.right-self.x)//self.tw)+2, self.t_width)
+        ey = min(((g.camera.rect.bottom-self.y)//self.th)+2, self.t_height)
+        if sx >= ex or sy >= ey:
+            return
+
+        ox = g.camera.transform_x(self.x)
+        oy = g.camera.transform_y(self.y)
+        size = g.TILE_CHUNK_SIZE
+        self.tile_chunk_frame += 1
+        animated_tiles = []
+        structures_to_draw = []
+        for cx in range(sx//size, ((ex-1)//size)+1):
+            for cy in range(sy//size, ((ey-1)//size)+1):
+                chunk = self.get_tile_chunk(cx, cy, d_tw, d_th)
+                g.screen.blit(chunk.surface, (ox+(chunk.sx*d_tw), oy+(chunk.sy*d_th)))
+
+                for tile in chunk.animated_tiles:
+                    if sx <= tile.tx < ex and sy <= tile.ty < ey:
+                        animated_tiles.append(tile)
+                for structure in chunk.structures:
+                    if sx <= structure.tile.tx < ex and sy <= structure.tile.ty < ey:
+                        structures_to_draw.append(structure)
+
+        #animated tiles are scaled and drawn separately so their frames can change without rebaking their chunks
+        #they are clipped to their own cell, since the extra pixel that stops gaps appearing would go over the next tile
+        draw_rect = p.Rect(0, 0, d_tw+1, d_th+1)
+        area = p.Rect(0, 0, 0, 0)
+        for tile in animated_tiles:
+            draw_rect.x = ox+(tile.tx*d_tw)
+            draw_rect.y = oy+(tile.ty*d_th)
+            area.w = int(ox+((tile.tx+1)*d_tw))-draw_rect.x
+            area.h = int(oy+((tile.ty+1)*d_th))-draw_rect.y
+            g.screen.blit(gfx.scale_graphics(tile.graphics, draw_rect.size), draw_rect, area)
+
+        #draw all structures that are part of the drawn tiles
+        for structure in structures_to_draw:
+            structure.draw()
+
+#a square of a Tile_Level's tiles (g.TILE_CHUNK_SIZE tiles wide) drawn onto one surface at the camera's current scale
+#animated tiles are left out, and are drawn over the chunk every frame instead
+class Tile_Chunk():
+    def __init__(self, level, cx, cy):
+        self.level = level
+        size = g.TILE_CHUNK_SIZE
+        #the range of tile indices in the chunk (end exclusive)
+        self.sx = cx*size
+        self.sy = cy*size
+        self.ex = min(self.sx+size, level.t_width)
+        self.ey = min(self.sy+size, level.t_height)
+
+        self.surface = None
+        self.bytes = 0
+        self.last_drawn_frame = None
+        self.animated_tiles = []
+        self.structures = []
+
+    #draw the still tiles onto the chunk's surface, with each tile taking up d_tw by d_th pixels
+    def bake(self, d_tw, d_th):
+        level = self.level
+        tile_surface_cache = level.tile_surface_cache
+        tile_size = (int(d_tw+1), int(d_th+1))
+
+        tile_surfaces = []
+        #chunks that are completely covered by tiles without any transparency don't need an alpha channel
+        opaque = True
+        for tx in range(self.sx, self.ex):
+            for ty in range(self.sy, self.ey):
+                tile = level.tiles[tx][ty]
+                if not tile:
+                    opaque = False
+                    continue
+                if tile.structure:
+                    self.structures.append(tile.structure)
+                if type(tile.graphics) == gfx.Animation or type(tile.graphics) == gfx.Animation_System:
+                    self.animated_tiles.append(tile)
+                    opaque = False
+                    continue
+
+                surface = tile_surface_cache.get(tile.graphics_name)
+                if surface is None:
+                    surface = gfx.scale_graphics(tile.graphics, tile_size)
+                    tile_surface_cache[tile.graphics_name] = surface
+                if surface.get_colorkey() is not None or surface.get_flags() & p.SRCALPHA:
+                    opaque = False
+                tile_surfaces.append((surface, (int((tx-self.sx)*d_tw), int((ty-self.sy)*d_th))))
+
+        width = int((self.ex-self.sx)*d_tw)+1
+        height = int((self.ey-self.sy)*d_th)+1
+        if opaque:
+            self.surface = p.Surface((width, height)).convert()
+        else:
+            self.surface = p.Surface((width, height), p.SRCALPHA)
+        self.surface.blits(tile_surfaces, doreturn=False)
+        self.bytes = gfx.get_surface_bytes(self.surface)
 """
 class Enemy_Spawn_Pattern():
     def __init__(self, spawn_list, spawn_y, camera_bound_multiplier=1):
@@ -977,9 +1432,15 @@ class Tile():
         transformed_rect = g.camera.transform_rect(self.rect)
         p.draw.rect(g.screen, colour, transformed_rect, border)
 
+    #"offical" way to change whether a tile is solid, so that the level can keep track of it
+    def set_solid(self, solid):
+        self.solid = solid
+        self.level.tile_changed(self)
+
     def delete(self):
         self.level.tile_list.remove(self)
         self.level.tiles[self.tx][self.ty] = None
+        self.level.tile_changed(self)
 
 
 #Structures are basically objects that are somewhere in the middle between tiles and entities
@@ -1009,6 +1470,8 @@ class Structure():
                 
         self.__dict__.update(**kwargs)
 
+        self.level.area_changed(self.rect)
+
     def update(self):
         pass
 
@@ -1023,6 +1486,8 @@ class Structure():
         for tag in self.tags:
             self.level.structure_tag_dict[tag].remove(self)
 
+        self.level.area_changed(self.rect)
+
 def generate_maze_level(width, height, wall_char, floor_char, tunnel_amount, tunnel_width, tunnel_length, tunnel_turn_chance):
     level_lines = []
     #structure_lines = []
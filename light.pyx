@@ -32,9 +32,9 @@ class Light(entities.Entity):
             if g.ENABLE_COLOURED_LIGHTING:
                 colour_blit_flags = p.BLEND_RGBA_ADD
             
-            gfx.draw_rotated_surface(transformed_alpha_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, draw_surface_override=g.darkness_surface, special_flags=alpha_blit_flags)
+            gfx.draw_rotated_surface(transformed_alpha_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, draw_surface_override=g.darkness_surface, special_flags=alpha_blit_flags, cache=self.cache_rotations)
             if g.ENABLE_COLOURED_LIGHTING:
-                gfx.draw_rotated_surface(transformed_colour_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, draw_surface_override=g.light_colour_surface, special_flags=colour_blit_flags)
+                gfx.draw_rotated_surface(transformed_colour_surface, transformed_rect.topleft, self.angle, cx=0.5, cy=0.5, ox=0.5, oy=0.5, draw_surface_override=g.light_colour_surface, special_flags=colour_blit_flags, cache=self.cache_rotations)
 
 
 class Light_Grid():
@@ -299,56 +299,45 @@ class Light_Grid_Source(entities.Entity):
             self.light_hit_rects = [] #tests
             self.ray_step_points = []
             
-            rect = p.Rect(0,0,2,2)
             #attempt to fire rays from center to target positions
-
+            #every step of every ray is checked against the level in one batch, then each ray is cut off at its first collision
             ray_amount = 180
-            ray_hit_threshold = (self.light_grid.gw+self.light_grid.gh)/2 *1 #not a typo
-            
-            angle = 0
-            for i in range(ray_amount):
-                
-                
-                distance = self.radius
-
-                step_dist = (self.light_grid.gw+self.light_grid.gh)/2 /2
-                
-                dx = m.cos(angle)*step_dist
-                dy = m.sin(angle)*step_dist
-
-                x,y = self.rect.center
-
-                #check for collision
-                for step in range(int(distance//step_dist)):
-                    rect.centerx = x#((x//self.light_grid.gw)+0.5)*self.light_grid.gw
-                    rect.centery = y#((y//self.light_grid.gh)+0.5)*self.light_grid.gh
-                    colliding = g.current_level.check_collision(rect, self.light_grid.grid_rect_mask)
-
-                    
-
-                    #set lightmap rect value, if ray is close enough to the lightmap rect center
-                    if True:
-                        self.ray_step_points.append((x,y))
-                    
-                        cell_distance = max(util.get_distance((x//self.light_grid.gw)+0.5, (y//self.light_grid.gh)+0.5, cx, cy ),0.1)
-                        brightness = self.brightness/(cell_distance**2)
-                        
-                        #brightness_frac = brightness* (1-(util.get_distance(x, y, g.current_level.get_tile(x,y).rect.centerx, g.current_level.get_tile(x,y).rect.centery)/ray_hit_threshold))
-                        
-                        self.lightmap[int(x//self.light_grid.gw)-self.sx, int(y//self.light_grid.gh)-self.sy] = util.clamp(int(brightness*255),0,255)
-
-                        #break on collision
-                        if colliding:
-                        
-                            self.light_hit_rects.append(rect.copy())
-                            break
-                    x += dx
-                    y += dy
-
-                if not colliding:
-                    self.light_hit_rects.append(rect.copy())
-
-                angle += 2*m.pi/ray_amount
+            step_dist = (self.light_grid.gw+self.light_grid.gh)/2 /2
+            step_amount = int(self.radius//step_dist)
+            if step_amount <= 0:
+                return
+
+            angles = np.arange(ray_amount)*(2*m.pi/ray_amount)
+            step_distances = np.arange(step_amount)*step_dist
+            xs = self.rect.centerx+np.cos(angles)[:, None]*step_distances[None, :]
+            ys = self.rect.centery+np.sin(angles)[:, None]*step_distances[None, :]
+
+            #2x2 rects centered on each ray step
+            rects = np.empty((ray_amount, step_amount, 4), dtype=np.int64)
+            rects[:, :, 0] = np.floor(xs)-1
+            rects[:, :, 1] = np.floor(ys)-1
+            rects[:, :, 2] = 2
+            rects[:, :, 3] = 2
+
+            colliding, indices = g.current_level.check_collision_many(rects.reshape(-1, 4), self.light_grid.grid_rect_mask)
+            colliding = colliding.reshape(ray_amount, step_amount)
+
+            #the last step that each ray reaches (including the step it collides on)
+            last_steps = np.where(colliding.any(axis=1), colliding.argmax(axis=1), step_amount-1)
+            lit = np.arange(step_amount)[None, :] <= last_steps[:, None]
+
+            #set lightmap rect values for every step that a ray reached
+            gx = (xs//self.light_grid.gw).astype(np.int64)
+            gy = (ys//self.light_grid.gh).astype(np.int64)
+            cell_distances = np.maximum(np.hypot(gx+0.5-cx, gy+0.5-cy), 0.1)
+            brightness = np.clip(self.brightness/(cell_distances**2)*255, 0, 255).astype('uint32')
+
+            lit &= (gx >= self.sx) & (gx < self.sx+self.lightmap.shape[0]) & (gy >= self.sy) & (gy < self.sy+self.lightmap.shape[1])
+            self.lightmap[gx[lit]-self.sx, gy[lit]-self.sy] = brightness[lit]
+
+            self.ray_step_points = list(zip(xs[lit].tolist(), ys[lit].tolist()))
+            for ray in range(ray_amount):
+                self.light_hit_rects.append(p.Rect(rects[ray, last_steps[ray]].tolist()))
 
         else:
             for x in self.width_range:
@@ -0,0 +1,97 @@
+# cython: profile=True
+# cython: language_level=3
+# cython: infer_types=True
+
+from . import global_values as g
+
+import numpy as np
+
+#simulation level of detail, entities far from everything the player can see are updated less often
+#each tick every entity is put in the first band whose distance is at least its distance to the nearest point of interest
+#(the camera's view and anything in interest_points), and an entity in a band with an interval of n is only fully updated every nth tick
+#the ticks each entity is updated on are offset by its id, so the work for a band is spread over its interval
+#on the other ticks the entity is either frozen ("skip") or just moved by its velocity ("kinematic", see Entity.update_kinematic)
+class LOD_Scheduler():
+    def __init__(self, bands=None):
+        if bands is None:
+            bands = g.LOD_BANDS
+        self.set_bands(bands)
+
+        #game objects or (x, y) positions that keep the entities around them updating at full rate as well as the camera
+        self.interest_points = []
+
+        #how many entities were fully updated, moved kinematically and skipped last tick
+        self.updated_count = 0
+        self.kinematic_count = 0
+        self.skipped_count = 0
+
+    #bands are (max distance, interval, mode) nearest first, the last band's max distance can be None to cover everything further away
+    def set_bands(self, bands):
+        self.bands = tuple(bands)
+        self.band_distances = np.array([max_distance if max_distance is not None else np.inf for max_distance, interval, mode in self.bands], dtype=np.float64)
+
+    def get_interest_rects(self):
+        rects = []
+        if g.camera is not None:
+            rects.append(tuple(g.camera.rect))
+        for point in self.interest_points:
+            if isinstance(point, tuple):
+                rects.append((point[0], point[1], 0, 0))
+            else:
+                rects.append(tuple(point.rect))
+        return np.array(rects, dtype=np.float64).reshape(-1, 4)
+
+    #set lod_interval and lod_mode for each entity from its distance to the nearest point of interest
+    def assign_bands(self, entities):
+        entities = list(entities)
+        if not entities:
+            return
+
+        interest_rects = self.get_interest_rects()
+        if not len(interest_rects):
+            for entity in entities:
+                entity.lod_interval = 1
+                entity.lod_mode = None
+            return
+
+        centers = np.fromiter((value for entity in entities for value in entity.rect.center), dtype=np.float64, count=len(entities)*2).reshape(-1, 2)
+
+        #distance from each center to each interest rect (0 inside it)
+        left, top = interest_rects[:, 0], interest_rects[:, 1]
+        right, bottom = left+interest_rects[:, 2], top+interest_rects[:, 3]
+        dx = np.maximum(np.maximum(left[None, :]-centers[:, 0:1], centers[:, 0:1]-right[None, :]), 0)
+        dy = np.maximum(np.maximum(top[None, :]-centers[:, 1:2], centers[:, 1:2]-bottom[None, :]), 0)
+        distances = np.hypot(dx, dy).min(axis=1)
+
+        #entities further than the last band use the last band
+        band_indices = np.minimum(np.searchsorted(self.band_distances, distances), len(self.bands)-1).tolist()
+        bands = self.bands
+        for entity, band_index in zip(entities, band_indices):
+            if entity.enable_lod:
+                max_distance, entity.lod_interval, entity.lod_mode = bands[band_index]
+            else:
+                entity.lod_interval = 1
+                entity.lod_mode = None
+
+    #check whether an entity should be fully updated this tick, moving it kinematically instead if its band says to
+    def check_update(self, entity):
+        interval = entity.lod_interval
+        if interval <= 1 or (g.tick_count+entity.id)%interval == 0:
+            self.updated_count += 1
+            return True
+
+        if entity.lod_mode == "kinematic":
+            entity.update_kinematic()
+            self.kinematic_count += 1
+        else:
+            self.skipped_count += 1
+        return False
+
+    def update(self, entities):
+        self.updated_count = 0
+        self.kinematic_count = 0
+        self.skipped_count = 0
+        self.assign_bands(entities)
+
+if g.lod_scheduler is None:
+    g.lod_scheduler = LOD_Scheduler()
@@ -0,0 +1,668 @@
+# cython: profile=False
+# cython: language_level=3
+# cython: infer_types=True
+# cython: boundscheck=False
+# cython: wraparound=False
+
+from . import global_values as g
+
+import numpy as np
+import math as m
+
+#the 8 grid directions, used for jump point search
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, 1), (-1, -1), (1, -1))
+
+#compact version of a node map's nodes and connections that the search functions work on
+#node ids index into the arrays, the connections of node i go to indices[indptr[i]:indptr[i+1]] with the costs in weights
+#the arrays are never changed once the graph has been made (changes create a new graph), so searches can safely keep using an old graph
+class Nav_Graph():
+    def __init__(self, positions, indptr, indices, weights, alive=None, grid_spacing=None, grid_origin=(0, 0)):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.intc)
+        self.indices = np.ascontiguousarray(indices, dtype=np.intc)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.node_count = len(self.positions)
+
+        #deleted nodes keep their id, but can't be travelled through
+        if alive is None:
+            alive = np.ones(self.node_count, dtype=np.uint8)
+        self.alive = np.ascontiguousarray(alive, dtype=np.uint8)
+
+        #made the first time they are needed, see get_reversed and get_components
+        self.reversed = None
+        self.components = None
+
+        #grid is a 2d array of the node id in each grid cell (-1 for no node), only set if jump point search can be used on the graph
+        self.grid = None
+        self.cells = None
+        self.grid_spacing = grid_spacing
+        self.grid_origin = grid_origin
+        if grid_spacing:
+            self.set_grid(grid_spacing, grid_origin)
+
+    #jump point search needs every node to be in the middle of a grid cell, with connections to exactly its walkable neighbouring cells
+    #(diagonal connections only when both cells next to the diagonal are walkable, so no corners are cut) costing the distance between them
+    def set_grid(self, spacing, origin):
+        alive_ids = np.flatnonzero(self.alive)
+        if not alive_ids.size:
+            return
+
+        origin = np.asarray(origin, dtype=np.float64)
+        cells = np.floor((self.positions-origin)/spacing).astype(np.intc)
+        alive_cells = cells[alive_ids]
+        if np.any(alive_cells < 0):
+            return
+        if np.any(origin+(alive_cells*spacing)+(spacing//2) != self.positions[alive_ids]):
+            return
+
+        width, height = (alive_cells.max(axis=0)+1).tolist()
+        grid = np.full((width, height), -1, dtype=np.intc)
+        grid[alive_cells[:, 0], alive_cells[:, 1]] = alive_ids
+        #more than one node in a cell
+        if np.count_nonzero(grid >= 0) != alive_ids.size:
+            return
+
+        #the connections each node should have
+        walkable = np.zeros((width+2, height+2), dtype=bool)
+        walkable[1:-1, 1:-1] = grid >= 0
+        cx, cy = alive_cells[:, 0]+1, alive_cells[:, 1]+1
+        expected = np.zeros((self.node_count, len(DIRECTIONS)), dtype=bool)
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            can_connect = walkable[cx+dx, cy+dy]
+            if dx and dy:
+                can_connect &= walkable[cx+dx, cy] & walkable[cx, cy+dy]
+            expected[alive_ids, d] = can_connect
+
+        #the connections each node actually has
+        starts = np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+        ends = self.indices
+        live_connections = (self.alive[starts] != 0) & (self.alive[ends] != 0)
+        starts, ends, weights = starts[live_connections], ends[live_connections], self.weights[live_connections]
+        offsets = cells[ends]-cells[starts]
+        if np.any(np.abs(offsets) > 1) or np.any(np.all(offsets == 0, axis=1)):
+            return
+        if not np.allclose(weights, np.hypot(offsets[:, 0], offsets[:, 1])*spacing):
+            return
+
+        direction_lookup = np.full((3, 3), -1, dtype=np.intc)
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            direction_lookup[dx+1, dy+1] = d
+        actual = np.zeros_like(expected)
+        actual[starts, direction_lookup[offsets[:, 0]+1, offsets[:, 1]+1]] = True
+        if len(starts) != np.count_nonzero(actual) or np.any(actual != expected):
+            return
+
+        self.grid = grid
+        self.cells = cells
+
+    #get the node in the grid cell containing a point, or -1 if there isn't one (or the graph isn't a grid)
+    def get_cell_node(self, x, y):
+        if self.grid is None:
+            return -1
+        cx = int((x-self.grid_origin[0])//self.grid_spacing)
+        cy = int((y-self.grid_origin[1])//self.grid_spacing)
+        if 0 <= cx < self.grid.shape[0] and 0 <= cy < self.grid.shape[1]:
+            return int(self.grid[cx, cy])
+        return -1
+
+    #get the graph with every connection going the other way, as (indptr, indices, weights)
+    def get_reversed(self):
+        if self.reversed is None:
+            starts = np.repeat(np.arange(self.node_count, dtype=np.intc), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind="stable")
+            indptr = np.zeros(self.node_count+1, dtype=np.intc)
+            np.cumsum(np.bincount(self.indices, minlength=self.node_count), out=indptr[1:])
+            self.reversed = (indptr, np.ascontiguousarray(starts[order]), np.ascontiguousarray(self.weights[order]))
+        return self.reversed
+
+    #get the connected group of nodes each node is in (-1 for dead nodes), which assumes connections go both ways (like generated ones do)
+    def get_components(self):
+        cdef int[:] indptr
+        cdef int[:] indices
+        cdef unsigned char[:] alive
+        cdef int[:] labels
+        cdef int[:] stack
+        if self.components is None:
+            self.components = np.full(self.node_count, -1, dtype=np.intc)
+            indptr = self.indptr
+            indices = self.indices
+            alive = self.alive
+            labels = self.components
+            stack = np.empty(max(self.node_count, 1), dtype=np.intc)
+            with nogil:
+                label_components(indptr, indices, alive, labels, stack)
+        return self.components
+
+cdef int heap_push(double[:] keys, int[:] values, int size, double key, int value) noexcept nogil:
+    cdef int i, parent
+    i = size
+    while i > 0:
+        parent = (i-1) >> 1
+        if keys[parent] <= key:
+            break
+        keys[i] = keys[parent]
+        values[i] = values[parent]
+        i = parent
+    keys[i] = key
+    values[i] = value
+    return size+1
+
+#remove the smallest item (which is at index 0) from the heap
+cdef int heap_pop(double[:] keys, int[:] values, int size) noexcept nogil:
+    cdef int i, child
+    cdef double key
+    cdef int value
+    size -= 1
+    key = keys[size]
+    value = values[size]
+    i = 0
+    while True:
+        child = (i*2)+1
+        if child >= size:
+            break
+        if child+1 < size and keys[child+1] < keys[child]:
+            child += 1
+        if key <= keys[child]:
+            break
+        keys[i] = keys[child]
+        values[i] = values[child]
+        i = child
+    if size > 0:
+        keys[i] = key
+        values[i] = value
+    return size
+
+#A* over the graph arrays, states is 0 for unseen nodes, 1 for open nodes and 2 for closed nodes
+#returns the goal if it was reached, otherwise the closest node to the goal that was found
+cdef int search(double[:, :] positions, int[:] indptr, int[:] indices, double[:] weights, unsigned char[:] alive, int start, int goal, int max_nodes, double heuristic_weight, double[:] costs, int[:] parents, unsigned char[:] states, double[:] heap_keys, int[:] heap_values) noexcept nogil:
+    cdef int heap_size, node, neighbour, expanded, best_node, i
+    cdef double goal_x, goal_y, dx, dy, h, best_h, new_cost
+
+    goal_x = positions[goal, 0]
+    goal_y = positions[goal, 1]
+
+    dx = positions[start, 0]-goal_x
+    dy = positions[start, 1]-goal_y
+    best_h = ((dx*dx)+(dy*dy))**0.5
+    best_node = start
+
+    costs[start] = 0
+    parents[start] = -1
+    states[start] = 1
+    heap_size = heap_push(heap_keys, heap_values, 0, best_h*heuristic_weight, start)
+    expanded = 0
+
+    while heap_size > 0:
+        node = heap_values[0]
+        heap_size = heap_pop(heap_keys, heap_values, heap_size)
+        #nodes are pushed again instead of having their keys decreased, so old copies are skipped
+        if states[node] == 2:
+            continue
+        states[node] = 2
+
+        if node == goal:
+            return goal
+
+        dx = positions[node, 0]-goal_x
+        dy = positions[node, 1]-goal_y
+        h = ((dx*dx)+(dy*dy))**0.5
+        if h < best_h:
+            best_h = h
+            best_node = node
+
+        expanded += 1
+        if max_nodes >= 0 and expanded >= max_nodes:
+            break
+
+        for i in range(indptr[node], indptr[node+1]):
+            neighbour = indices[i]
+            if states[neighbour] == 2 or not alive[neighbour]:
+                continue
+
+            new_cost = costs[node]+weights[i]
+            if states[neighbour] == 0 or new_cost < costs[neighbour]:
+                costs[neighbour] = new_cost
+                parents[neighbour] = node
+                states[neighbour] = 1
+
+                dx = positions[neighbour, 0]-goal_x
+                dy = positions[neighbour, 1]-goal_y
+                h = ((dx*dx)+(dy*dy))**0.5
+                heap_size = heap_push(heap_keys, heap_values, heap_size, new_cost+(h*heuristic_weight), neighbour)
+
+    return best_node
+
+cdef int walkable(int[:, :] grid, int x, int y) noexcept nogil:
+    if x < 0 or y < 0 or x >= grid.shape[0] or y >= grid.shape[1]:
+        return 0
+    return grid[x, y] >= 0
+
+#step from a cell in a direction until a jump point is found, returns its node id or -1 if there isn't one
+cdef int jump(int[:, :] grid, int x, int y, int dx, int dy, int goal_x, int goal_y) noexcept nogil:
+    while True:
+        #corners can't be cut when moving diagonally
+        if dx != 0 and dy != 0:
+            if not (walkable(grid, x+dx, y) and walkable(grid, x, y+dy)):
+                return -1
+        x += dx
+        y += dy
+        if not walkable(grid, x, y):
+            return -1
+        if x == goal_x and y == goal_y:
+            return grid[x, y]
+
+        if dx != 0 and dy != 0:
+            if jump(grid, x, y, dx, 0, goal_x, goal_y) >= 0 or jump(grid, x, y, 0, dy, goal_x, goal_y) >= 0:
+                return grid[x, y]
+        elif dx != 0:
+            if (walkable(grid, x, y-1) and not walkable(grid, x-dx, y-1)) or (walkable(grid, x, y+1) and not walkable(grid, x-dx, y+1)):
+                return grid[x, y]
+        else:
+            if (walkable(grid, x-1, y) and not walkable(grid, x-1, y-dy)) or (walkable(grid, x+1, y) and not walkable(grid, x+1, y-dy)):
+                return grid[x, y]
+
+#add the jump point (if any) in a direction from a node to the open set
+cdef int add_jump_point(double[:, :] positions, int[:, :] grid, int[:, :] cells, int node, int dx, int dy, int goal, double heuristic_weight, double[:] costs, int[:] parents, unsigned char[:] states, double[:] heap_keys, int[:] heap_values, int heap_size) noexcept nogil:
+    cdef int jump_point
+    cdef double ddx, ddy, new_cost, h
+    jump_point = jump(grid, cells[node, 0], cells[node, 1], dx, dy, cells[goal, 0], cells[goal, 1])
+    if jump_point < 0 or states[jump_point] == 2:
+        return heap_size
+
+    ddx = positions[jump_point, 0]-positions[node, 0]
+    ddy = positions[jump_point, 1]-positions[node, 1]
+    h = ((ddx*ddx)+(ddy*ddy))**0.5
+    new_cost = costs[node]+h
+    if states[jump_point] == 0 or new_cost < costs[jump_point]:
+        costs[jump_point] = new_cost
+        parents[jump_point] = node
+        states[jump_point] = 1
+        ddx = positions[jump_point, 0]-positions[goal, 0]
+        ddy = positions[jump_point, 1]-positions[goal, 1]
+        h = ((ddx*ddx)+(ddy*ddy))**0.5
+        heap_size = heap_push(heap_keys, heap_values, heap_size, new_cost+(h*heuristic_weight), jump_point)
+    return heap_size
+
+#jump point search (for 8 connected grids where corners can't be cut), the same as search but only jump points are added to the open set
+#parents ends up as a chain of jump points, which get filled in by fill_jump_path
+cdef int search_jump_points(double[:, :] positions, int[:, :] grid, int[:, :] cells, int start, int goal, int max_nodes, double heuristic_weight, double[:] costs, int[:] parents, unsigned char[:] states, double[:] heap_keys, int[:] heap_values) noexcept nogil:
+    cdef int heap_size, node, parent, expanded, best_node, x, y, dx, dy
+    cdef int walkable_x, walkable_y
+    cdef double goal_x, goal_y, ddx, ddy, h, best_h
+
+    goal_x = positions[goal, 0]
+    goal_y = positions[goal, 1]
+
+    ddx = positions[start, 0]-goal_x
+    ddy = positions[start, 1]-goal_y
+    best_h = ((ddx*ddx)+(ddy*ddy))**0.5
+    best_node = start
+
+    costs[start] = 0
+    parents[start] = -1
+    states[start] = 1
+    heap_size = heap_push(heap_keys, heap_values, 0, best_h*heuristic_weight, start)
+    expanded = 0
+
+    while heap_size > 0:
+        node = heap_values[0]
+        heap_size = heap_pop(heap_keys, heap_values, heap_size)
+        if states[node] == 2:
+            continue
+        states[node] = 2
+
+        if node == goal:
+            return goal
+
+        ddx = positions[node, 0]-goal_x
+        ddy = positions[node, 1]-goal_y
+        h = ((ddx*ddx)+(ddy*ddy))**0.5
+        if h < best_h:
+            best_h = h
+            best_node = node
+
+        expanded += 1
+        if max_nodes >= 0 and expanded >= max_nodes:
+            break
+
+        x = cells[node, 0]
+        y = cells[node, 1]
+        parent = parents[node]
+        if parent < 0:
+            #the start node searches in every direction
+            for dx in range(-1, 2):
+                for dy in range(-1, 2):
+                    if dx != 0 or dy != 0:
+                        heap_size = add_jump_point(positions, grid, cells, node, dx, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            continue
+
+        #otherwise only the directions that can't be reached more cheaply without going through this node are searched
+        dx = x-cells[parent, 0]
+        dy = y-cells[parent, 1]
+        dx = 1 if dx > 0 else (-1 if dx < 0 else 0)
+        dy = 1 if dy > 0 else (-1 if dy < 0 else 0)
+        if dx != 0 and dy != 0:
+            walkable_x = walkable(grid, x+dx, y)
+            walkable_y = walkable(grid, x, y+dy)
+            if walkable_y:
+                heap_size = add_jump_point(positions, grid, cells, node, 0, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            if walkable_x:
+                heap_size = add_jump_point(positions, grid, cells, node, dx, 0, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            if walkable_x and walkable_y:
+                heap_size = add_jump_point(positions, grid, cells, node, dx, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+        elif dx != 0:
+            if walkable(grid, x+dx, y):
+                heap_size = add_jump_point(positions, grid, cells, node, dx, 0, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+                heap_size = add_jump_point(positions, grid, cells, node, dx, 1, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+                heap_size = add_jump_point(positions, grid, cells, node, dx, -1, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            heap_size = add_jump_point(positions, grid, cells, node, 0, 1, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            heap_size = add_jump_point(positions, grid, cells, node, 0, -1, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+        else:
+            if walkable(grid, x, y+dy):
+                heap_size = add_jump_point(positions, grid, cells, node, 0, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+                heap_size = add_jump_point(positions, grid, cells, node, 1, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+                heap_size = add_jump_point(positions, grid, cells, node, -1, dy, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            heap_size = add_jump_point(positions, grid, cells, node, 1, 0, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+            heap_size = add_jump_point(positions, grid, cells, node, -1, 0, goal, heuristic_weight, costs, parents, states, heap_keys, heap_values, heap_size)
+
+    return best_node
+
+#dijkstra outwards from the target nodes over the reversed connections, so costs ends up holding the cost of the cheapest path from each node to a target
+#the heap is kept between calls so that the work can be spread over several ticks, stops after max_nodes nodes have been expanded (-1 for no limit)
+#returns the size of the heap that is left, which is 0 once the field is finished
+cdef int integrate(int[:] indptr, int[:] indices, double[:] weights, unsigned char[:] alive, int max_nodes, double[:] costs, unsigned char[:] states, double[:] heap_keys, int[:] heap_values, int heap_size) noexcept nogil:
+    cdef int node, neighbour, expanded, i
+    cdef double new_cost
+
+    expanded = 0
+    while heap_size > 0:
+        if max_nodes >= 0 and expanded >= max_nodes:
+            break
+
+        node = heap_values[0]
+        heap_size = heap_pop(heap_keys, heap_values, heap_size)
+        if states[node] == 2:
+            continue
+        states[node] = 2
+        expanded += 1
+
+        for i in range(indptr[node], indptr[node+1]):
+            neighbour = indices[i]
+            if states[neighbour] == 2 or not alive[neighbour]:
+                continue
+
+            new_cost = costs[node]+weights[i]
+            if states[neighbour] == 0 or new_cost < costs[neighbour]:
+                costs[neighbour] = new_cost
+                states[neighbour] = 1
+                heap_size = heap_push(heap_keys, heap_values, heap_size, new_cost, neighbour)
+
+    return heap_size
+
+#point each node at the neighbour it should move to next to reach a target most cheaply, -1 for the targets and nodes that can't reach one
+cdef void set_next_nodes(int[:] indptr, int[:] indices, double[:] weights, double[:] costs, unsigned char[:] states, int[:] next_nodes) noexcept nogil:
+    cdef int node, neighbour, best_node, i
+    cdef double new_cost, best_cost
+
+    for node in range(next_nodes.shape[0]):
+        best_node = -1
+        if states[node] == 2:
+            best_cost = costs[node]
+            for i in range(indptr[node], indptr[node+1]):
+                neighbour = indices[i]
+                if states[neighbour] != 2:
+                    continue
+                new_cost = costs[neighbour]+weights[i]
+                if costs[neighbour] < costs[node] and (best_node == -1 or new_cost < best_cost):
+                    best_cost = new_cost
+                    best_node = neighbour
+        next_nodes[node] = best_node
+
+#give every alive node the label of the first node of its connected group, by searching out from each unlabelled node
+cdef void label_components(int[:] indptr, int[:] indices, unsigned char[:] alive, int[:] labels, int[:] stack) noexcept nogil:
+    cdef int node, current, neighbour, stack_size, i
+
+    for node in range(labels.shape[0]):
+        if labels[node] != -1 or not alive[node]:
+            continue
+        labels[node] = node
+        stack[0] = node
+        stack_size = 1
+        while stack_size > 0:
+            stack_size -= 1
+            current = stack[stack_size]
+            for i in range(indptr[current], indptr[current+1]):
+                neighbour = indices[i]
+                if labels[neighbour] == -1 and alive[neighbour]:
+                    labels[neighbour] = node
+                    stack[stack_size] = neighbour
+                    stack_size += 1
+
+#walk through the grid cells a line passes through in order, returning the first solid one as (cx*height)+cy or -1 if there isn't one
+#the line goes from (x1, y1) in cell (cx, cy) to (x2, y2) in cell (ex, ey), measured in cells from the grid origin
+#cells outside the grid are skipped, the same as utilities.traverse_grid but without making a python object for every cell
+cdef long cast_grid_line(unsigned char[:, :] solidity, double x1, double y1, double x2, double y2, long cx, long cy, long ex, long ey) noexcept nogil:
+    cdef double dx, dy, t_max_x, t_max_y, t_delta_x, t_delta_y
+    cdef long step_x, step_y, i, n, width, height
+
+    width = solidity.shape[0]
+    height = solidity.shape[1]
+    dx = x2-x1
+    dy = y2-y1
+
+    #the axis that isn't moving along is never stepped, so its next crossing is set to be further than the end of the line
+    if dx > 0:
+        step_x = 1
+        t_delta_x = 1/dx
+        t_max_x = (cx+1-x1)/dx
+    elif dx < 0:
+        step_x = -1
+        t_delta_x = -1/dx
+        t_max_x = (x1-cx)/-dx
+    else:
+        step_x = 0
+        t_delta_x = 0
+        t_max_x = 1e300
+
+    if dy > 0:
+        step_y = 1
+        t_delta_y = 1/dy
+        t_max_y = (cy+1-y1)/dy
+    elif dy < 0:
+        step_y = -1
+        t_delta_y = -1/dy
+        t_max_y = (y1-cy)/-dy
+    else:
+        step_y = 0
+        t_delta_y = 0
+        t_max_y = 1e300
+
+    n = abs(ex-cx)+abs(ey-cy)
+    i = 0
+    while True:
+        if 0 <= cx < width and 0 <= cy < height and solidity[cx, cy]:
+            return (cx*height)+cy
+        if i >= n:
+            return -1
+        if t_max_x < t_max_y:
+            cx += step_x
+            t_max_x += t_delta_x
+        else:
+            cy += step_y
+            t_max_y += t_delta_y
+        i += 1
+
+#get the node ids from the start to a node by following its parents
+def trace_path(parents, end):
+    path = [end]
+    parent = parents[end]
+    while parent >= 0:
+        path.append(parent)
+        parent = parents[parent]
+    path.reverse()
+    return path
+
+#fill in the cells between consecutive jump points, which are always in a straight or diagonal line
+def fill_jump_path(graph, jump_path):
+    if not jump_path:
+        return jump_path
+
+    cells = graph.cells
+    path = [jump_path[0]]
+    for node in jump_path[1:]:
+        x, y = cells[path[len(path)-1]].tolist()
+        ex, ey = cells[node].tolist()
+        dx = (ex > x)-(ex < x)
+        dy = (ey > y)-(ey < y)
+        while (x, y) != (ex, ey):
+            x += dx
+            y += dy
+            path.append(int(graph.grid[x, y]))
+    return path
+
+#find a path between 2 node ids, returning the list of node ids from the start to the goal
+#max_nodes is how many nodes can be expanded before giving up (-1 for no limit). If the goal can't be reached
+#the path to the node closest to the goal is returned instead, so check path[-1] == goal to see if the path is complete
+#jump point search is used if jump_points is True and the graph is a suitable grid
+#the search itself runs without the GIL, so it can be run on other threads (see ai.request_path) while the game keeps going
+def find_path(graph, int start, int goal, max_nodes=None, double heuristic_weight=1, jump_points=False):
+    cdef int end, budget
+    cdef double[:, :] positions
+    cdef int[:, :] grid
+    cdef int[:, :] cells
+    cdef int[:] indptr
+    cdef int[:] indices
+    cdef double[:] weights
+    cdef unsigned char[:] alive
+    cdef double[:] costs
+    cdef int[:] parents
+    cdef unsigned char[:] states
+    cdef double[:] heap_keys
+    cdef int[:] heap_values
+    if max_nodes is None:
+        max_nodes = g.PATHFINDING_NODE_BUDGET
+    budget = max_nodes
+
+    node_count = graph.node_count
+    positions = graph.positions
+    costs = np.empty(node_count, dtype=np.float64)
+    parents = np.empty(node_count, dtype=np.intc)
+    states = np.zeros(node_count, dtype=np.uint8)
+
+    if jump_points and graph.grid is not None:
+        grid = graph.grid
+        cells = graph.cells
+        #each closed node can add at most one jump point in each direction
+        heap_keys = np.empty((node_count*8)+1, dtype=np.float64)
+        heap_values = np.empty((node_count*8)+1, dtype=np.intc)
+        with nogil:
+            end = search_jump_points(positions, grid, cells, start, goal, budget, heuristic_weight, costs, parents, states, heap_keys, heap_values)
+        return fill_jump_path(graph, trace_path(parents, end))
+
+    indptr = graph.indptr
+    indices = graph.indices
+    weights = graph.weights
+    alive = graph.alive
+    #each connection can be relaxed at most once, so the heap can't hold more than this
+    heap_keys = np.empty(len(graph.indices)+1, dtype=np.float64)
+    heap_values = np.empty(len(graph.indices)+1, dtype=np.intc)
+    with nogil:
+        end = search(positions, indptr, indices, weights, alive, start, goal, budget, heuristic_weight, costs, parents, states, heap_keys, heap_values)
+    return trace_path(parents, end)
+
+#the cost from every node of a graph to the nearest of a set of target nodes, and the neighbour each node should move to next
+#step can be called with a node budget to build it over several ticks, next_nodes is only filled in once it is finished
+class Integration_Field():
+    def __init__(self, graph, targets):
+        self.graph = graph
+        self.targets = list(targets)
+
+        node_count = graph.node_count
+        self.costs = np.zeros(node_count, dtype=np.float64)
+        self.states = np.zeros(node_count, dtype=np.uint8)
+        self.next_nodes = np.full(node_count, -1, dtype=np.intc)
+
+        #each reversed connection can be relaxed at most once, plus the targets
+        indptr, indices, weights = graph.get_reversed()
+        self.heap_keys = np.empty(len(indices)+len(self.targets)+1, dtype=np.float64)
+        self.heap_values = np.empty(len(indices)+len(self.targets)+1, dtype=np.intc)
+        self.heap_size = 0
+        for target in self.targets:
+            if graph.alive[target] and not self.states[target]:
+                self.states[target] = 1
+                self.heap_size = heap_push(self.heap_keys, self.heap_values, self.heap_size, 0, target)
+
+        self.finished = False
+
+    #expand up to max_nodes more nodes (all of them if max_nodes is None or -1), returns True once the field is finished
+    def step(self, max_nodes=None):
+        if self.finished:
+            return True
+        if max_nodes is None:
+            max_nodes = -1
+
+        cdef int[:] indptr
+        cdef int[:] indices
+        cdef double[:] weights
+        cdef unsigned char[:] alive
+        cdef double[:] costs
+        cdef unsigned char[:] states
+        cdef double[:] heap_keys
+        cdef int[:] heap_values
+        cdef int[:] next_nodes
+        cdef int budget, heap_size
+
+        graph = self.graph
+        indptr, indices, weights = graph.get_reversed()
+        alive = graph.alive
+        costs = self.costs
+        states = self.states
+        heap_keys = self.heap_keys
+        heap_values = self.heap_values
+        budget = max_nodes
+        heap_size = self.heap_size
+        with nogil:
+            heap_size = integrate(indptr, indices, weights, alive, budget, costs, states, heap_keys, heap_values, heap_size)
+        self.heap_size = heap_size
+        if heap_size == 0:
+            indptr = graph.indptr
+            indices = graph.indices
+            weights = graph.weights
+            next_nodes = self.next_nodes
+            with nogil:
+                set_next_nodes(indptr, indices, weights, costs, states, next_nodes)
+            self.finished = True
+            self.heap_keys = None
+            self.heap_values = None
+        return self.finished
+
+#get the first solid cell (cx, cy) of a grid that a line passes through, or None if there isn't one
+#solidity is a 2d uint8 array that isn't changed while this runs, the walk through the cells is done without the GIL
+def check_grid_line(solidity, p1, p2, double cell_width, double cell_height, double ox=0, double oy=0):
+    cdef double x1, y1, x2, y2
+    cdef long cx, cy, ex, ey, cell, height
+    cdef unsigned char[:, :] cells
+    cells = solidity
+    height = solidity.shape[1]
+
+    x1 = (p1[0]-ox)/cell_width
+    y1 = (p1[1]-oy)/cell_height
+    x2 = (p2[0]-ox)/cell_width
+    y2 = (p2[1]-oy)/cell_height
+    cx = m.floor(x1)
+    cy = m.floor(y1)
+    ex = m.floor(x2)
+    ey = m.floor(y2)
+
+    with nogil:
+        cell = cast_grid_line(cells, x1, y1, x2, y2, cx, cy, ex, ey)
+    if cell == -1:
+        return None
+    return (cell//height, cell%height)
+
+#get the total cost of a path of node ids
+def get_path_cost(graph, path):
+    if len(path) < 2:
+        return 0
+    points = graph.positions[path]
+    return float(np.hypot(*np.diff(points, axis=0).T).sum())
@@ -0,0 +1,234 @@
+# cython: profile=True
+# cython: language_level=3
+# cython: infer_types=True
+
+from . import global_values as g
+
+import numpy as np
+
+#the kinematic attributes that are stored in the integrator's arrays as well as on each entity
+#nullable attributes can be None, which is stored as nan
+FLOAT_FIELDS = ("vx", "vy", "vx_keep", "vy_keep", "min_v_dropoff", "gravity_strength", "v_direction", "v_mag")
+NULLABLE_FIELDS = ("max_v", "min_v", "max_positive_vx", "max_negative_vx", "max_positive_vy", "max_negative_vy")
+BOOL_FIELDS = ("static",)
+FIELDS = FLOAT_FIELDS+NULLABLE_FIELDS+BOOL_FIELDS
+
+#a descriptor that copies every value written to an integrated attribute into the integrator's arrays
+#it has no __get__, so reading the attribute still gets the value straight from the entity's __dict__ at normal speed
+class Integrated_Field():
+    def __init__(self, field):
+        self.field = field
+
+    def __set__(self, entity, value):
+        entity.__dict__[self.field] = value
+        g.physics_integrator.set_value(entity.physics_index, self.field, value)
+
+#struct of arrays storage for the velocity attributes of entities, so that damping, gravity and clamping
+#can be done for every registered entity in one vectorized pass per tick instead of with per-object python and trig code
+#only movement (and so collision resolution) is still done per entity
+#registered entities have their class swapped for a subclass where the integrated attributes are Integrated_Fields,
+#so the attributes are read as normal and writes to them keep the arrays up to date
+class Physics_Integrator():
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.arrays = {}
+        for field in FLOAT_FIELDS+NULLABLE_FIELDS:
+            self.arrays[field] = np.zeros(0, dtype=np.float64)
+        for field in BOOL_FIELDS:
+            self.arrays[field] = np.zeros(0, dtype=bool)
+
+        #used is True for slots holding an entity, updated is set when an entity has moved this tick
+        #clamped is True while an entity's velocity hasn't been changed since it was last clamped
+        self.used = np.zeros(0, dtype=bool)
+        self.updated = np.zeros(0, dtype=bool)
+        self.clamped = np.zeros(0, dtype=bool)
+
+        #the entities and their __dict__s (which the vectorized passes write their results back into)
+        self.entities = []
+        self.entity_dicts = []
+        self.free_indices = []
+        self.size = 0
+
+        #the subclass made for each entity class, and the entity class for each subclass
+        self.integrated_classes = {}
+        self.base_classes = {}
+
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity-self.capacity
+        if extra <= 0:
+            return
+
+        for field, array in self.arrays.items():
+            self.arrays[field] = np.concatenate((array, np.zeros(extra, dtype=array.dtype)))
+        self.used = np.concatenate((self.used, np.zeros(extra, dtype=bool)))
+        self.updated = np.concatenate((self.updated, np.zeros(extra, dtype=bool)))
+        self.clamped = np.concatenate((self.clamped, np.zeros(extra, dtype=bool)))
+
+        self.entities += [None]*extra
+        self.entity_dicts += [None]*extra
+        #free indices are popped from the end, so lower indices are used first
+        self.free_indices = list(range(capacity-1, self.capacity-1, -1))+self.free_indices
+        self.capacity = capacity
+
+    def get_integrated_class(self, cls):
+        integrated_class = self.integrated_classes.get(cls)
+        if integrated_class is None:
+            #integrated entities are saved as instances of their normal class, their __dict__ already holds every attribute
+            def reduce_integrated_entity(entity, protocol):
+                state = entity.__dict__.copy()
+                state["physics_index"] = None
+                return (cls.__new__, (cls,), state)
+
+            namespace = {field:Integrated_Field(field) for field in FIELDS}
+            namespace["__reduce_ex__"] = reduce_integrated_entity
+            namespace["__module__"] = cls.__module__
+            integrated_class = type(cls.__name__, (cls,), namespace)
+            self.integrated_classes[cls] = integrated_class
+            self.base_classes[integrated_class] = cls
+        return integrated_class
+
+    def add(self, entity):
+        if entity.physics_index is not None:
+            return
+
+        if not self.free_indices:
+            self.grow(self.capacity*2)
+        index = self.free_indices.pop()
+
+        #copy the attributes into the arrays, the entity keeps its own copies in its __dict__
+        for field in FIELDS:
+            value = entity.__dict__[field]
+            if value is None:
+                value = np.nan
+            self.arrays[field][index] = value
+
+        self.used[index] = True
+        self.updated[index] = False
+        self.clamped[index] = False
+        self.entities[index] = entity
+        self.entity_dicts[index] = entity.__dict__
+        self.size += 1
+
+        entity.physics_index = index
+        entity.__class__ = self.get_integrated_class(entity.__class__)
+
+    def remove(self, entity):
+        index = entity.physics_index
+        if index is None:
+            return
+
+        entity.__class__ = self.base_classes[entity.__class__]
+        entity.physics_index = None
+
+        self.used[index] = False
+        self.updated[index] = False
+        self.entities[index] = None
+        self.entity_dicts[index] = None
+        self.free_indices.append(index)
+        self.size -= 1
+
+    #called by Integrated_Field when an integrated attribute is written to
+    def set_value(self, index, field, value):
+        if value is None:
+            value = np.nan
+        self.arrays[field][index] = value
+        #the velocity (or the limits it is clamped to) has changed, so it needs clamping again before the entity moves
+        self.clamped[index] = False
+
+    #called instead of clamp_velocity when an integrated entity moves
+    #post_update has already clamped the velocity unless something has changed it since, in which case it is clamped here like it would be normally
+    #the entity is then marked so post_update damps it and applies gravity
+    def prepare_move(self, entity):
+        index = entity.physics_index
+        if not self.clamped[index]:
+            entity.clamp_velocity()
+            self.clamped[index] = True
+        self.updated[index] = True
+
+    #damp the velocities, apply gravity and then clamp them (ready for the next tick) for all entities that moved this tick
+    #the new velocities are written back into the entities' __dict__s
+    def post_update(self):
+        if not self.size:
+            return
+
+        arrays = self.arrays
+        indices = np.flatnonzero(self.updated)
+        self.updated[indices] = False
+        if not indices.size:
+            return
+
+        vx = arrays["vx"][indices]*arrays["vx_keep"][indices]
+        vy = arrays["vy"][indices]*arrays["vy_keep"][indices]
+
+        gx, gy = self.get_gravity(indices)
+        gravity_strength = arrays["gravity_strength"][indices]
+        vx += gx*gravity_strength
+        vy += gy*gravity_strength
+
+        #the vectorized version of Game_Object.clamp_velocity
+        #if velocity is very low set it to 0
+        min_v_dropoff = arrays["min_v_dropoff"][indices]
+        vx[np.abs(vx) <= min_v_dropoff] = 0
+        vy[np.abs(vy) <= min_v_dropoff] = 0
+
+        moving = (vx != 0) | (vy != 0)
+        direction = np.arctan2(vy, vx)
+        magnitude = np.hypot(vx, vy)
+
+        #cap velocity if it is too high, keeping its direction
+        max_v = arrays["max_v"][indices]
+        has_max_v = ~np.isnan(max_v)
+        too_high = moving & has_max_v & (magnitude > max_v)
+        vx = np.where(too_high, np.cos(direction)*max_v, vx)
+        vy = np.where(too_high, np.sin(direction)*max_v, vy)
+
+        #otherwise cap each component separately (nan limits are ignored by fmin/fmax)
+        no_max_v = moving & ~has_max_v
+        vx = np.where(no_max_v, np.fmax(np.fmin(vx, arrays["max_positive_vx"][indices]), arrays["max_negative_vx"][indices]), vx)
+        vy = np.where(no_max_v, np.fmax(np.fmin(vy, arrays["max_positive_vy"][indices]), arrays["max_negative_vy"][indices]), vy)
+
+        #raise velocity if it is too low, using the magnitude from before it was capped
+        min_v = arrays["min_v"][indices]
+        too_low = moving & (magnitude < min_v)
+        vx = np.where(too_low, np.cos(direction)*min_v, vx)
+        vy = np.where(too_low, np.sin(direction)*min_v, vy)
+
+        arrays["vx"][indices] = vx
+        arrays["vy"][indices] = vy
+        moving_indices = indices[moving]
+        arrays["v_direction"][moving_indices] = direction[moving]
+        arrays["v_mag"][moving_indices] = magnitude[moving]
+        self.clamped[indices] = True
+
+        entity_dicts = self.entity_dicts
+        for index, new_vx, new_vy in zip(indices.tolist(), vx.tolist(), vy.tolist()):
+            entity_dict = entity_dicts[index]
+            entity_dict["vx"] = new_vx
+            entity_dict["vy"] = new_vy
+        for index, new_direction, new_magnitude in zip(moving_indices.tolist(), direction[moving].tolist(), magnitude[moving].tolist()):
+            entity_dict = entity_dicts[index]
+            entity_dict["v_direction"] = new_direction
+            entity_dict["v_mag"] = new_magnitude
+
+    #the vectorized version of levels.get_gravity, each entity gets the gravity of the first active level its collide rect is in
+    def get_gravity(self, indices):
+        entities = self.entities
+        rects = np.fromiter((value for i in indices.tolist() for value in entities[i].collide_rect), dtype=np.int64, count=indices.size*4).reshape(-1, 4)
+        x, y, w, h = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+        gx = np.zeros(indices.size)
+        gy = np.zeros(indices.size)
+        unassigned = (w > 0) & (h > 0)
+
+        for level in g.active_levels:
+            level_rect = level.rect
+            in_level = unassigned & (x < level_rect.right) & (x+w > level_rect.left) & (y < level_rect.bottom) & (y+h > level_rect.top)
+            gx[in_level] = level.gx
+            gy[in_level] = level.gy
+            unassigned &= ~in_level
+
+        return gx, gy
+
+if g.physics_integrator is None:
+    g.physics_integrator = Physics_Integrator()
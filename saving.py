@@ -159,7 +159,7 @@ def pickle_game_state():
     return pickled_data
 
 def unpickle_game_state(save_dict):
-    g.surface_cache = {}
+    g.clear_surface_cache()
     load_dict = {}
     for obj_name, obj in  save_dict.items():
         obj = make_object_pickle_unready(obj)
@@ -187,6 +187,21 @@ def load_game_state(file_path):
         save_dict = pickle.loads(data)
         unpickle_game_state(save_dict)
         g.__dict__.update(save_dict)
+        rebuild_entity_indices()
+
+#the broadphase and physics integrator aren't saved, so after loading they are emptied of the old entities and filled with the loaded ones
+def rebuild_entity_indices():
+    for entity in g.physics_integrator.entities:
+        if entity is not None:
+            g.physics_integrator.remove(entity)
+    g.spatial_hash.clear()
+
+    for entity in g.game_objects.get("class_Entity", []):
+        if entity.temp or entity.deleted:
+            continue
+        g.spatial_hash.update(entity)
+        if g.ENABLE_PHYSICS_INTEGRATOR and entity.integrate_physics:
+            g.physics_integrator.add(entity)
 
 class Saved_Data():
     def __init__(self, name, save_on_quit=True):
@@ -198,7 +198,7 @@ def emit_sound(x, y, sound, amplitude, sound_range, **_kwargs):
 #class for determining how loud sounds should be played based on distance
 class Microphone(entities.Entity):
     def __init__(self, x, y, mic_range, ear_distance, **_kwargs):
-        kwargs = {"properties":g.sound_properties["default"], "ear_angle":0, "static":True, "collision_profile":{"tiles":False, "bodies":False, "npcs":False, "player":False, "border":False, "screen":False}}
+        kwargs = {"properties":g.sound_properties["default"], "ear_angle":0, "static":True, "enable_lod":False, "collision_profile":{"tiles":False, "bodies":False, "npcs":False, "player":False, "border":False, "screen":False}}
         kwargs.update(_kwargs)
         entities.Entity.__init__(self, p.Rect(x,y,1,1), **kwargs)
         
@@ -3,6 +3,7 @@
 # cython: infer_types=True
 
 from . import global_values as g
+from . import broadphase
 
 import pygame as p
 import random as r
@@ -915,6 +916,86 @@ def decrypt_value(value, int_check=False):
     return decrypted_value
 
 
+def traverse_grid(p1, p2, double cell_width, double cell_height, double ox=0, double oy=0):
+    """
+    Get every grid cell that a line passes through, in order from the first point to the second point.
+    Uses an exact grid traversal (Amanatides-Woo), so no cells are skipped no matter how long the line is.
+    
+    Parameters
+    ----------
+    p1 : tuple
+    First point.
+    p2 : tuple
+    Second point.
+    cell_width : number
+    Width of each grid cell.
+    cell_height : number
+    Height of each grid cell.
+    ox : number
+    x component of the grid origin - default is 0.
+    oy : number
+    y component of the grid origin - default is 0.
+    
+    Yields
+    ------
+    cx, cy
+    x and y indices of each cell the line passes through.
+    """
+    cdef double x1, y1, x2, y2, dx, dy, t_max_x, t_max_y, t_delta_x, t_delta_y
+    cdef long cx, cy, ex, ey, step_x, step_y, i, n
+
+    x1 = (p1[0]-ox)/cell_width
+    y1 = (p1[1]-oy)/cell_height
+    x2 = (p2[0]-ox)/cell_width
+    y2 = (p2[1]-oy)/cell_height
+
+    cx = <long>m.floor(x1)
+    cy = <long>m.floor(y1)
+    ex = <long>m.floor(x2)
+    ey = <long>m.floor(y2)
+
+    dx = x2-x1
+    dy = y2-y1
+
+    if dx > 0:
+        step_x = 1
+        t_delta_x = 1/dx
+        t_max_x = (cx+1-x1)/dx
+    elif dx < 0:
+        step_x = -1
+        t_delta_x = -1/dx
+        t_max_x = (x1-cx)/-dx
+    else:
+        step_x = 0
+        t_delta_x = m.inf
+        t_max_x = m.inf
+
+    if dy > 0:
+        step_y = 1
+        t_delta_y = 1/dy
+        t_max_y = (cy+1-y1)/dy
+    elif dy < 0:
+        step_y = -1
+        t_delta_y = -1/dy
+        t_max_y = (y1-cy)/-dy
+    else:
+        step_y = 0
+        t_delta_y = m.inf
+        t_max_y = m.inf
+
+    n = abs(ex-cx)+abs(ey-cy)
+
+    yield cx, cy
+    for i in range(n):
+        if t_max_x < t_max_y:
+            cx += step_x
+            t_max_x += t_delta_x
+        else:
+            cy += step_y
+            t_max_y += t_delta_y
+        yield cx, cy
+
+
 def check_collision(rect, collision_mask, collision_dict, exceptions, obj=None):
     """
     Check whether collision is occuring within a specific rectangle.
@@ -963,25 +1044,33 @@ def check_collision(rect, collision_mask, collision_dict, exceptions, obj=None):
             return colliding
 
     # ---ENTITIES---
-    if g.segmenting_in_levels:
-        check_entities_amount = 0
-        for ent_type, can_collide in collision_dict.items():
-            if can_collide and ent_type.startswith("class_"):
+    # get entities using the broadphase spatial hash
+    if g.ENABLE_BROADPHASE and g.spatial_hash is not None:
+        aliases = broadphase.get_collision_aliases(collision_dict)
+        if aliases:
+            check_entities = g.spatial_hash.query(rect, aliases)
+        else:
+            check_entities = ()
+
+    else:
+        if g.segmenting_in_levels:
+            check_entities_amount = 0
+            for ent_type in broadphase.get_collision_aliases(collision_dict):
                 check_entities_amount += len(g.game_objects.get(ent_type, []))
 
-        # get entities using segment method
-        check_entities = []
+            # get entities using segment method
+            check_entities = []
 
-    if g.segmenting_in_levels and check_entities_amount > g.ENABLE_SEGMENT_ENTITY_THRESHOLD:
-        for level in g.active_levels:
-            if level.enable_segmenting:
-                for segment in level.get_segments(rect):
-                    check_entities += get_entities(segment.entities)
+        if g.segmenting_in_levels and check_entities_amount > g.ENABLE_SEGMENT_ENTITY_THRESHOLD:
+            for level in g.active_levels:
+                if level.enable_segmenting:
+                    for segment in level.get_segments(rect):
+                        check_entities += get_entities(segment.entities)
 
-        if not check_entities:
+            if not check_entities:
+                check_entities = get_entities(g.game_objects.get("class_Entity", []))
+        else:
             check_entities = get_entities(g.game_objects.get("class_Entity", []))
-    else:
-        check_entities = get_entities(g.game_objects.get("class_Entity", []))
 
     for entity in check_entities:
         if entity not in exceptions and entity.solid:
@@ -1056,30 +1145,38 @@ def check_line_collision(p1, p2, collision_dict, exceptions, obj=None):
             return colliding
 
     # ---ENTITIES---
-    if g.segmenting_in_levels:
-        check_entities_amount = 0
-        for ent_type, can_collide in collision_dict.items():
-            if can_collide and ent_type.startswith("class_"):
-                check_entities_amount += len(g.game_objects.get(ent_type, []))
-
-        # get entities using segment method
-        check_entities = []
+    # get entities in the cells that the line passes through using the broadphase spatial hash
+    if g.ENABLE_BROADPHASE and g.spatial_hash is not None:
+        aliases = broadphase.get_collision_aliases(collision_dict)
+        if aliases:
+            check_entities = g.spatial_hash.query_line(p1, p2, aliases)
+        else:
+            check_entities = ()
 
-    if g.segmenting_in_levels and check_entities_amount > g.ENABLE_SEGMENT_ENTITY_THRESHOLD:
-        # get the maximum rect that contains the full line for getting all the
-        # required segments this could be upgraded to use a step-based approach
-        # to get a smaller list of segments
-        line_bound_rect = p.Rect(p1, p2)
-        for level in g.active_levels:
-            if level.enable_segmenting:
-                for segment in level.get_segments(line_bound_rect):
-                    check_entities += get_entities(segment.entities)
+    else:
+        if g.segmenting_in_levels:
+            check_entities_amount = 0
+            for ent_type in broadphase.get_collision_aliases(collision_dict):
+                check_entities_amount += len(g.game_objects.get(ent_type, []))
 
-        if not check_entities:
+            # get entities using segment method
+            check_entities = []
+
+        if g.segmenting_in_levels and check_entities_amount > g.ENABLE_SEGMENT_ENTITY_THRESHOLD:
+            # get the maximum rect that contains the full line for getting all the
+            # required segments this could be upgraded to use a step-based approach
+            # to get a smaller list of segments
+            line_bound_rect = p.Rect(min(p1[0], p2[0]), min(p1[1], p2[1]), abs(p2[0]-p1[0])+1, abs(p2[1]-p1[1])+1)
+            for level in g.active_levels:
+                if level.enable_segmenting:
+                    for segment in level.get_segments(line_bound_rect):
+                        check_entities += get_entities(segment.entities)
+
+            if not check_entities:
+                check_entities = get_entities(g.game_objects.get("class_Entity", []))
+        # or don't
+        else:
             check_entities = get_entities(g.game_objects.get("class_Entity", []))
-    # or don't
-    else:
-        check_entities = get_entities(g.game_objects.get("class_Entity", []))
 
     for entity in check_entities:
         if entity not in exceptions and entity.solid: